@@ -109,12 +109,19 @@ def main():
     # 格式: {'原始列名': {'原始值1': '脱敏值1', ...}, ...}
     mapping_cache: Dict[str, Dict[str, str]] = {}
 
-    for filename in sorted(os.listdir(INPUT_DIR)):
-        input_path = os.path.join(INPUT_DIR, filename)
+    # os.scandir 在列目录时一并返回文件类型，筛选文件不需要再逐个 stat；
+    # 仍按文件名排序处理，保证脱敏映射的编号顺序稳定
+    with os.scandir(INPUT_DIR) as it:
+        entries = sorted(
+            (entry for entry in it
+             if entry.is_file() and os.path.splitext(entry.name)[1].lower() in ('.csv', '.xlsx')),
+            key=lambda entry: entry.name,
+        )
+
+    for entry in entries:
+        filename = entry.name
+        input_path = entry.path
         file_ext = os.path.splitext(filename)[1].lower()
-
-        if file_ext not in ['.csv', '.xlsx']:
-            continue
             
         print(f"正在处理: {filename}...")
 
@@ -1,6 +1,5 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
@@ -29,6 +28,9 @@ DY_COL_ORDER_TYPE = '订单类型'
 STATUS_COMPLETED = '已完成'
 STATUS_CLOSED = '已关闭' # 可能还有其他非完成状态
 
+# 将Sheet页名称中Excel不允许的字符替换为'_'，配合 str.translate 使用
+SHEET_NAME_TRANSLATION_TABLE = str.maketrans(dict.fromkeys('\\/*[]:?', '_'))
+
 # 输出到详情页的列定义
 DETAIL_SHEET_COLUMNS_DY = [
     '订单编号',
@@ -60,7 +62,7 @@ def process_douyin_sales_data(input_file_path):
 
     try:
         df_original = pd.read_csv(input_file_path, dtype=str, keep_default_na=True)
-        df_original.columns = [col.strip().replace('"', '') for col in df_original.columns]
+        df_original.columns = df_original.columns.str.strip().str.replace('"', '', regex=False)
     except FileNotFoundError:
         print(f"错误: 输入文件未找到于 '{os.path.abspath(input_file_path)}'")
         return None
@@ -74,12 +76,10 @@ def process_douyin_sales_data(input_file_path):
 
     # --- 2. 数据清洗和预处理 ---
     df_original.columns = df_original.columns.str.strip()
-    for col in df_original.columns:
-        if df_original[col].dtype == 'object':
-            df_original[col] = df_original[col].astype(str).str.strip().str.replace('"', '').str.replace('\t', '')
-            df_original[col] = df_original[col].replace(
-                ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null'], np.nan, regex=False
-            )
+    for col in df_original.columns[df_original.dtypes == 'object']:
+        df_original[col] = df_original[col].str.strip().str.replace('"', '').str.replace('\t', '').replace(
+            ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null'], np.nan, regex=False
+        )
 
     critical_logic_cols_check = {
         DY_COL_PRODUCT_ID: "商品ID",
@@ -104,7 +104,8 @@ def process_douyin_sales_data(input_file_path):
             print(f"警告: 列 '{col}' 在输入文件中未找到，将创建并填充默认值 {default_fill_value}。")
             df_original[col] = default_fill_value
 
-    df_original[DY_COL_PRODUCT_ID] = df_original[DY_COL_PRODUCT_ID].astype(str).replace('nan', np.nan)
+    # 使用可空字符串类型，缺失值保持为NA，无需先转成 'nan' 文本再整列替换
+    df_original[DY_COL_PRODUCT_ID] = df_original[DY_COL_PRODUCT_ID].astype('string')
     df_processed = df_original[df_original[DY_COL_PRODUCT_ID].notna()].copy()
 
     if df_processed.empty:
@@ -115,10 +116,14 @@ def process_douyin_sales_data(input_file_path):
 
     # --- 3. 按商品ID汇总信息 ---
     product_data_map = {}
+    # 各商品ID的第一个非空商品名称一次性取出（groupby.first 跳过空值），不再逐组 dropna 后取第一行
+    if DY_COL_PRODUCT_NAME_DESC in df_processed:
+        name_map = df_processed.groupby(DY_COL_PRODUCT_ID)[DY_COL_PRODUCT_NAME_DESC].first().dropna().to_dict()
+    else:
+        name_map = {}
     for product_id_value, group_df in df_processed.groupby(DY_COL_PRODUCT_ID):
         product_id_str_key = str(product_id_value)
-        product_name_series_data = group_df[DY_COL_PRODUCT_NAME_DESC].dropna() if DY_COL_PRODUCT_NAME_DESC in group_df else pd.Series([])
-        product_name_str = product_name_series_data.iloc[0] if not product_name_series_data.empty else "未知商品"
+        product_name_str = name_map.get(product_id_value, "未知商品")
 
         income_orders_group = group_df.copy()
         income_total_quantity_per_product = income_orders_group[DY_COL_QUANTITY].sum()
@@ -279,7 +284,7 @@ def process_douyin_sales_data(input_file_path):
         if detail_income_df_data.empty and detail_expenditure_df_data.empty:
             continue
 
-        clean_product_name_str = re.sub(r'[\\/\*\[\]\:?]', '_', str(product_info_item['name']))
+        clean_product_name_str = str(product_info_item['name']).translate(SHEET_NAME_TRANSLATION_TABLE)
         base_sheet_name = f"{product_id_str_key}_{clean_product_name_str}"
         if len(base_sheet_name) > 31:
             max_name_len = 31 - len(product_id_str_key) - 1
@@ -320,8 +325,9 @@ def process_douyin_sales_data(input_file_path):
                 header_written_for_this_sheet = True
             
             if not df_section_data.empty:
-                for _, row_data_item in df_to_write_to_excel.iterrows():
-                    current_sheet_obj.append(row_data_item.tolist())
+                # 一次取出底层的对象数组逐行追加，不再经 iterrows 为每行构造 Series
+                for row_values in df_to_write_to_excel.to_numpy(dtype=object):
+                    current_sheet_obj.append(row_values.tolist())
 
             if section_title_str:
                 total_row_idx_for_section = current_sheet_obj.max_row + 1
@@ -1,6 +1,5 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, Alignment
@@ -10,6 +9,9 @@ import numpy as np
 # Pandas 显示选项
 pd.set_option('future.no_silent_downcasting', True)
 
+# 将Sheet页名称中Excel不允许的字符替换为'_'，配合 str.translate 使用
+SHEET_NAME_TRANSLATION_TABLE = str.maketrans(dict.fromkeys('\\/*[]:?', '_'))
+
 def process_sales_data(input_file_path):
     """
     处理销售数据CSV文件，生成包含销售总结和各商品销售明细的Excel文件。
@@ -37,10 +39,8 @@ def process_sales_data(input_file_path):
     df = pd.read_csv(input_file_path, dtype=str, na_values=['--'], keep_default_na=True)
 
     # ---- 2. 数据清洗和预处理 ----
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].str.strip()
-            df[col] = df[col].replace(['--', '', 'None', 'nan'], np.nan, regex=False)
+    for col in df.columns[df.dtypes == 'object']:
+        df[col] = df[col].str.strip().replace(['--', '', 'None', 'nan'], np.nan, regex=False)
 
     df['应结金额'] = pd.to_numeric(df['应结金额'], errors='coerce').fillna(0)
     df['商品数量'] = pd.to_numeric(df['商品数量'], errors='coerce').fillna(0)
@@ -55,43 +55,92 @@ def process_sales_data(input_file_path):
     completed_with_product_id_df = all_completed_df[all_completed_df['商品编号'].notna()].copy()
 
     # ---- 3. 按商品编号汇总销售和支出信息 ----
+    # 先对全部行一次性打上各费用类别的标记，商品编号分解为整数编码后，
+    # 每个合计项只需一次 np.bincount，不再构造 pandas 分组对象，也不再在每个商品分组内逐个费用名称筛选
+    fee_name = completed_with_product_id_df['费用名称']
+    is_income = completed_with_product_id_df['收支方向'] == '收入'
+    is_expense = completed_with_product_id_df['收支方向'] == '支出'
+    after_sales_id = completed_with_product_id_df['售后服务单号']
+    is_sale = (fee_name == '货款') & is_income
+    is_return = (fee_name == '货款') & is_expense & after_sales_id.notna() & (after_sales_id != '')
+    amount = completed_with_product_id_df['应结金额']
+    quantity = completed_with_product_id_df['商品数量']
+    product_codes, product_ids = pd.factorize(completed_with_product_id_df['商品编号'], sort=True)
+
+    def product_sum(values, mask):
+        # 按商品编码对选中行求和；结果转回原列类型，整数数量列的合计仍为整数
+        rows = mask.to_numpy()
+        sums = np.bincount(product_codes[rows], weights=values.to_numpy()[rows], minlength=len(product_ids))
+        return sums.astype(values.dtype, copy=False)
+
+    product_totals = pd.DataFrame({
+        'sales_quantity': product_sum(quantity, is_sale),
+        'sales_amount': product_sum(amount, is_sale),
+        'return_quantity': product_sum(quantity, is_return),
+        'return_amount_negative': product_sum(amount, is_return),
+    }, index=product_ids)
+
+    # 各类费用支出：费用名称先映射为整数编码，再以“商品编码×费用种类数+费用编码”为下标
+    # 做一次 np.bincount，一遍扫描即得到所有商品的全部费用合计，不再对每种费用名称各比较一次
+    expense_fee_columns = {'佣金': 'commission', '交易服务费': 'transaction_fee',
+                           '广告联合活动降扣佣金': 'ad_commission', '京豆': 'jingdou'}
+    fee_codes = fee_name.map({name: code for code, name in enumerate(expense_fee_columns)}).fillna(-1).to_numpy(dtype=np.int64)
+    fee_rows = is_expense.to_numpy() & (fee_codes >= 0)
+    fee_sums = np.bincount(
+        product_codes[fee_rows] * len(expense_fee_columns) + fee_codes[fee_rows],
+        weights=amount.to_numpy()[fee_rows],
+        minlength=len(product_ids) * len(expense_fee_columns)
+    ).reshape(len(product_ids), len(expense_fee_columns))
+    product_totals = product_totals.join(
+        pd.DataFrame(fee_sums, index=product_ids, columns=list(expense_fee_columns.values()))
+    )
+
+    # 保险服务费按订单计入：先按订单汇总一次两类保险费，再经“商品-订单”对应关系
+    # 累加到各商品，不再为每个商品在全表上用 isin 扫描相关订单
+    insurance_fee_names = ['商品保险服务费', '运费保险服务费']
+    insurance_rows = all_completed_df[
+        all_completed_df['费用名称'].isin(insurance_fee_names) & (all_completed_df['收支方向'] == '支出')
+    ]
+    insurance_by_order = (
+        insurance_rows.groupby(['订单编号', '费用名称'], dropna=False)['应结金额'].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=insurance_fee_names, fill_value=0)
+    )
+    product_orders = completed_with_product_id_df[['商品编号', '订单编号']].drop_duplicates()
+    product_insurance_totals = (
+        product_orders.join(insurance_by_order, on='订单编号')
+        .fillna({fee: 0 for fee in insurance_fee_names})
+        .groupby('商品编号')[insurance_fee_names].sum()
+    )
+
+    detail_cols = [col for col in DETAIL_SHEET_COLUMNS if col in completed_with_product_id_df.columns]
+
     product_summary_details = {}
-    for product_id_raw, group in completed_with_product_id_df.groupby('商品编号'):
+    grouped = completed_with_product_id_df.groupby('商品编号')
+    # 每组第一个非空的商品名称，在循环外一次性算好
+    product_names = grouped['商品名称'].first()
+    for product_id_raw, group in grouped:
         product_id = str(product_id_raw)
-        product_name_series = group['商品名称'].dropna()
-        product_name = product_name_series.iloc[0] if not product_name_series.empty else "未知商品"
-
-        sales_group_full_cols = group[(group['费用名称'] == '货款') & (group['收支方向'] == '收入')].copy()
-        sales_group_for_detail_sheet = sales_group_full_cols[[col for col in DETAIL_SHEET_COLUMNS if col in sales_group_full_cols.columns]].copy()
-        sales_quantity = sales_group_full_cols['商品数量'].sum()
-        sales_amount = sales_group_full_cols['应结金额'].sum()
-
-        returns_group_full_cols = group[
-            (group['费用名称'] == '货款') &
-            (group['收支方向'] == '支出') &
-            (group['售后服务单号'].notna()) &
-            (group['售后服务单号'] != '')
-        ].copy()
-        returns_group_for_detail_sheet = returns_group_full_cols[[col for col in DETAIL_SHEET_COLUMNS if col in returns_group_full_cols.columns]].copy()
-        return_quantity = returns_group_full_cols['商品数量'].sum()
-        return_amount_negative = returns_group_full_cols['应结金额'].sum()
-
-        product_expenses_group = group[group['收支方向'] == '支出']
-        total_commission = product_expenses_group[product_expenses_group['费用名称'] == '佣金']['应结金额'].sum()
-        total_transaction_fee = product_expenses_group[product_expenses_group['费用名称'] == '交易服务费']['应结金额'].sum()
-        total_ad_commission = product_expenses_group[product_expenses_group['费用名称'] == '广告联合活动降扣佣金']['应结金额'].sum()
-        total_jingdou = product_expenses_group[product_expenses_group['费用名称'] == '京豆']['应结金额'].sum()
-
-        relevant_order_ids = group['订单编号'].unique()
-        orders_containing_product = all_completed_df[all_completed_df['订单编号'].isin(relevant_order_ids)]
-        total_product_insurance_for_orders = orders_containing_product[
-            (orders_containing_product['费用名称'] == '商品保险服务费') &
-            (orders_containing_product['收支方向'] == '支出')
-        ]['应结金额'].sum()
-        total_freight_insurance_for_orders = orders_containing_product[
-            (orders_containing_product['费用名称'] == '运费保险服务费') &
-            (orders_containing_product['收支方向'] == '支出')
-        ]['应结金额'].sum()
+        product_name = product_names[product_id_raw]
+        if pd.isna(product_name):
+            product_name = "未知商品"
+
+        # 明细数据：直接复用预先算好的标记取出本组的销售/退款行
+        sales_group_for_detail_sheet = group.loc[is_sale.loc[group.index], detail_cols]
+        returns_group_for_detail_sheet = group.loc[is_return.loc[group.index], detail_cols]
+
+        # 按列取值，保持各列原有的数值类型
+        sales_quantity = product_totals['sales_quantity'][product_id_raw]
+        sales_amount = product_totals['sales_amount'][product_id_raw]
+        return_quantity = product_totals['return_quantity'][product_id_raw]
+        return_amount_negative = product_totals['return_amount_negative'][product_id_raw]
+        total_commission = product_totals['commission'][product_id_raw]
+        total_transaction_fee = product_totals['transaction_fee'][product_id_raw]
+        total_ad_commission = product_totals['ad_commission'][product_id_raw]
+        total_jingdou = product_totals['jingdou'][product_id_raw]
+
+        total_product_insurance_for_orders = product_insurance_totals['商品保险服务费'][product_id_raw]
+        total_freight_insurance_for_orders = product_insurance_totals['运费保险服务费'][product_id_raw]
         total_product_related_expenses = (total_commission + total_transaction_fee +
                                           total_ad_commission + total_jingdou +
                                           total_product_insurance_for_orders +
@@ -141,6 +190,7 @@ def process_sales_data(input_file_path):
     grand_total_return_amount_for_summary = 0
 
     sorted_summary_keys = sorted(product_summary_details.keys())
+    product_row_idx = 1
     for prod_id in sorted_summary_keys:
         item = product_summary_details[prod_id]
         summary_sheet.append([
@@ -149,6 +199,11 @@ def process_sales_data(input_file_path):
             item['commission'], item['transaction_fee'], item['ad_commission'], item['jingdou'],
             item['product_insurance'], item['freight_insurance'], item['total_product_expenses']
         ])
+        # 写入商品行时直接设置数字格式，不再在表格写完后回头查找总计行并重新遍历
+        product_row_idx += 1
+        summary_sheet.cell(row=product_row_idx, column=3).number_format = '#,##0'
+        for col_idx_format in range(4, len(summary_header) + 1):
+            summary_sheet.cell(row=product_row_idx, column=col_idx_format).number_format = '#,##0.00'
         total_sales_qty_no_refund += item['sales_quantity']
         total_sales_amt_no_refund += item['sales_amount']
         total_commission_no_refund += item['commission']
@@ -223,18 +278,6 @@ def process_sales_data(input_file_path):
     # 其他支出列在此行中留空
 
 
-    # 为数据行（商品行）设置格式
-    first_total_row = 0
-    for r_idx in range(2, summary_sheet.max_row + 1):
-        if summary_sheet.cell(row=r_idx, column=1).value == "总计 (不含退款)":
-            first_total_row = r_idx
-            break
-    if first_total_row > 0:
-        for row_idx_num in range(2, first_total_row): 
-            summary_sheet.cell(row=row_idx_num, column=3).number_format = '#,##0' 
-            for col_idx_format in range(4, len(summary_header) + 1): 
-                summary_sheet.cell(row=row_idx_num, column=col_idx_format).number_format = '#,##0.00'
-    
     summary_sheet.column_dimensions['A'].width = 20
     summary_sheet.column_dimensions['B'].width = 60
     summary_sheet.column_dimensions['C'].width = 12
@@ -254,7 +297,7 @@ def process_sales_data(input_file_path):
         if sales_df_for_detail_orig.empty and returns_df_for_detail_orig.empty:
             continue
         
-        clean_product_name = re.sub(r'[\\/\*\[\]\:?]', '_', str(product_info['name']))
+        clean_product_name = str(product_info['name']).translate(SHEET_NAME_TRANSLATION_TABLE)
         potential_sheet_name = f"{product_id_str}_{clean_product_name}" 
         if len(potential_sheet_name) > 31:
             id_len = len(product_id_str)
@@ -295,8 +338,9 @@ def process_sales_data(input_file_path):
                     cell.font = Font(bold=True)
                 header_written_for_sheet = True 
             
-            for row_data_tuple in df_to_write.itertuples(index=False):
-                product_sheet.append(list(row_data_tuple))
+            # 一次取出底层的对象数组，逐行 tolist() 后追加，不再为每行构造 namedtuple
+            for row_values in df_to_write.to_numpy(dtype=object):
+                product_sheet.append(row_values.tolist())
 
         write_section_to_sheet(sales_df_for_detail_orig, True) 
 
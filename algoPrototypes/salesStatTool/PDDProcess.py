@@ -1,6 +1,5 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
@@ -32,6 +31,9 @@ PDD_COL_ORDER_TRANSACTION_TIME = '订单成交时间'
 # 订单状态常量
 STATUS_REFUND_SUCCESS = '退款成功'
 
+# 将Sheet页名称中Excel不允许的字符替换为'_'，配合 str.translate 使用
+SHEET_NAME_TRANSLATION_TABLE = str.maketrans(dict.fromkeys('\\/*[]:?', '_'))
+
 # 输出到详情页的列定义
 DETAIL_SHEET_COLUMNS_PDD = [
     '订单号', '订单状态', '售后状态', '商品ID', '商品名称', '商品规格', '商品数量(件)',
@@ -39,6 +41,17 @@ DETAIL_SHEET_COLUMNS_PDD = [
     '快递单号', '快递公司'
 ]
 
+# 空分段共用的空明细表（只读），各商品没有退款时直接返回它，不再每次新建
+EMPTY_DETAIL_DF_PDD = pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_PDD)
+
+# 详情页中直接取自原始列的部分：原始列名 -> 详情页列名
+PDD_SRC_TO_DETAIL = {
+    PDD_COL_ORDER_ID: '订单号', PDD_COL_ORDER_STATUS: '订单状态', PDD_COL_AFTER_SALES_STATUS: '售后状态',
+    PDD_COL_PRODUCT_SPEC: '商品规格', PDD_COL_QUANTITY: '商品数量(件)', PDD_COL_USER_ACTUAL_PAYMENT: '用户实付金额(元)',
+    PDD_COL_ORDER_TRANSACTION_TIME: '订单成交时间', PDD_COL_SHIPPING_TIME: '发货时间',
+    PDD_COL_CONFIRM_RECEIPT_TIME: '确认收货时间', PDD_COL_LOGISTICS_NO: '快递单号', PDD_COL_LOGISTICS_COMPANY: '快递公司'
+}
+
 def process_pdd_sales_data(input_file_path):
     # --- 1. 初始化路径和读取数据 ---
     input_dir = os.path.dirname(input_file_path)
@@ -55,10 +68,9 @@ def process_pdd_sales_data(input_file_path):
 
     # --- 2. 数据清洗和预处理 ---
     df_original.columns = df_original.columns.str.strip()
-    for col in df_original.columns:
-        if df_original[col].dtype == 'object':
-            df_original[col] = df_original[col].astype(str).str.strip().replace(
-                ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null', '\t'], np.nan, regex=False)
+    for col in df_original.columns[df_original.dtypes == 'object']:
+        df_original[col] = df_original[col].str.strip().replace(
+            ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null', '\t'], np.nan, regex=False)
 
     # **修正点**: 修复了变量名的拼写错误
     numeric_cols = [
@@ -70,7 +82,9 @@ def process_pdd_sales_data(input_file_path):
             df_original[col] = pd.to_numeric(df_original[col], errors='coerce').fillna(0)
 
     # --- 3. 核心逻辑：数据筛选与分组 ---
-    df_no_cancel = df_original[~df_original[PDD_COL_ORDER_STATUS].str.contains('取消', na=False)].copy()
+    # 状态关键字均为普通文本，regex=False 走子串匹配，不经过正则引擎
+    is_cancel = df_original[PDD_COL_ORDER_STATUS].str.contains('取消', na=False, regex=False)
+    df_no_cancel = df_original[~is_cancel].copy()
     df_processed = df_no_cancel[df_no_cancel[PDD_COL_PRODUCT_ID].notna()].copy()
     df_processed[PDD_COL_PRODUCT_ID] = df_processed[PDD_COL_PRODUCT_ID].astype(str)
 
@@ -80,29 +94,36 @@ def process_pdd_sales_data(input_file_path):
     product_data_map = {}
     
     def format_df_for_detail(df_source, p_id, p_name, is_refund=False):
-        if df_source.empty: return pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_PDD)
-        df_target = pd.DataFrame({
-            '订单号': df_source.get(PDD_COL_ORDER_ID), '订单状态': df_source.get(PDD_COL_ORDER_STATUS),
-            '售后状态': df_source.get(PDD_COL_AFTER_SALES_STATUS), '商品ID': p_id, '商品名称': p_name,
-            '商品规格': df_source.get(PDD_COL_PRODUCT_SPEC), '商品数量(件)': df_source.get(PDD_COL_QUANTITY),
-            '用户实付金额(元)': df_source.get(PDD_COL_USER_ACTUAL_PAYMENT), '商家实收金额(元)': 0,
-            '订单成交时间': df_source.get(PDD_COL_ORDER_TRANSACTION_TIME), '发货时间': df_source.get(PDD_COL_SHIPPING_TIME),
-            '确认收货时间': df_source.get(PDD_COL_CONFIRM_RECEIPT_TIME), '快递单号': df_source.get(PDD_COL_LOGISTICS_NO),
-            '快递公司': df_source.get(PDD_COL_LOGISTICS_COMPANY)
-        })
+        if df_source.empty: return EMPTY_DETAIL_DF_PDD
+        # 一次选列并改名，缺失的原始列在最后按详情页列顺序重排时补为空值
+        present_cols = [col for col in PDD_SRC_TO_DETAIL if col in df_source.columns]
+        df_target = df_source[present_cols].rename(columns=PDD_SRC_TO_DETAIL)
+        df_target['商品ID'] = p_id
+        df_target['商品名称'] = p_name
         if not is_refund:
             df_target['商家实收金额(元)'] = df_source[PDD_COL_PRODUCT_TOTAL_PRICE] - df_source[PDD_COL_STORE_DISCOUNT]
         else:
             df_target['商家实收金额(元)'] = -(df_source[PDD_COL_USER_ACTUAL_PAYMENT] + df_source[PDD_COL_PLATFORM_DISCOUNT])
             df_target['用户实付金额(元)'] = -df_source[PDD_COL_USER_ACTUAL_PAYMENT]
-        return df_target[DETAIL_SHEET_COLUMNS_PDD]
+        return df_target.reindex(columns=DETAIL_SHEET_COLUMNS_PDD)
+
+    # 退款相关的状态标记在整表上各匹配一次，分组内按行位置取用，不再逐组重复扫描字符串
+    is_refund_success = df_processed[PDD_COL_AFTER_SALES_STATUS].str.contains(STATUS_REFUND_SUCCESS, na=False, regex=False).to_numpy()
+    is_unshipped = df_processed[PDD_COL_ORDER_STATUS].str.contains('未发货', na=False, regex=False).to_numpy()
+    is_shipped = df_processed[PDD_COL_ORDER_STATUS].str.contains('已发货', na=False, regex=False).to_numpy()
+    is_unshipped_refund = is_refund_success & is_unshipped
+    is_shipped_refund = is_refund_success & is_shipped
+
+    # 各商品ID首行的商品名称一次性取出，不再逐组切片取第一行
+    first_rows = df_processed.drop_duplicates(PDD_COL_PRODUCT_ID)
+    name_map = dict(zip(first_rows[PDD_COL_PRODUCT_ID], first_rows[PDD_COL_PRODUCT_NAME]))
 
-    for product_id, group_df in df_processed.groupby(PDD_COL_PRODUCT_ID):
-        product_name = group_df[PDD_COL_PRODUCT_NAME].iloc[0] if not group_df[PDD_COL_PRODUCT_NAME].empty else "未知商品"
+    for product_id, positions in df_processed.groupby(PDD_COL_PRODUCT_ID).indices.items():
+        group_df = df_processed.iloc[positions]
+        product_name = name_map.get(product_id, "未知商品")
 
-        all_refunds_df = group_df[group_df[PDD_COL_AFTER_SALES_STATUS].str.contains(STATUS_REFUND_SUCCESS, na=False)].copy()
-        regular_refund_df = all_refunds_df[all_refunds_df[PDD_COL_ORDER_STATUS].str.contains('未发货', na=False)].copy()
-        shipped_refund_df = all_refunds_df[all_refunds_df[PDD_COL_ORDER_STATUS].str.contains('已发货', na=False)].copy()
+        regular_refund_df = df_processed.iloc[positions[is_unshipped_refund[positions]]]
+        shipped_refund_df = df_processed.iloc[positions[is_shipped_refund[positions]]]
 
         product_data_map[product_id] = {
             'name': product_name,
@@ -117,6 +138,16 @@ def process_pdd_sales_data(input_file_path):
     summary_sheet.title = "销售总结"
     bold_font = Font(bold=True)
     center_align = Alignment(horizontal='center', vertical='center')
+
+    # 总结页各数值列的数字格式：数量列为整数格式，金额列保留两位小数
+    summary_number_formats = {3: '#,##0', 4: '#,##0.00', 5: '#,##0.00'}
+
+    def format_summary_row(row_idx):
+        # 写入含数值的行后立即设置该行的数字格式，不再在总结页写完后遍历全表
+        for col_idx, number_format in summary_number_formats.items():
+            cell = summary_sheet.cell(row=row_idx, column=col_idx)
+            if isinstance(cell.value, (int, float)):
+                cell.number_format = number_format
     
     current_row = 1
     
@@ -134,12 +165,14 @@ def process_pdd_sales_data(input_file_path):
         df = item['income_df']
         qty, user_pay, receipt = df['商品数量(件)'].sum(), df['用户实付金额(元)'].sum(), df['商家实收金额(元)'].sum()
         summary_sheet.append([prod_id, item['name'], qty, user_pay, receipt])
+        format_summary_row(current_row)
         grand_total_income_qty += qty
         grand_total_income_user_pay += user_pay
         grand_total_income_receipt += receipt
         current_row += 1
     summary_sheet.append(["总计销售", "", grand_total_income_qty, grand_total_income_user_pay, grand_total_income_receipt])
     for cell in summary_sheet[current_row]: cell.font = bold_font
+    format_summary_row(current_row)
     current_row += 2
 
     # 未发货退款汇总
@@ -156,12 +189,14 @@ def process_pdd_sales_data(input_file_path):
         if not df.empty:
             qty, user_pay, receipt = df['商品数量(件)'].sum(), df['用户实付金额(元)'].sum(), df['商家实收金额(元)'].sum()
             summary_sheet.append([prod_id, item['name'], qty, user_pay, receipt])
+            format_summary_row(current_row)
             grand_total_unshipped_qty += qty
             grand_total_unshipped_user_pay += user_pay
             grand_total_unshipped_receipt += receipt
             current_row += 1
     summary_sheet.append(["未发货退款总计", "", grand_total_unshipped_qty, grand_total_unshipped_user_pay, grand_total_unshipped_receipt])
     for cell in summary_sheet[current_row]: cell.font = bold_font
+    format_summary_row(current_row)
     current_row += 2
 
     # 已发货退款汇总
@@ -178,12 +213,14 @@ def process_pdd_sales_data(input_file_path):
         if not df.empty:
             qty, user_pay, receipt = df['商品数量(件)'].sum(), df['用户实付金额(元)'].sum(), df['商家实收金额(元)'].sum()
             summary_sheet.append([prod_id, item['name'], qty, user_pay, receipt])
+            format_summary_row(current_row)
             grand_total_shipped_qty += qty
             grand_total_shipped_user_pay += user_pay
             grand_total_shipped_receipt += receipt
             current_row += 1
     summary_sheet.append(["已发货退款总计", "", grand_total_shipped_qty, grand_total_shipped_user_pay, grand_total_shipped_receipt])
     for cell in summary_sheet[current_row]: cell.font = bold_font
+    format_summary_row(current_row)
     current_row += 2
 
     # 两种净总计
@@ -195,6 +232,7 @@ def process_pdd_sales_data(input_file_path):
     summary_sheet.cell(row=current_row, column=3, value=net_qty_view1).font = bold_font
     summary_sheet.cell(row=current_row, column=4, value=net_user_pay_view1).font = bold_font
     summary_sheet.cell(row=current_row, column=5, value=net_receipt_view1).font = bold_font
+    format_summary_row(current_row)
     current_row += 1
 
     net_qty_view2 = grand_total_income_qty - grand_total_unshipped_qty - grand_total_shipped_qty
@@ -205,20 +243,19 @@ def process_pdd_sales_data(input_file_path):
     summary_sheet.cell(row=current_row, column=3, value=net_qty_view2).font = bold_font
     summary_sheet.cell(row=current_row, column=4, value=net_user_pay_view2).font = bold_font
     summary_sheet.cell(row=current_row, column=5, value=net_receipt_view2).font = bold_font
+    format_summary_row(current_row)
     
     # 格式化总结页
     for col_letter, width in [('A', 35), ('B', 60), ('C', 18), ('D', 22), ('E', 22)]:
         summary_sheet.column_dimensions[col_letter].width = width
-    for row in summary_sheet.iter_rows():
-        for cell in row:
-            if isinstance(cell.value, (int, float)):
-                if cell.column in [3]: cell.number_format = '#,##0'
-                if cell.column in [4, 5]: cell.number_format = '#,##0.00'
 
     # --- 6. 为每个商品创建并写入详情页 ---
     for prod_id in sorted_product_ids:
         item = product_data_map[prod_id]
-        sheet_name = re.sub(r'[\\/\*\[\]\:?]', '_', f"{prod_id}_{item['name']}")[:31]
+        # 三个分段都没有数据时不创建详情页
+        if item['income_df'].empty and item['unshipped_refund_df'].empty and item['shipped_refund_df'].empty:
+            continue
+        sheet_name = f"{prod_id}_{item['name']}".translate(SHEET_NAME_TRANSLATION_TABLE)[:31]
         try: ws = wb.create_sheet(sheet_name)
         except: ws = wb.create_sheet(f"{prod_id}_detail")
 
@@ -228,7 +265,8 @@ def process_pdd_sales_data(input_file_path):
             sheet[sheet.max_row][0].font = bold_font
             sheet.append(DETAIL_SHEET_COLUMNS_PDD)
             for cell in sheet[sheet.max_row]: cell.font = bold_font; cell.alignment = center_align
-            for _, row_data in df.iterrows(): sheet.append(row_data.tolist())
+            # 一次取出底层的对象数组逐行追加，不再经 iterrows 为每行构造 Series
+            for row_values in df.to_numpy(dtype=object): sheet.append(row_values.tolist())
             total_row_data = [total_title, "", "", "", "", "", df['商品数量(件)'].sum(), df['用户实付金额(元)'].sum(), df['商家实收金额(元)'].sum()]
             sheet.append(total_row_data)
             for cell in sheet[sheet.max_row]: cell.font = bold_font
@@ -1,6 +1,5 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
@@ -36,6 +35,9 @@ TMALL_COL_BUYER_PAYABLE_GOODS = '买家应付货款'# L列
 TMALL_COL_SELLER_REMARK = '商家备注'          # S列
 TMALL_COL_BUYER_MESSAGE = '主订单买家留言'    # T列
 
+# 将Sheet页名称中Excel不允许的字符替换为'_'，配合 str.translate 使用
+SHEET_NAME_TRANSLATION_TABLE = str.maketrans(dict.fromkeys('\\/*[]:?', '_'))
+
 # 订单状态常量
 STATUS_TRADE_SUCCESS = '交易成功' # J列 '订单状态' 中表示交易成功的确切文本
 
@@ -57,6 +59,12 @@ DETAIL_SHEET_COLUMNS_TMALL = [
     '物流单号',
     '物流公司',
 ]
+# 详情页中保留数值格式的列，其余列在写入前统一转为字符串
+DETAIL_SHEET_NUMERIC_COLUMNS_TMALL = ['商品价格', '商品数量', '应结金额']
+DETAIL_SHEET_STR_COL_INDICES_TMALL = [
+    idx for idx, col_name in enumerate(DETAIL_SHEET_COLUMNS_TMALL)
+    if col_name not in DETAIL_SHEET_NUMERIC_COLUMNS_TMALL
+]
 
 def process_tmall_sales_data(input_file_path):
     """
@@ -90,12 +98,10 @@ def process_tmall_sales_data(input_file_path):
 
     # --- 2. 数据清洗和预处理 ---
     df_original.columns = df_original.columns.str.strip()
-    for col in df_original.columns:
-        if df_original[col].dtype == 'object':
-            df_original[col] = df_original[col].str.strip()
-            df_original[col] = df_original[col].replace(
-                ['--', '', 'None', 'nan', '#NULL!', None], np.nan, regex=False
-            )
+    for col in df_original.columns[df_original.dtypes == 'object']:
+        df_original[col] = df_original[col].str.strip().replace(
+            ['--', '', 'None', 'nan', '#NULL!', None], np.nan, regex=False
+        )
 
     critical_logic_cols_check = {
         TMALL_COL_PRODUCT_ID: "商品ID (R列)", TMALL_COL_ORDER_STATUS: "订单状态 (J列)",
@@ -120,6 +126,10 @@ def process_tmall_sales_data(input_file_path):
              print(f"警告: 列 '{col}' ('商品价格') 在输入文件中未找到，将创建此列并使用默认值 {default_fill_value} 填充。")
              df_original[col] = default_fill_value
 
+    # 购买数量均为整数，下转为能容纳其取值范围的最小整数类型，减少后续求和及写出时搬运的字节数。
+    # 金额列刻意保持 float64：float32 仅约7位有效数字，较大的金额及其合计会出现分位误差
+    df_original[TMALL_COL_QUANTITY] = pd.to_numeric(df_original[TMALL_COL_QUANTITY], downcast='integer')
+
     df_original[TMALL_COL_PRODUCT_ID] = df_original[TMALL_COL_PRODUCT_ID].astype(str).replace('nan', np.nan)
     df_processed = df_original[df_original[TMALL_COL_PRODUCT_ID].notna()].copy()
     if df_processed.empty:
@@ -127,80 +137,107 @@ def process_tmall_sales_data(input_file_path):
         return None
 
     # --- 新增计算: "交易成功"订单的买家实付总额 ---
-    # 确保 TMALL_COL_ORDER_STATUS 和 TMALL_COL_ACTUAL_PAYMENT 存在于 df_processed
-    actual_payment_for_successful_trades = 0.0
-    if TMALL_COL_ORDER_STATUS in df_processed.columns and TMALL_COL_ACTUAL_PAYMENT in df_processed.columns:
-        successful_trades_df = df_processed[df_processed[TMALL_COL_ORDER_STATUS] == STATUS_TRADE_SUCCESS]
-        actual_payment_for_successful_trades = successful_trades_df[TMALL_COL_ACTUAL_PAYMENT].sum()
-    else:
-        print(f"警告: 无法计算“交易成功”订单的实付款总额，因为列'{TMALL_COL_ORDER_STATUS}'或'{TMALL_COL_ACTUAL_PAYMENT}'不存在。")
+    # TMALL_COL_ORDER_STATUS 和 TMALL_COL_ACTUAL_PAYMENT 已在上方的核心列检查中确认存在。
+    # “交易成功”掩码只计算一次，下面各商品的支出(非交易成功订单)统计直接复用其取反结果
+    successful_trade_mask = df_processed[TMALL_COL_ORDER_STATUS].to_numpy() == STATUS_TRADE_SUCCESS
+    actual_payment_for_successful_trades = df_processed[TMALL_COL_ACTUAL_PAYMENT].to_numpy()[successful_trade_mask].sum()
 
 
     # --- 3. 按商品ID汇总信息，用于总结页和详情页 ---
     product_data_map = {}
 
-    for product_id_value, group_df in df_processed.groupby(TMALL_COL_PRODUCT_ID):
+    # 详情页列 -> 源列 的映射只解析一次：预先取出各源列的底层数组(列式存储)，
+    # 分组时直接按行位置切片，避免每个分组重复执行 .get() 查找和整列复制
+    detail_source_col_map = {
+        '订单编号': TMALL_COL_MAIN_ORDER_ID,
+        '子订单编号': TMALL_COL_SUB_ORDER_ID,
+        '订单状态': TMALL_COL_ORDER_STATUS,
+        '退款状态': TMALL_COL_REFUND_STATUS,
+        '商品属性': TMALL_COL_PRODUCT_ATTRIBUTES,
+        '商品价格': TMALL_COL_UNIT_PRICE,
+        '商品数量': TMALL_COL_QUANTITY,
+        '订单创建时间': TMALL_COL_ORDER_CREATE_TIME,
+        '订单付款时间': TMALL_COL_ORDER_PAY_TIME,
+        '发货时间': TMALL_COL_SHIPPING_TIME,
+        '物流单号': TMALL_COL_LOGISTICS_NO,
+        '物流公司': TMALL_COL_LOGISTICS_COMPANY,
+    }
+    detail_source_arrays = {
+        detail_col: df_processed[source_col].to_numpy()
+        for detail_col, source_col in detail_source_col_map.items() if source_col in df_processed.columns
+    }
+    quantity_array = df_processed[TMALL_COL_QUANTITY].to_numpy()
+    actual_payment_array = df_processed[TMALL_COL_ACTUAL_PAYMENT].to_numpy()
+    refund_amount_array = df_processed[TMALL_COL_REFUND_AMOUNT].to_numpy()
+
+    def format_df_for_detail_sheet(row_positions, prod_id_for_detail, prod_name_for_detail,
+                                   amount_source_array, make_amount_negative=False):
+        if len(row_positions) == 0:
+            return pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_TMALL)
+
+        detail_data = {}
+        for col_name in DETAIL_SHEET_COLUMNS_TMALL:
+            if col_name in detail_source_arrays:
+                detail_data[col_name] = detail_source_arrays[col_name][row_positions]
+            elif col_name == '商品编号':
+                detail_data[col_name] = prod_id_for_detail
+            elif col_name == '商品名称':
+                detail_data[col_name] = prod_name_for_detail
+            elif col_name == '应结金额':
+                amount_values = amount_source_array[row_positions]
+                detail_data[col_name] = -amount_values if make_amount_negative else amount_values
+            elif col_name in ['商品价格', '商品数量']:
+                detail_data[col_name] = 0 if col_name == '商品数量' else 0.0
+            else:
+                detail_data[col_name] = ''
+        return pd.DataFrame(detail_data, index=range(len(row_positions)), columns=DETAIL_SHEET_COLUMNS_TMALL)
+
+    # 分组键之后会单独排序，这里无需让 groupby 再排序一次；
+    # .indices 直接给出每个商品ID对应的行位置数组，.first() 一次性取得各组第一个非空商品名称
+    product_groupby = df_processed.groupby(TMALL_COL_PRODUCT_ID, sort=False)
+    if TMALL_COL_PRODUCT_NAME in df_processed.columns:
+        product_name_lookup = product_groupby[TMALL_COL_PRODUCT_NAME].first()
+    else:
+        product_name_lookup = pd.Series(dtype=object)
+
+    # 这些汇总都是对浮点列的简单求和，瓶颈在内存带宽而非计算：
+    # 先用掩码把“非交易成功”的数量/退款额准备成辅助列，再让收入、支出四项在同一次 groupby 中求和，
+    # 避免对每个商品分别扫描“全部订单”和“未成功订单”两遍
+    product_totals_map = pd.DataFrame({
+        'income_qty': quantity_array,
+        'income_amt': actual_payment_array,
+        'exp_qty': np.where(successful_trade_mask, 0, quantity_array),
+        'exp_amt': np.where(successful_trade_mask, 0.0, refund_amount_array),
+    }).groupby(df_processed[TMALL_COL_PRODUCT_ID].to_numpy(), sort=False).sum().to_dict('index')
+
+    for product_id_value, group_row_positions in product_groupby.indices.items():
         product_id_str_key = str(product_id_value)
-        product_name_series_data = group_df[TMALL_COL_PRODUCT_NAME].dropna() if TMALL_COL_PRODUCT_NAME in group_df else pd.Series([])
-        product_name_str = product_name_series_data.iloc[0] if not product_name_series_data.empty else "未知商品"
+        product_name_value = product_name_lookup.get(product_id_value)
+        product_name_str = product_name_value if pd.notna(product_name_value) else "未知商品"
 
-        all_orders_in_group = group_df.copy()
-        income_total_quantity_per_product = all_orders_in_group[TMALL_COL_QUANTITY].sum()
+        product_totals = product_totals_map[product_id_value]
+        income_total_quantity_per_product = product_totals['income_qty']
         # "总计收入"中的每项商品收入依然是基于该商品所有订单的实付款
-        income_total_amount_per_product = all_orders_in_group[TMALL_COL_ACTUAL_PAYMENT].sum()
-
-
-        non_successful_orders_in_group = group_df[group_df[TMALL_COL_ORDER_STATUS] != STATUS_TRADE_SUCCESS].copy()
-        expenditure_total_quantity_per_product = non_successful_orders_in_group[TMALL_COL_QUANTITY].sum()
-        expenditure_total_amount_per_product = -non_successful_orders_in_group[TMALL_COL_REFUND_AMOUNT].sum()
-
-        def format_df_for_detail_sheet(source_df_input, prod_id_for_detail, prod_name_for_detail,
-                                     amount_source_col_name, make_amount_negative=False):
-            if source_df_input.empty:
-                return pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_TMALL)
-
-            detail_df_formatted = pd.DataFrame()
-            detail_df_formatted['订单编号'] = source_df_input.get(TMALL_COL_MAIN_ORDER_ID)
-            detail_df_formatted['子订单编号'] = source_df_input.get(TMALL_COL_SUB_ORDER_ID)
-            detail_df_formatted['订单状态'] = source_df_input.get(TMALL_COL_ORDER_STATUS)
-            detail_df_formatted['退款状态'] = source_df_input.get(TMALL_COL_REFUND_STATUS)
-            detail_df_formatted['订单创建时间'] = source_df_input.get(TMALL_COL_ORDER_CREATE_TIME)
-            detail_df_formatted['订单付款时间'] = source_df_input.get(TMALL_COL_ORDER_PAY_TIME)
-            detail_df_formatted['发货时间'] = source_df_input.get(TMALL_COL_SHIPPING_TIME)
-            detail_df_formatted['商品编号'] = prod_id_for_detail
-            detail_df_formatted['商品名称'] = prod_name_for_detail
-            detail_df_formatted['商品属性'] = source_df_input.get(TMALL_COL_PRODUCT_ATTRIBUTES)
-            detail_df_formatted['商品价格'] = source_df_input.get(TMALL_COL_UNIT_PRICE)
-            detail_df_formatted['商品数量'] = source_df_input.get(TMALL_COL_QUANTITY)
-
-            amount_values = source_df_input.get(amount_source_col_name, 0.0)
-            detail_df_formatted['应结金额'] = -amount_values if make_amount_negative else amount_values
-
-            detail_df_formatted['物流单号'] = source_df_input.get(TMALL_COL_LOGISTICS_NO)
-            detail_df_formatted['物流公司'] = source_df_input.get(TMALL_COL_LOGISTICS_COMPANY)
-
-            final_detail_df = pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_TMALL)
-            for col_name in DETAIL_SHEET_COLUMNS_TMALL:
-                if col_name in detail_df_formatted.columns:
-                    final_detail_df[col_name] = detail_df_formatted[col_name]
-                else:
-                    if col_name in ['商品价格', '商品数量', '应结金额']:
-                        final_detail_df[col_name] = 0 if col_name == '商品数量' else 0.0
-                    else:
-                        final_detail_df[col_name] = ''
-            return final_detail_df
+        income_total_amount_per_product = product_totals['income_amt']
+        expenditure_total_quantity_per_product = product_totals['exp_qty']
+        expenditure_total_amount_per_product = -product_totals['exp_amt']
 
+        non_successful_row_positions = group_row_positions[~successful_trade_mask[group_row_positions]]
 
         detail_income_section_df = format_df_for_detail_sheet(
-            all_orders_in_group, product_id_str_key, product_name_str,
-            TMALL_COL_ACTUAL_PAYMENT, make_amount_negative=False
-        )
-        detail_expenditure_section_df = format_df_for_detail_sheet(
-            non_successful_orders_in_group, product_id_str_key, product_name_str,
-            TMALL_COL_REFUND_AMOUNT, make_amount_negative=True
+            group_row_positions, product_id_str_key, product_name_str,
+            actual_payment_array, make_amount_negative=False
         )
+        # 多数商品没有未成功订单：此时不构建空的支出明细，记为 None，详情页也不再写出该区域
+        if len(non_successful_row_positions) > 0:
+            detail_expenditure_section_df = format_df_for_detail_sheet(
+                non_successful_row_positions, product_id_str_key, product_name_str,
+                refund_amount_array, make_amount_negative=True
+            )
+        else:
+            detail_expenditure_section_df = None
 
-        if not detail_income_section_df.empty or not detail_expenditure_section_df.empty:
+        if not detail_income_section_df.empty or detail_expenditure_section_df is not None:
             product_data_map[product_id_str_key] = {
                 'name': product_name_str,
                 'income_total_quantity': income_total_quantity_per_product,
@@ -229,23 +266,40 @@ def process_tmall_sales_data(input_file_path):
     for cell in summary_sheet[current_row_summary]: cell.font = bold_font; cell.alignment = center_alignment
     current_row_summary += 1
 
-    grand_total_income_qty = 0
-    # grand_total_income_amt 代表所有（有商品ID）订单的实付金额总和，用于“总计收入”行
-    grand_total_income_amt = 0
-    sorted_product_ids = sorted(product_data_map.keys())
-
-    for prod_id in sorted_product_ids:
-        item_data = product_data_map[prod_id]
-        summary_sheet.append([
-            prod_id, item_data['name'],
-            item_data['income_total_quantity'], item_data['income_total_amount']
-        ])
-        grand_total_income_qty += item_data['income_total_quantity']
-        grand_total_income_amt += item_data['income_total_amount'] # This sums up all actual payments for products
+    # 商品ID一般是纯数字字符串：能安全转为int64时按数值排序(避免'9'排在'10'之后)，
+    # 否则退回按字符串排序，两种情况均由 numpy.argsort 一次完成
+    product_id_keys = pd.Series(list(product_data_map.keys()), dtype=object)
+    if not product_id_keys.empty and product_id_keys.str.fullmatch(r'\d{1,18}').all():
+        product_id_sort_order = np.argsort(product_id_keys.astype(np.int64).to_numpy(), kind='stable')
+    else:
+        product_id_sort_order = np.argsort(product_id_keys.to_numpy(dtype=str), kind='stable')
+    sorted_product_ids = product_id_keys.to_numpy()[product_id_sort_order].tolist()
+
+    # 先将收入/支出汇总行整体物化为二维object数组(列: 商品编号, 商品名称, 数量, 金额)，
+    # 合计直接对数值列求和，写入时每行只需一次 append 加两个数字格式设置
+    summary_income_rows = np.empty((len(sorted_product_ids), 4), dtype=object)
+    summary_income_rows[:, 0] = sorted_product_ids
+    summary_income_rows[:, 1] = [product_data_map[prod_id]['name'] for prod_id in sorted_product_ids]
+    summary_income_rows[:, 2] = [product_data_map[prod_id]['income_total_quantity'] for prod_id in sorted_product_ids]
+    summary_income_rows[:, 3] = [product_data_map[prod_id]['income_total_amount'] for prod_id in sorted_product_ids]
+
+    summary_expenditure_rows = summary_income_rows.copy()
+    summary_expenditure_rows[:, 2] = [product_data_map[prod_id]['expenditure_total_quantity'] for prod_id in sorted_product_ids]
+    summary_expenditure_rows[:, 3] = [product_data_map[prod_id]['expenditure_total_amount'] for prod_id in sorted_product_ids]
+    # 支出汇总只列出确有未成功订单数量或退款额的商品
+    has_expenditure_mask = (summary_expenditure_rows[:, 2] > 0) | (summary_expenditure_rows[:, 3] != 0)
+    summary_expenditure_rows = summary_expenditure_rows[has_expenditure_mask.astype(bool)]
+
+    for summary_row_values in summary_income_rows.tolist():
+        summary_sheet.append(summary_row_values)
         summary_sheet.cell(row=current_row_summary, column=3).number_format = '#,##0'
         summary_sheet.cell(row=current_row_summary, column=4).number_format = '#,##0.00'
         current_row_summary += 1
 
+    grand_total_income_qty = summary_income_rows[:, 2].sum()
+    # grand_total_income_amt 代表所有（有商品ID）订单的实付金额总和，用于“总计收入”行
+    grand_total_income_amt = summary_income_rows[:, 3].sum()
+
     # "总计收入" 行显示的是所有商品（即所有有product_id的订单）的买家实付总额
     summary_sheet.cell(row=current_row_summary, column=1, value="总计收入").font = bold_font
     summary_sheet.cell(row=current_row_summary, column=3, value=grand_total_income_qty).font = bold_font
@@ -262,21 +316,14 @@ def process_tmall_sales_data(input_file_path):
     for cell in summary_sheet[current_row_summary]: cell.font = bold_font; cell.alignment = center_alignment
     current_row_summary += 1
 
-    grand_total_expenditure_qty = 0
-    grand_total_expenditure_amt = 0
-
-    for prod_id in sorted_product_ids:
-        item_data = product_data_map[prod_id]
-        if item_data['expenditure_total_quantity'] > 0 or item_data['expenditure_total_amount'] != 0:
-            summary_sheet.append([
-                prod_id, item_data['name'],
-                item_data['expenditure_total_quantity'], item_data['expenditure_total_amount']
-            ])
-            grand_total_expenditure_qty += item_data['expenditure_total_quantity']
-            grand_total_expenditure_amt += item_data['expenditure_total_amount']
-            summary_sheet.cell(row=current_row_summary, column=3).number_format = '#,##0'
-            summary_sheet.cell(row=current_row_summary, column=4).number_format = '#,##0.00'
-            current_row_summary += 1
+    for summary_row_values in summary_expenditure_rows.tolist():
+        summary_sheet.append(summary_row_values)
+        summary_sheet.cell(row=current_row_summary, column=3).number_format = '#,##0'
+        summary_sheet.cell(row=current_row_summary, column=4).number_format = '#,##0.00'
+        current_row_summary += 1
+
+    grand_total_expenditure_qty = summary_expenditure_rows[:, 2].sum()
+    grand_total_expenditure_amt = summary_expenditure_rows[:, 3].sum()
 
     summary_sheet.cell(row=current_row_summary, column=1, value="总计支出").font = bold_font
     summary_sheet.cell(row=current_row_summary, column=3, value=grand_total_expenditure_qty).font = bold_font
@@ -309,99 +356,103 @@ def process_tmall_sales_data(input_file_path):
     summary_sheet.column_dimensions['D'].width = 20
 
     # --- 5. 为每个商品创建并写入详情页 ---
-    # (这部分代码保持不变)
+    def format_detail_value_for_width(cell_value, column_title):
+        # 与Excel中的显示格式保持一致：数量带千分位，价格和金额带千分位及两位小数
+        if isinstance(cell_value, (int, float)) and cell_value != 0:
+            if column_title == '商品数量':
+                return f"{cell_value:,}"
+            if column_title in ['应结金额', '商品价格']:
+                return f"{cell_value:,.2f}"
+        return str(cell_value)
+
+    def build_detail_section_rows(df_section_data):
+        # format_df_for_detail_sheet 已按 DETAIL_SHEET_COLUMNS_TMALL 的顺序构建，无需再 reindex；
+        # 一次性转为object矩阵，仅对非数值列做空值填充和字符串化，避免逐列复制
+        assert list(df_section_data.columns) == DETAIL_SHEET_COLUMNS_TMALL
+        values_to_write = df_section_data.to_numpy(dtype=object)
+        str_values = values_to_write[:, DETAIL_SHEET_STR_COL_INDICES_TMALL]
+        str_values[pd.isna(str_values)] = ''
+        # 逐元素 str()，得到普通的 Python 字符串；不用 astype(str)，它会先生成按最长单元格定宽的数组
+        values_to_write[:, DETAIL_SHEET_STR_COL_INDICES_TMALL] = np.frompyfunc(str, 1, 1)(str_values)
+        return values_to_write.tolist()
+
+    def measure_detail_column_lengths(sections_with_titles):
+        # 直接在详情DataFrame上按列计算最大显示长度，代替写入后逐个单元格回读整张Sheet
+        max_lens = [len(column_title) for column_title in DETAIL_SHEET_COLUMNS_TMALL]
+        for df_section_data, section_title_str in sections_with_titles:
+            max_lens[0] = max(max_lens[0], len(section_title_str)) # 合计行的标题写在第一列
+            for col_idx, column_title in enumerate(DETAIL_SHEET_COLUMNS_TMALL):
+                column_values = df_section_data[column_title]
+                if column_title in DETAIL_SHEET_NUMERIC_COLUMNS_TMALL:
+                    # 数值列只需格式化去重后的取值，以及写在合计行中的总和
+                    candidate_values = pd.unique(column_values.to_numpy()).tolist()
+                    if column_title in ['商品数量', '应结金额']:
+                        candidate_values.append(column_values.sum())
+                    col_max_len = max((len(format_detail_value_for_width(v, column_title)) for v in candidate_values), default=0)
+                else:
+                    col_max_len = column_values.fillna('').astype(str).str.len().max() if not column_values.empty else 0
+                max_lens[col_idx] = max(max_lens[col_idx], col_max_len)
+        return max_lens
+
     for product_id_str_key in sorted_product_ids:
         product_info_item = product_data_map[product_id_str_key]
         detail_income_df_data = product_info_item['detail_income_df']
         detail_expenditure_df_data = product_info_item['detail_expenditure_df']
 
-        if detail_income_df_data.empty and detail_expenditure_df_data.empty:
+        if detail_income_df_data.empty and detail_expenditure_df_data is None:
             continue
 
-        clean_product_name_str = re.sub(r'[\\/\*\[\]\:?]', '_', str(product_info_item['name']))
-        potential_sheet_name_str = f"{product_id_str_key}_{clean_product_name_str}"
-        sheet_name_final = potential_sheet_name_str[:31] if len(potential_sheet_name_str) > 31 else potential_sheet_name_str
-        try:
-            product_detail_sheet = wb.create_sheet(sheet_name_final)
-        except:
-            product_detail_sheet = wb.create_sheet(potential_sheet_name_str[:28] + "...")
-
-        header_written_for_this_sheet = False
-
-        def write_section_to_sheet_detail(current_sheet_obj, df_section_data,
-                                         is_header_needed_flag, section_title_str=None):
-            nonlocal header_written_for_this_sheet
-
-            if df_section_data.empty and not section_title_str :
-                return
-
-            df_to_write_to_excel = df_section_data.copy()
-            df_to_write_to_excel = df_to_write_to_excel.reindex(columns=DETAIL_SHEET_COLUMNS_TMALL, fill_value='')
-
-
-            for col_name_fmt in df_to_write_to_excel.columns:
-                if col_name_fmt not in ['商品价格', '商品数量', '应结金额']:
-                    df_to_write_to_excel[col_name_fmt] = df_to_write_to_excel[col_name_fmt].fillna('').astype(str)
-
-            if is_header_needed_flag and not header_written_for_this_sheet:
-                current_sheet_obj.append(DETAIL_SHEET_COLUMNS_TMALL)
-                for cell_header_obj in current_sheet_obj[current_sheet_obj.max_row]:
-                    cell_header_obj.font = bold_font
-                    cell_header_obj.alignment = center_alignment
-                header_written_for_this_sheet = True
-
-            for _, row_data_item in df_to_write_to_excel.iterrows():
-                 current_sheet_obj.append(row_data_item.tolist())
-
-            if section_title_str:
-                total_row_idx_for_section = current_sheet_obj.max_row + 1
-                current_sheet_obj.cell(row=total_row_idx_for_section, column=1, value=section_title_str).font = bold_font
-
-                section_qty_sum = df_section_data['商品数量'].sum()
-                section_amt_sum = df_section_data['应结金额'].sum()
-
-                qty_col_idx_detail = DETAIL_SHEET_COLUMNS_TMALL.index('商品数量') + 1
-                cell_qty_detail = current_sheet_obj.cell(row=total_row_idx_for_section, column=qty_col_idx_detail, value=section_qty_sum)
-                cell_qty_detail.font = bold_font; cell_qty_detail.number_format = '#,##0'
-
-                amt_col_idx_detail = DETAIL_SHEET_COLUMNS_TMALL.index('应结金额') + 1
-                cell_amt_detail = current_sheet_obj.cell(row=total_row_idx_for_section, column=amt_col_idx_detail, value=section_amt_sum)
-                cell_amt_detail.font = bold_font; cell_amt_detail.number_format = '#,##0.00'
-
-        write_section_to_sheet_detail(product_detail_sheet, detail_income_df_data, True, "收入总计")
-
-        if not detail_expenditure_df_data.empty or True:
-            product_detail_sheet.append([])
-            write_section_to_sheet_detail(
-                product_detail_sheet,
-                detail_expenditure_df_data,
-                not header_written_for_this_sheet,
-                "支出总计"
-            )
-
-        if header_written_for_this_sheet:
-            for current_col_idx_detail, current_column_title_detail in enumerate(DETAIL_SHEET_COLUMNS_TMALL, 1):
-                column_letter_val_detail_sheet = get_column_letter(current_col_idx_detail)
-                max_len_content = len(str(current_column_title_detail))
-                for row_num_val_detail_sheet in range(1, product_detail_sheet.max_row + 1):
-                    cell_val_obj_detail_sheet = product_detail_sheet.cell(row=row_num_val_detail_sheet, column=current_col_idx_detail).value
-                    if cell_val_obj_detail_sheet is not None:
-                        if isinstance(cell_val_obj_detail_sheet, (int, float)) and cell_val_obj_detail_sheet != 0:
-                            if current_column_title_detail == '商品数量':
-                                max_len_content = max(max_len_content, len(f"{cell_val_obj_detail_sheet:,}"))
-                            elif current_column_title_detail in ['应结金额', '商品价格']:
-                                 max_len_content = max(max_len_content, len(f"{cell_val_obj_detail_sheet:,.2f}"))
-                            else:
-                                max_len_content = max(max_len_content, len(str(cell_val_obj_detail_sheet)))
-                        else:
-                             max_len_content = max(max_len_content, len(str(cell_val_obj_detail_sheet)))
-
-                adjusted_col_width = min(max(max_len_content + 4, 12), 60)
-                if current_column_title_detail == "商品名称": adjusted_col_width = min(max(max_len_content + 4, 40), 70)
-                elif current_column_title_detail == "商品属性": adjusted_col_width = min(max(max_len_content + 4, 30), 60)
-                elif current_column_title_detail in ['订单创建时间', '订单付款时间', '发货时间']: adjusted_col_width = min(max(max_len_content + 4, 19), 25)
-                elif current_column_title_detail in ['订单编号', '子订单编号', '商品编号', '物流单号']: adjusted_col_width = min(max(max_len_content +4, 22), 35)
-                product_detail_sheet.column_dimensions[column_letter_val_detail_sheet].width = adjusted_col_width
+        detail_sections_with_titles = [(detail_income_df_data, "收入总计")]
+        if detail_expenditure_df_data is not None:
+            detail_sections_with_titles.append((detail_expenditure_df_data, "支出总计"))
+
+        # 商品编号和名称一并清理非法字符并截断到31个字符，保证 create_sheet 不会因名称非法而失败
+        potential_sheet_name_str = f"{product_id_str_key}_{product_info_item['name']}"
+        sheet_name_final = potential_sheet_name_str.translate(SHEET_NAME_TRANSLATION_TABLE)[:31]
+        product_detail_sheet = wb.create_sheet(sheet_name_final)
+
+        # 整张详情页先拼成一个完整的行列表(表头、收入明细、收入总计，以及可能存在的空行、支出明细、支出总计)，
+        # 一次循环全部写入，再只对表头和两个总计行设置样式，而不是边写边穿插格式化调用
+        qty_col_idx_detail = DETAIL_SHEET_COLUMNS_TMALL.index('商品数量')
+        amt_col_idx_detail = DETAIL_SHEET_COLUMNS_TMALL.index('应结金额')
+        detail_sheet_rows = [DETAIL_SHEET_COLUMNS_TMALL]
+        total_row_indices = []
+        for section_index, (df_section_data, section_title_str) in enumerate(detail_sections_with_titles):
+            if section_index > 0:
+                detail_sheet_rows.append([])
+            detail_sheet_rows.extend(build_detail_section_rows(df_section_data))
+
+            section_total_row = [None] * len(DETAIL_SHEET_COLUMNS_TMALL)
+            section_total_row[0] = section_title_str
+            section_total_row[qty_col_idx_detail] = df_section_data['商品数量'].sum()
+            section_total_row[amt_col_idx_detail] = df_section_data['应结金额'].sum()
+            detail_sheet_rows.append(section_total_row)
+            total_row_indices.append(len(detail_sheet_rows))
+
+        for detail_row_values in detail_sheet_rows:
+            product_detail_sheet.append(detail_row_values)
+
+        for cell_header_obj in product_detail_sheet[1]:
+            cell_header_obj.font = bold_font
+            cell_header_obj.alignment = center_alignment
+        for total_row_idx_for_section in total_row_indices:
+            product_detail_sheet.cell(row=total_row_idx_for_section, column=1).font = bold_font
+            cell_qty_detail = product_detail_sheet.cell(row=total_row_idx_for_section, column=qty_col_idx_detail + 1)
+            cell_qty_detail.font = bold_font; cell_qty_detail.number_format = '#,##0'
+            cell_amt_detail = product_detail_sheet.cell(row=total_row_idx_for_section, column=amt_col_idx_detail + 1)
+            cell_amt_detail.font = bold_font; cell_amt_detail.number_format = '#,##0.00'
+
+        detail_column_max_lens = measure_detail_column_lengths(detail_sections_with_titles)
+        for current_col_idx_detail, current_column_title_detail in enumerate(DETAIL_SHEET_COLUMNS_TMALL, 1):
+            column_letter_val_detail_sheet = get_column_letter(current_col_idx_detail)
+            max_len_content = detail_column_max_lens[current_col_idx_detail - 1]
+
+            adjusted_col_width = min(max(max_len_content + 4, 12), 60)
+            if current_column_title_detail == "商品名称": adjusted_col_width = min(max(max_len_content + 4, 40), 70)
+            elif current_column_title_detail == "商品属性": adjusted_col_width = min(max(max_len_content + 4, 30), 60)
+            elif current_column_title_detail in ['订单创建时间', '订单付款时间', '发货时间']: adjusted_col_width = min(max(max_len_content + 4, 19), 25)
+            elif current_column_title_detail in ['订单编号', '子订单编号', '商品编号', '物流单号']: adjusted_col_width = min(max(max_len_content +4, 22), 35)
+            product_detail_sheet.column_dimensions[column_letter_val_detail_sheet].width = adjusted_col_width
 
     # --- 6. 确保 "销售总结" 工作表为第一个 ---
     if wb.sheetnames[0] != "销售总结" and "销售总结" in wb.sheetnames:
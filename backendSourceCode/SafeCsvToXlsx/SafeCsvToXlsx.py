@@ -5,7 +5,8 @@
 
 功能:
 1. 通过拖拽方式接收一个或多个CSV文件进行批量转换。
-2. 使用 chardet 库自动检测文件编码，极大提高对不同来源文件的兼容性。
+2. 自动检测文件编码（优先使用 cchardet 或 charset-normalizer，均未安装时回退到 chardet），
+   极大提高对不同来源文件的兼容性。
 3. 自动嗅探CSV文件的分隔符 (通常是逗号或分号)。
 4. 智能分析每一列的数据内容，以防止在Excel中打开时发生常见的数据损坏问题：
     - 长数字（如订单号、身份证号）因超出15位精度而被截断或末尾变为0。
@@ -25,9 +26,52 @@ import pandas as pd
 import sys
 import os
 import re
-import csv
-import numpy as np
-import chardet
+import json
+import hashlib
+import tempfile
+import io
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+
+# 编码检测后端。chardet 为纯Python实现，在较大的样本上很慢；优先使用更快的 cchardet
+# 或 charset-normalizer，两者都不可用时才回退到 chardet。
+# 无论使用哪个库，_detect_charset() 都返回与 chardet.detect() 相同结构的字典。
+try:
+    from cchardet import detect as _detect_charset
+except ImportError:
+    try:
+        from charset_normalizer import from_bytes as _charset_normalizer_from_bytes
+
+        def _detect_charset(raw_data):
+            best_match = _charset_normalizer_from_bytes(raw_data).best()
+            if best_match is None:
+                return {'encoding': None, 'confidence': 0.0}
+            return {'encoding': best_match.encoding, 'confidence': 1.0 - best_match.chaos}
+    except ImportError:
+        from chardet import detect as _detect_charset
+
+# 可选依赖：pyahocorasick。安装后用 Aho-Corasick 自动机一次扫描匹配所有危险关键字，
+# 未安装时回退到 FORMULA_INJECTION_PATTERN 正则表达式，两者的判定结果一致。
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 可选依赖：google-re2。安装后 FORMULA_INJECTION_PATTERN 使用线性时间的RE2引擎编译，
+# 未安装时使用标准库 re。
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# 可选依赖：xlsxwriter。安装后以 constant_memory 模式写出XLSX（每行写完立即落盘），
+# 未安装时使用 openpyxl 的 write_only 模式。
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
 
 # 主动采纳Pandas未来的行为，以消除FutureWarning。
 pd.set_option('future.no_silent_downcasting', True)
@@ -37,12 +81,46 @@ pd.set_option('future.no_silent_downcasting', True)
 # 预扫描的行数。程序会读取文件的前这么多行来分析数据结构，
 SAMPLE_ROWS = 1000
 
+# 检测编码和分隔符时读取的文件头部字节数。
+HEAD_BYTES = 10000
+
+# 候选分隔符（按优先级排列，票数相同时取靠前者）及参与投票的最大行数。
+DELIMITER_CANDIDATES = [',', ';', '\t', '|']
+DELIMITER_VOTE_LINES = 20
+
+# 列分析结果的缓存目录。同一个文件被反复拖入时，只要文件未被修改，就直接复用上次的分析结果。
+DTYPE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.safecsv_cache')
+
+# 完整读取时每块的行数。文件按块读取、净化并流式写入Excel，内存占用只与块大小有关，
+# 而不再随文件大小线性增长。
+CHUNK_ROWS = 100_000
+
+# xlsxwriter 的工作簿选项。关闭字符串到数字、公式、链接的自动转换，单元格内容原样写为文本
+# （以'='开头的字符串由 _write_xlsxwriter_string 单独处理）；NaN/inf 写为Excel错误值而不是抛出异常。
+XLSXWRITER_OPTIONS = {
+    'constant_memory': True,
+    'strings_to_numbers': False,
+    'strings_to_formulas': False,
+    'strings_to_urls': False,
+    'nan_inf_to_errors': True,
+}
+
 # 数字长度阈值。当一列中检测到任何长度大于或等于此值的纯数字字符串时，
 # 该列将被强制转换为文本格式，以同时解决Excel的15位精度丢失和12位科学计数法显示问题。
 PRECISION_THRESHOLD = 12
 
+# 编译后的正则表达式，用于判断一个值是否需要所在列被强制作为文本处理。
+# 三条规则合并为一个模式，每列只需扫描一次：
+#   规则1: 前导零保护 (例如 '007', '012345')
+#   规则2: 可疑日期格式保护 (例如 '10-12', '5-1')
+#   规则3: 长数字保护 (长度 >= PRECISION_THRESHOLD 的纯数字，解决精度丢失和科学计数法显示问题)
+FORCED_TEXT_PATTERN = re.compile(
+    r'^(?:0[0-9]+|\d{1,2}-\d{1,2}|\d{' + str(PRECISION_THRESHOLD) + r',})$'
+)
+
 # 危险公式关键字列表（检测时不区分大小写）。
 # 这些关键字常用于调用外部程序、链接或服务，是公式注入攻击的常见特征。
+# 关键字按正则表达式解释，其中的 '.' 匹配任意字符（如 '.exe' 同时覆盖 'xexe'、'_exe'）。
 RISKY_KEYWORDS = [
     'cmd', 'powershell', 'exec', '.exe', 'call', 'register.id',
     'urlmon', 'webservice', 'filterxml', 'hyperlink'
@@ -52,51 +130,211 @@ RISKY_KEYWORDS = [
 # 它的逻辑是：匹配一个以公式符号（=, +, -, @）开头，
 # 并且后面包含了DDE攻击特征（|...!)或任何一个RISKY_KEYWORDS的字符串。
 # 使用非捕获组 (?:...) 是为了优化性能并消除Pandas的UserWarning。
-FORMULA_INJECTION_PATTERN = re.compile(
-    r'^\s*[\=\+\-\@].*(?:\|.*!|' + '|'.join(RISKY_KEYWORDS) + ')',
-    re.IGNORECASE
+# DDE特征写作 [^|\n]*\|[^!\n]*! 而不是 .*\|.*!：两段都只能确定性地扫描到下一个 '|' 或 '!'，
+# 避免包含大量 '|' 却没有 '!' 的超长单元格触发平方级回溯 (ReDoS)。判定结果与原写法相同。
+FORMULA_INJECTION_REGEX = (
+    r'^\s*[\=\+\-\@](?:[^|\n]*\|[^!\n]*!|.*(?:' + '|'.join(RISKY_KEYWORDS) + '))'
 )
+if re2 is not None:
+    FORMULA_INJECTION_PATTERN = re2.compile('(?i)' + FORMULA_INJECTION_REGEX)
+else:
+    FORMULA_INJECTION_PATTERN = re.compile(FORMULA_INJECTION_REGEX, re.IGNORECASE)
+
+# 公式的起始符号。绝大多数单元格不以这些符号开头，先用它们批量过滤，
+# 只有剩下的少量候选单元格才需要进一步检查。
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+# 以空白开头、空白之后才是公式符号的单元格。它们很少见，但 FORMULA_INJECTION_PATTERN
+# 允许前导空白，所以需要单独找出来；锚定在开头的匹配对普通单元格第一个字符就会失败。
+LEADING_WHITESPACE_FORMULA_PATTERN = re.compile(r'\s+[\=\+\-\@]')
+
+# 由 RISKY_KEYWORDS 中不含 '.' 的关键字构建的 Aho-Corasick 自动机（未安装 pyahocorasick 时为 None）。
+# 含 '.' 的关键字是通配模式，自动机只能按字面匹配，交给 WILDCARD_KEYWORD_PATTERN 检查。
+if ahocorasick is not None:
+    RISKY_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for keyword in RISKY_KEYWORDS:
+        if '.' not in keyword:
+            RISKY_KEYWORD_AUTOMATON.add_word(keyword, keyword)
+    RISKY_KEYWORD_AUTOMATON.make_automaton()
+else:
+    RISKY_KEYWORD_AUTOMATON = None
+
+# RISKY_KEYWORDS 中含 '.' 的通配关键字，与自动机配合使用。
+WILDCARD_KEYWORD_PATTERN = re.compile('|'.join(kw for kw in RISKY_KEYWORDS if '.' in kw), re.IGNORECASE)
+
+# 常见BOM及其对应的编码。UTF-32 LE 的BOM以 UTF-16 LE 的BOM开头，因此必须排在前面。
+BOM_ENCODINGS = [
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe\x00\x00', 'utf-32'),
+    (b'\x00\x00\xfe\xff', 'utf-32'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+]
+
+def _select_csv_engine(delimiter):
+    """
+    根据分隔符选择 pandas.read_csv 的解析引擎。
+    
+    单字符分隔符使用C引擎，其解析结果与Python引擎一致但速度快得多；只有多字符分隔符
+    (C引擎不支持) 才退回到Python引擎。这里刻意不使用pyarrow引擎：它会先按数值/日期
+    推断类型再转换为字符串，即使指定了 dtype=str 也会丢失前导零、把日期样式的文本
+    解析成日期，这正是本工具要防止的数据损坏。
+    
+    Args:
+        delimiter (str): CSV分隔符。
+        
+    Returns:
+        str: 'c' 或 'python'。
+    """
+    return 'c' if len(delimiter) == 1 else 'python'
 
-def detect_encoding_and_delimiter(file_path):
+def _vote_delimiter(raw_data, encoding):
     """
-    使用 chardet 和 csv.Sniffer 自动检测文件的编码和分隔符。
+    根据文件头部的字节统计候选分隔符的出现次数，选出CSV文件的分隔符。
+    
+    对每个候选分隔符，取它在头部各完整行中出现次数的最小值（即每一行都稳定出现的次数），
+    最小值最大的候选者即为分隔符。直接复用检测编码时读取的字节，无需重新打开文件。
+    
+    Args:
+        raw_data (bytes): 文件头部的原始字节。
+        encoding (str): 文件编码。
+        
+    Returns:
+        str: 检测到的分隔符，无法检测时返回逗号 ','。
+    """
+    try:
+        head_text = raw_data.decode(encoding, errors='ignore')
+    except (LookupError, TypeError):
+        head_text = ''
+    lines = [line for line in head_text.split('\n')[:DELIMITER_VOTE_LINES + 1] if line.strip()]
+    # 头部的最后一行通常被截断，有多行时不参与统计
+    if len(lines) > 1 and len(raw_data) >= HEAD_BYTES:
+        lines = lines[:-1]
+
+    if lines:
+        min_counts = [min(line.count(candidate) for line in lines) for candidate in DELIMITER_CANDIDATES]
+        best_count = max(min_counts)
+        if best_count > 0:
+            delimiter = DELIMITER_CANDIDATES[min_counts.index(best_count)]
+            print(f"  -> 检测到分隔符: '{delimiter}'")
+            return delimiter
+
+    print(f"  -> 警告: 无法自动检测分隔符，将默认使用逗号 ','。")
+    return ','
+
+def detect_encoding_and_delimiter(file_path, csv_file=None):
+    """
+    使用编码检测库和分隔符投票自动检测文件的编码和分隔符。
+    带BOM或头部为纯ASCII的文件可直接确定编码，无需调用编码检测库。
     
     Args:
         file_path (str): CSV文件的完整路径。
+        csv_file (file, optional): 已按二进制模式打开的同一文件。提供时直接从中读取，
+            不再重新打开文件。
         
     Returns:
         tuple: (encoding, delimiter)，如果成功则返回检测结果，否则返回默认值。
     """
-    encoding, delimiter = 'gbk', ',' # 默认回退值
+    encoding = 'gbk' # 默认回退值
+    raw_data = b''
     
-    # 1. 使用 chardet 检测编码
+    # 1. 检测编码
     try:
-        with open(file_path, 'rb') as f:
-            raw_data = f.read(10000) # 读取文件头部一小部分字节用于检测
-            if not raw_data: # 文件为空
-                return None, None
-            detection = chardet.detect(raw_data)
+        if csv_file is not None:
+            csv_file.seek(0)
+            raw_data = csv_file.read(HEAD_BYTES) # 读取文件头部一小部分字节用于检测
+        else:
+            with open(file_path, 'rb') as f:
+                raw_data = f.read(HEAD_BYTES)
+        if not raw_data: # 文件为空
+            return None, None
+
+        bom_encoding = next((enc for bom, enc in BOM_ENCODINGS if raw_data.startswith(bom)), None)
+        if bom_encoding:
+            # 有BOM时编码是确定的，直接返回，无需再检测
+            encoding = bom_encoding
+            print(f"  -> 检测到BOM，编码: {encoding}")
+            return encoding, _vote_delimiter(raw_data, encoding)
+
+        if raw_data.isascii():
+            # 头部全是ASCII字节时，按 utf-8 读取同样兼容后续可能出现的非ASCII内容
+            encoding = 'utf-8'
+            print(f"  -> 文件头部为纯ASCII，按 {encoding} 读取")
+        else:
+            detection = _detect_charset(raw_data)
             encoding = detection['encoding']
-            confidence = detection['confidence']
-            print(f"  -> chardet检测到编码: {encoding} (置信度: {confidence:.0%})")
+            confidence = detection['confidence'] or 0.0
+            print(f"  -> 检测到编码: {encoding} (置信度: {confidence:.0%})")
             # 对于常见的中文编码，如gb2312是gbk的子集，直接使用gbk更稳妥
             if encoding and 'gb' in encoding.lower():
                 encoding = 'gbk'
     except Exception as e:
         print(f"  -> 警告: 编码检测失败: {e}。将使用默认编码。")
 
-    # 2. 使用检测到的编码来嗅探分隔符
+    # 2. 使用检测到的编码解码同一段头部字节，统计出分隔符
+    return encoding, _vote_delimiter(raw_data, encoding)
+
+def _dtype_cache_path_and_key(file_path, encoding, delimiter):
+    """
+    计算文件对应的缓存文件路径和缓存键。
+    
+    缓存键包含文件的修改时间、大小，以及影响分析结果的编码、分隔符和全局配置，
+    任何一项变化都会使缓存失效。
+    
+    Args:
+        file_path (str): CSV文件的完整路径。
+        encoding (str): 文件编码。
+        delimiter (str): CSV分隔符。
+        
+    Returns:
+        tuple: (缓存文件路径, 缓存键列表)。
+    """
+    abs_path = os.path.abspath(file_path)
+    file_stat = os.stat(abs_path)
+    cache_key = [file_stat.st_mtime_ns, file_stat.st_size, encoding, delimiter,
+                 SAMPLE_ROWS, PRECISION_THRESHOLD]
+    cache_name = hashlib.sha1(abs_path.encode('utf-8')).hexdigest() + '.json'
+    return os.path.join(DTYPE_CACHE_DIR, cache_name), cache_key
+
+def _load_cached_forced_text_cols(cache_path, cache_key):
+    """读取缓存的强制文本列列表。缓存不存在、已失效或损坏时返回 None。"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('key') == cache_key:
+            return cached['forced_text_cols']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return None
+
+def _save_cached_forced_text_cols(cache_path, cache_key, forced_text_cols):
+    """
+    将强制文本列列表写入缓存。先写临时文件再重命名，避免留下写了一半的缓存文件。
+    缓存只是加速手段，写入失败时静默忽略。
+    """
     try:
-        with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-            sniffer = csv.Sniffer()
-            delimiter = sniffer.sniff(f.read(2048)).delimiter
-            print(f"  -> Sniffer检测到分隔符: '{delimiter}'")
+        os.makedirs(DTYPE_CACHE_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=DTYPE_CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': cache_key, 'forced_text_cols': forced_text_cols}, f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
     except Exception:
-        print(f"  -> 警告: 无法自动检测分隔符，将默认使用逗号 ','。")
-
-    return encoding, delimiter
+        pass
+
+def _print_forced_text_cols(forced_text_cols):
+    """打印需要强制转换为文本的列。"""
+    if forced_text_cols:
+        print("  -> 分析完成。以下列将被强制转换为文本以保留原始格式:")
+        for col in sorted(list(forced_text_cols)):
+            print(f"     - {col}")
+    else:
+        print("  -> 分析完成。未发现需要强制转换格式的列。")
 
-def analyze_columns(file_path, encoding, delimiter):
+def analyze_columns(file_path, encoding, delimiter, csv_file=None):
     """
     通过预扫描文件来分析哪些列需要被强制指定为文本类型。
     这是实现“智能转换”的核心步骤，它为后续的完整读取制定规则。
@@ -105,6 +343,8 @@ def analyze_columns(file_path, encoding, delimiter):
         file_path (str): CSV文件的完整路径。
         encoding (str): 文件编码。
         delimiter (str): CSV分隔符。
+        csv_file (file, optional): 已按二进制模式打开的同一文件。提供时从文件开头重新读取，
+            不再重新打开文件。
         
     Returns:
         dict: 一个适用于Pandas read_csv的dtype字典，例如 {'订单号': str}。
@@ -112,45 +352,37 @@ def analyze_columns(file_path, encoding, delimiter):
     print("  -> (1/4) 正在预扫描文件以分析数据结构...")
     forced_text_cols = set()
     try:
+        cache_path, cache_key = _dtype_cache_path_and_key(file_path, encoding, delimiter)
+        cached_cols = _load_cached_forced_text_cols(cache_path, cache_key)
+        if cached_cols is not None:
+            print("  -> 文件未修改，复用上次的分析结果。")
+            _print_forced_text_cols(cached_cols)
+            return {col: str for col in cached_cols}
+
         # 第一遍读取：只读样本行，且将所有列都当作字符串，以100%保留原始格式
+        if csv_file is not None:
+            csv_file.seek(0)
         df_sample = pd.read_csv(
-            file_path,
+            file_path if csv_file is None else csv_file,
             encoding=encoding,
             sep=delimiter,
             dtype=str,
             nrows=SAMPLE_ROWS,
             keep_default_na=False,
-            engine='python' # 使用更健壮的Python引擎以更好地处理复杂CSV
+            engine=_select_csv_engine(delimiter)
         )
 
-        for col in df_sample.columns:
-            # 创建一个没有空值和空白的临时Series用于分析
-            series_non_null = df_sample[col].str.strip().replace('', np.nan).dropna()
-            if series_non_null.empty:
-                continue
-
-            # 规则1: 前导零保护 (例如 '007', '012345')
-            if series_non_null.str.match(r'^0[0-9]+$').any():
-                forced_text_cols.add(col)
-                continue
-
-            # 规则2: 可疑日期格式保护 (例如 '10-12', '5-1')
-            if series_non_null.str.match(r'^\d{1,2}-\d{1,2}$').any():
-                forced_text_cols.add(col)
-                continue
-                
-            # 规则3: 长数字保护 (解决精度丢失和科学计数法显示问题)
-            numeric_strings = series_non_null[series_non_null.str.isdigit()]
-            if not numeric_strings.empty and numeric_strings.str.len().max() >= PRECISION_THRESHOLD:
-                forced_text_cols.add(col)
-                continue
-
-        if forced_text_cols:
-            print("  -> 分析完成。以下列将被强制转换为文本以保留原始格式:")
-            for col in sorted(list(forced_text_cols)):
-                print(f"     - {col}")
-        else:
-            print("  -> 分析完成。未发现需要强制转换格式的列。")
+        # 把所有列堆叠为一个长Series，去空格后用 FORCED_TEXT_PATTERN 一次匹配全部样本单元格
+        # (前导零、可疑日期、长数字三条规则)，再按列名归约出需要强制为文本的列。
+        # 空字符串不会匹配该模式，因此无需事先剔除空值。
+        stacked_cells = df_sample.stack()
+        if not stacked_cells.empty:
+            cell_hits = stacked_cells.str.strip().str.contains(FORCED_TEXT_PATTERN, regex=True, na=False)
+            column_hits = cell_hits.groupby(level=1, sort=False).any()
+            forced_text_cols = set(column_hits.index[column_hits.to_numpy()])
+
+        _print_forced_text_cols(forced_text_cols)
+        _save_cached_forced_text_cols(cache_path, cache_key, sorted(forced_text_cols))
 
         return {col: str for col in forced_text_cols}
 
@@ -159,82 +391,260 @@ def analyze_columns(file_path, encoding, delimiter):
         return {}
 
 
-def sanitize_dataframe(df):
+def _is_risky_formula(text):
     """
-    遍历DataFrame，查找并净化所有潜在的公式注入单元格。
+    判断一个已去除前导空白、且以公式符号开头的单元格是否为危险公式。
+    
+    判定规则与 FORMULA_INJECTION_PATTERN 相同：公式符号之后、同一行内出现DDE攻击特征
+    (|...!) 或任一 RISKY_KEYWORDS。安装了 pyahocorasick 时用自动机一次扫描所有字面关键字，
+    含通配符的关键字用 WILDCARD_KEYWORD_PATTERN 检查。
     
     Args:
-        df (pd.DataFrame): 待处理的DataFrame。
+        text (str): 待检查的单元格内容。
         
     Returns:
-        pd.DataFrame: 经过净化处理的DataFrame。
+        bool: 是危险公式时返回 True。
+    """
+    if RISKY_KEYWORD_AUTOMATON is None:
+        return FORMULA_INJECTION_PATTERN.match(text) is not None
+
+    # 正则中的 '.' 不匹配换行符，因此只检查公式符号之后的第一行
+    formula_body = text[1:].split('\n', 1)[0]
+    pipe_pos = formula_body.find('|')
+    if pipe_pos != -1 and '!' in formula_body[pipe_pos + 1:]:
+        return True
+    if next(RISKY_KEYWORD_AUTOMATON.iter(formula_body.lower()), None) is not None:
+        return True
+    return WILDCARD_KEYWORD_PATTERN.search(formula_body) is not None
+
+def _sanitize_chunk(df, object_cols=None):
+    """
+    净化DataFrame中所有潜在的公式注入单元格，不打印任何信息。
+    
+    Args:
+        df (pd.DataFrame): 待处理的DataFrame（或按块读取的其中一块）。
+        object_cols (list, optional): 调用方已经得到的'object'类型列名列表，
+            为 None 时在函数内部重新计算。
+        
+    Returns:
+        tuple: (净化后的DataFrame, 本次处理的风险单元格数量)。
     """
-    print("  -> (3/4) 正在扫描并净化潜在的恶意公式...")
     sanitized_count = 0
     
     # 只选择数据类型为'object'（通常是字符串）的列进行检查，以提高效率
-    for col in df.select_dtypes(include=['object']).columns:
-        # 使用.astype(str)确保所有内容都为字符串，然后用正则表达式进行匹配
-        mask = df[col].astype(str).str.contains(FORMULA_INJECTION_PATTERN, na=False, regex=True)
+    if object_cols is None:
+        object_cols = df.select_dtypes(include=['object']).columns
+    for col in object_cols:
+        # 按 dtype=str 读取的列本身就是字符串，无需再 .astype(str) 复制整列；
+        # 非字符串的单元格经 .str 访问器得到 NaN，不会被当作候选。
+        # 先用 startswith 批量筛出以公式符号开头的候选单元格（不复制字符串），
+        # 再补上少见的带前导空白的公式，最后只对候选单元格做关键字检查
+        series = df[col]
+        candidate_mask = (
+            series.str.startswith(FORMULA_PREFIXES, na=False)
+            | series.str.match(LEADING_WHITESPACE_FORMULA_PATTERN, na=False)
+        )
+        if not candidate_mask.any():
+            continue
+        # 在候选掩码的副本上只改写候选位置，得到布尔数组
+        mask = candidate_mask.to_numpy(copy=True)
+        mask[mask] = series[candidate_mask].str.lstrip().map(_is_risky_formula).to_numpy(dtype=bool)
         
         if mask.any():
             # 对所有匹配到的危险单元格，在其内容前添加一个单引号
-            df.loc[mask, col] = "'" + df.loc[mask, col].astype(str)
+            df.loc[mask, col] = "'" + series[mask]
             sanitized_count += mask.sum()
-                
+    
+    return df, sanitized_count
+
+def _print_sanitize_summary(sanitized_count):
+    """打印公式注入净化的统计结果。"""
     if sanitized_count > 0:
         print(f"  -> 净化完成。共处理了 {sanitized_count} 个有风险的单元格。")
     else:
         print("  -> 扫描完成。未发现需要净化的风险单元格。")
-        
-    return df
 
-def main():
-    """主执行函数，处理命令行参数和文件转换流程。"""
-    files_to_process = sys.argv[1:]
+def _write_xlsxwriter_string(worksheet, row, col, token, *args):
+    """
+    xlsxwriter 的字符串写入处理函数，使字符串的写法与 openpyxl 一致：
+    长度大于1、以'='开头的写为公式，其余非空字符串写为文本（包括'{=...}'，不当作数组公式）；
+    空字符串返回 None，交给 xlsxwriter 按默认方式处理。
+    """
+    if len(token) > 1 and token.startswith('='):
+        return worksheet.write_formula(row, col, token, *args)
+    if token:
+        return worksheet.write_string(row, col, token, *args)
+    return None
 
-    if not files_to_process:
-        print("csv到xlsx转换工具")
-        print("用法: 请将一个或多个CSV文件拖拽到本程序的图标上。")
-        input("\n按回车键退出...")
-        return
+def _open_xlsx_writer(output_path):
+    """
+    打开一个逐行流式写入的XLSX输出。有 xlsxwriter 时使用其 constant_memory 模式，
+    否则使用 openpyxl 的 write_only 模式。
+    两种方式写出的单元格类型相同：以'='开头的字符串（已通过公式注入检查的）
+    与原先 to_excel 一样保留为公式，其余字符串为文本。
+    
+    Args:
+        output_path (str): 输出XLSX文件的完整路径。
+        
+    Returns:
+        tuple: (append_row, save) 两个函数。append_row(row) 按顺序追加一行，
+            save() 完成写入并关闭文件。
+    """
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(output_path, XLSXWRITER_OPTIONS)
+        ws = wb.add_worksheet('Sheet1')
+        ws.add_write_handler(str, _write_xlsxwriter_string)
+        next_row_index = [0]
+
+        def append_row(row):
+            ws.write_row(next_row_index[0], 0, row)
+            next_row_index[0] += 1
+
+        def save():
+            try:
+                wb.close()
+            except xlsxwriter.exceptions.FileCreateError as e:
+                # 还原为底层的 IOError（如 PermissionError），以便调用方给出准确的提示
+                raise e.args[0] if e.args and isinstance(e.args[0], OSError) else e
+
+        return append_row, save
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title='Sheet1')
+    return ws.append, lambda: wb.save(output_path)
+
+def _unify_chunk_dtype(chunk_dtypes):
+    """
+    合并同一列在各数据块中分别推断出的类型，使结果与整列一次性推断时相同。
+    
+    各块类型一致时沿用该类型；整数块与浮点数块混合时整列为浮点数；
+    其他组合（如某一块中出现了'N/A'等文本而被推断为字符串）整列按文本读取，保留原始内容。
+    
+    Args:
+        chunk_dtypes (list): 该列在每个数据块中的dtype。
+        
+    Returns:
+        一个适用于Pandas read_csv的dtype。
+    """
+    unique_dtypes = set(chunk_dtypes)
+    is_number = lambda dtype: pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    if len(unique_dtypes) == 1:
+        dtype = unique_dtypes.pop()
+        return dtype if is_number(dtype) or pd.api.types.is_bool_dtype(dtype) else str
+    if all(is_number(dtype) for dtype in unique_dtypes):
+        return 'float64'
+    return str
+
+def convert_csv_to_xlsx(file_path, encoding, delimiter, dtype_map, output_path, csv_file=None):
+    """
+    按块读取完整CSV文件，逐块清洗、净化后逐行流式写入XLSX文件。
+    
+    与一次性读入整个DataFrame再调用 to_excel 相比，峰值内存只与 CHUNK_ROWS 有关。
+    pandas 对每个数据块单独推断类型，同一列在不同块中可能得到不同类型（例如前10万行是整数、
+    后面出现了'N/A'），因此超过一块的文件先完整读一遍，只记录各块推断出的类型，
+    合并出每列的统一类型后，再按统一类型重新读取写出；只有一块的文件直接使用第一遍的结果。
+    
+    Args:
+        file_path (str): CSV文件的完整路径。
+        encoding (str): 文件编码。
+        delimiter (str): CSV分隔符。
+        dtype_map (dict): analyze_columns 得出的dtype字典。
+        output_path (str): 输出XLSX文件的完整路径。
+        csv_file (file, optional): 已按二进制模式打开的同一文件。提供时从文件开头重新读取。
+    """
+    print("  -> (2/4) 正在分块读取完整文件...")
+    print("  -> (3/4) 正在扫描并净化潜在的恶意公式...")
+    
+    append_row, save_workbook = _open_xlsx_writer(output_path)
+    sanitized_count = 0
+    cleaned_columns = None # 各数据块的列名相同，去空格后的列名只计算一次
+    
+    def read_chunks(dtype):
+        if csv_file is not None:
+            csv_file.seek(0)
+        return pd.read_csv(
+            file_path if csv_file is None else csv_file, encoding=encoding, sep=delimiter, dtype=dtype,
+            keep_default_na=False, engine=_select_csv_engine(delimiter),
+            chunksize=CHUNK_ROWS
+        )
+    
+    # 使用分析得出的规则读取完整文件，先记录每块中各列推断出的类型
+    first_chunk = None
+    chunk_dtypes = []
+    with read_chunks(dtype_map) as chunk_reader:
+        for chunk in chunk_reader:
+            if first_chunk is None:
+                first_chunk = chunk
+            chunk_dtypes.append(chunk.dtypes.tolist())
+    
+    if len(chunk_dtypes) > 1:
+        # 列名可能重复（pandas 会重命名为'列.1'），按列位置指定统一后的类型
+        unified_dtype_map = {i: _unify_chunk_dtype(dtypes) for i, dtypes in enumerate(zip(*chunk_dtypes))}
+        chunk_reader = read_chunks(unified_dtype_map)
+    else:
+        chunk_reader = contextlib.nullcontext([] if first_chunk is None else [first_chunk])
+    
+    with chunk_reader as chunks:
+        for chunk in chunks:
+            # 基础清洗：去除列名和所有字符串单元格的前后空格
+            if cleaned_columns is None:
+                cleaned_columns = chunk.columns.astype(str).str.strip()
+                append_row(list(cleaned_columns))
+            chunk.columns = cleaned_columns
+            
+            # 'object'类型列只计算一次，去空格和净化两步共用
+            object_cols = chunk.select_dtypes(include=['object']).columns.tolist()
+            for col in object_cols:
+                chunk[col] = chunk[col].str.strip()
+            
+            chunk, chunk_sanitized_count = _sanitize_chunk(chunk, object_cols)
+            sanitized_count += chunk_sanitized_count
+            
+            # NaN 写入Excel时应为空单元格
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                append_row(row)
+    
+    _print_sanitize_summary(sanitized_count)
+    
+    print(f"  -> (4/4) 正在写入Excel文件: {os.path.basename(output_path)}")
+    save_workbook()
 
-    for file_path in files_to_process:
+def _convert_one(file_path):
+    """
+    转换单个CSV文件。在工作进程中运行，输出先缓存到字符串中一并返回，
+    避免多个文件并行处理时日志互相穿插。
+    
+    Args:
+        file_path (str): CSV文件的完整路径。
+        
+    Returns:
+        str: 处理该文件期间打印的全部日志。
+    """
+    log_buffer = io.StringIO()
+    with contextlib.redirect_stdout(log_buffer):
         print("-" * 60)
         print(f"开始处理文件: {os.path.basename(file_path)}")
 
         try:
             if not os.path.exists(file_path) or not file_path.lower().endswith('.csv'):
                 print("  -> 错误: 文件不存在或不是一个CSV文件。")
-                continue
-
-            encoding, delimiter = detect_encoding_and_delimiter(file_path)
-            if not encoding:
-                print("  -> 错误: 文件为空或无法确定文件编码。")
-                continue
-
-            dtype_map = analyze_columns(file_path, encoding, delimiter)
-
-            print("  -> (2/4) 正在读取完整文件...")
-            # 第二遍读取：使用分析得出的规则，精确地读取完整文件
-            df = pd.read_csv(
-                file_path, encoding=encoding, sep=delimiter, dtype=dtype_map,
-                keep_default_na=False, engine='python'
-            )
-            
-            # 基础清洗：去除列名和所有字符串单元格的前后空格
-            df.columns = [str(col).strip() for col in df.columns]
-            for col in df.select_dtypes(include=['object']).columns:
-                df[col] = df[col].str.strip()
-
-            df = sanitize_dataframe(df)
+                return log_buffer.getvalue()
 
             base_name = os.path.splitext(os.path.basename(file_path))[0]
             output_dir = os.path.dirname(file_path)
             output_path = os.path.join(output_dir, f"xlsx_{base_name}.xlsx")
 
-            print(f"  -> (4/4) 正在写入Excel文件: {os.path.basename(output_path)}")
-            df.to_excel(output_path, index=False)
+            # 编码检测、预扫描和完整读取共用同一个文件句柄，文件只打开一次，
+            # 头部数据在缓冲区和系统缓存中可直接复用
+            with open(file_path, 'rb') as csv_file:
+                encoding, delimiter = detect_encoding_and_delimiter(file_path, csv_file)
+                if not encoding:
+                    print("  -> 错误: 文件为空或无法确定文件编码。")
+                    return log_buffer.getvalue()
+
+                dtype_map = analyze_columns(file_path, encoding, delimiter, csv_file)
+                convert_csv_to_xlsx(file_path, encoding, delimiter, dtype_map, output_path, csv_file)
 
             print(f"\n成功! 文件已保存至:\n{output_path}\n")
 
@@ -246,7 +656,31 @@ def main():
         except Exception as e:
             print(f"\n发生未知错误: {e}\n")
 
+    return log_buffer.getvalue()
+
+def main():
+    """主执行函数，处理命令行参数和文件转换流程。"""
+    files_to_process = sys.argv[1:]
+
+    if not files_to_process:
+        print("csv到xlsx转换工具")
+        print("用法: 请将一个或多个CSV文件拖拽到本程序的图标上。")
+        input("\n按回车键退出...")
+        return
+
+    if len(files_to_process) == 1:
+        # 只有一个文件时直接在当前进程处理，省去启动工作进程的开销
+        print(_convert_one(files_to_process[0]), end='')
+    else:
+        # 各文件的转换完全独立，使用多进程并行处理；结果按输入顺序输出
+        max_workers = min(len(files_to_process), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for file_log in executor.map(_convert_one, files_to_process):
+                print(file_log, end='')
+
     input("所有文件处理完毕。按回车键退出...")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # 打包为exe后，工作进程需要 freeze_support() 才能正常启动
+    multiprocessing.freeze_support()
+    main()
@@ -8,7 +8,27 @@ from dateutil.relativedelta import relativedelta
 import os
 import sys
 
+# --- 1. 样式常量 ---
+# 样式对象在模块级只创建一次，各Sheet、各行直接复用，不在循环中反复构造
+HEADER_FONT = Font(bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+THIN_BORDER_SIDE = Side(style='thin')
+THIN_BORDER = Border(left=THIN_BORDER_SIDE, right=THIN_BORDER_SIDE, top=THIN_BORDER_SIDE, bottom=THIN_BORDER_SIDE)
+# 合并区块首行的对齐方式：序号列居中，其余列靠左，均为顶端对齐
+GROUP_ALIGNMENT_CENTER = Alignment(vertical='top', horizontal='center')
+GROUP_ALIGNMENT_LEFT = Alignment(vertical='top', horizontal='left')
+
+# 源数据中的字体颜色种类很少，按颜色缓存 Font 对象
+_COLOR_FONT_CACHE = {}
+
 # --- 2. 辅助函数 ---
+def get_color_font(color):
+    """返回指定颜色的 Font 对象，同一颜色只创建一次。"""
+    font = _COLOR_FONT_CACHE.get(color)
+    if font is None:
+        font = _COLOR_FONT_CACHE[color] = Font(color=color)
+    return font
+
 def calculate_expiry_date(batch_str):
     """
     根据6位批号字符串（YYMMDD格式）计算有效期。
@@ -131,15 +151,11 @@ def process_single_file(input_path):
         headers = ['序号', '购货单位名称', '购货单位地址', '联系方式', '数量(瓶)', '规格', '批号', '有效期至', '销售日期', '发货人']
         sheet_out.append(headers)
         
-        # 定义将要使用的边框样式
-        thin_border_side = Side(style='thin')
-        thin_border = Border(left=thin_border_side, right=thin_border_side, top=thin_border_side, bottom=thin_border_side)
-        
         # 为表头行（第4行）的每个单元格设置格式
         for cell in sheet_out[4]: 
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            cell.border = THIN_BORDER
 
         # --- 步骤 4: 核心数据转换与写入 ---
         current_row_num = 5  # 输出表格的数据起始行号
@@ -211,11 +227,11 @@ def process_single_file(input_path):
                 
                 # 如果当前行有关联的特殊字体颜色，则应用它
                 if source_font_color:
-                    sheet_out.cell(row=current_row_num, column=2).font = Font(color=source_font_color)
+                    sheet_out.cell(row=current_row_num, column=2).font = get_color_font(source_font_color)
                 
                 # 为该行的所有单元格应用边框
                 for col_idx in range(1, 11):
-                    sheet_out.cell(row=current_row_num, column=col_idx).border = thin_border
+                    sheet_out.cell(row=current_row_num, column=col_idx).border = THIN_BORDER
                 
                 current_row_num += 1
 
@@ -229,7 +245,7 @@ def process_single_file(input_path):
 
             for col_idx in [1, 2, 3, 4, 9, 10]:
                 cell = sheet_out.cell(row=group_start_row, column=col_idx)
-                cell.alignment = Alignment(vertical='top', horizontal='center' if col_idx==1 else 'left')
+                cell.alignment = GROUP_ALIGNMENT_CENTER if col_idx == 1 else GROUP_ALIGNMENT_LEFT
 
             seq_counter += 1
 
@@ -1,10 +1,16 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 import numpy as np
+from sheet_styles import BOLD_FONT, CENTER_ALIGNMENT, styled_cells, SHEET_NAME_TRANSLATION_TABLE
+
+# 可选依赖：numexpr 可在一次循环中完成大数组的逐元素运算，不产生中间临时数组。
+# 未安装时使用 NumPy 直接计算。
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
 
 # --- 配置区 ---
 
@@ -27,15 +33,43 @@ DY_COL_AFTER_SALES_STATUS = '售后状态'
 # 订单状态常量
 STATUS_COMPLETED = '已完成'
 
+# 取值种类很少、只用于筛选比较和原样输出的列，读入后转为分类类型
+LOW_CARDINALITY_COLS_DY = [DY_COL_ORDER_STATUS, DY_COL_AFTER_SALES_STATUS]
+
 # 新增计算列名
 CALC_COL_PAYABLE = '应付款'
 
+# 行数达到此值时才使用 numexpr 计算应付款，数据量小时其启动开销反而大于收益
+NUMEXPR_MIN_ROWS = 100_000
+
 # 输出到详情页的列定义
 DETAIL_SHEET_COLUMNS_DY = [
     '订单编号', '订单状态', '售后状态', '取消原因', '商品编号', '商品名称',
     '商品单价', '商品数量', CALC_COL_PAYABLE, '订单提交时间', '支付完成时间', '订单完成时间'
 ]
 
+# 详情页各列对应的原始列名，顺序与 DETAIL_SHEET_COLUMNS_DY 一致
+DETAIL_SHEET_SOURCE_COLUMNS_DY = {
+    DY_COL_MAIN_ORDER_ID: '订单编号',
+    DY_COL_ORDER_STATUS: '订单状态',
+    DY_COL_AFTER_SALES_STATUS: '售后状态',
+    DY_COL_CANCEL_REASON: '取消原因',
+    DY_COL_PRODUCT_ID: '商品编号',
+    DY_COL_PRODUCT_NAME_DESC: '商品名称',
+    DY_COL_UNIT_PRICE: '商品单价',
+    DY_COL_QUANTITY: '商品数量',
+    CALC_COL_PAYABLE: CALC_COL_PAYABLE,
+    DY_COL_ORDER_SUBMIT_TIME: '订单提交时间',
+    DY_COL_PAY_COMPLETE_TIME: '支付完成时间',
+    DY_COL_ORDER_COMPLETE_TIME: '订单完成时间',
+}
+
+# 处理过程中会用到的全部原始列（应付款为计算列，不在原始文件中），主程序读取文件时只保留这些列
+SOURCE_COLUMNS_DY = frozenset(DETAIL_SHEET_SOURCE_COLUMNS_DY) - {CALC_COL_PAYABLE}
+
+# 参与计算的数值列及无法转换时的填充值；主程序读取CSV时这些列直接解析为数值
+NUMERIC_COLUMNS_DY = {DY_COL_QUANTITY: 0, DY_COL_UNIT_PRICE: 0.0}
+
 # --- 内部功能函数 ---
 
 def _prepare_and_validate_data(df):
@@ -61,22 +95,34 @@ def _prepare_and_validate_data(df):
             return None
 
     # 数值化转换
-    numeric_cols = {DY_COL_QUANTITY: 0, DY_COL_UNIT_PRICE: 0.0}
-    for col, fill_value in numeric_cols.items():
+    for col, fill_value in NUMERIC_COLUMNS_DY.items():
         df[col] = pd.to_numeric(df[col], errors='coerce').fillna(fill_value)
 
+    # 订单状态和售后状态只有少数几种取值，转为分类类型后每行只存整数编码，
+    # 筛选未完成订单时的等值比较也只需比较编码
+    for col in LOW_CARDINALITY_COLS_DY:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
     # 创建应付款计算列 (单价 * 数量)
-    df[CALC_COL_PAYABLE] = df[DY_COL_UNIT_PRICE] * df[DY_COL_QUANTITY]
+    # 两列同属一个DataFrame且已填充缺失值，直接在NumPy数组上相乘，跳过pandas的索引对齐；
+    # 大文件且安装了 numexpr 时改用 numexpr 计算
+    price = df[DY_COL_UNIT_PRICE].to_numpy()
+    qty = df[DY_COL_QUANTITY].to_numpy()
+    if ne is not None and len(df) >= NUMEXPR_MIN_ROWS:
+        df[CALC_COL_PAYABLE] = ne.evaluate('price * qty')
+    else:
+        df[CALC_COL_PAYABLE] = np.multiply(price, qty)
 
-    # 清洗作为分组键的“选购商品”列
-    df[DY_COL_PRODUCT_NAME_DESC] = df[DY_COL_PRODUCT_NAME_DESC].str.strip()
-    df[DY_COL_PRODUCT_NAME_DESC] = df[DY_COL_PRODUCT_NAME_DESC].fillna("未知商品标题")
+    # 清洗作为分组键的“选购商品”列，去空格和填充缺失值链式完成，只生成一次新列
+    df[DY_COL_PRODUCT_NAME_DESC] = df[DY_COL_PRODUCT_NAME_DESC].str.strip().fillna("未知商品标题")
     
-    # 确保商品ID为字符串类型，以便后续提取
-    df[DY_COL_PRODUCT_ID] = df[DY_COL_PRODUCT_ID].astype(str).replace('nan', '')
+    # 确保商品ID为字符串类型，以便后续提取；缺失值在转换前直接填为空字符串，
+    # 不再先变成 'nan' 文本再整列替换
+    df[DY_COL_PRODUCT_ID] = df[DY_COL_PRODUCT_ID].fillna('').astype(str)
 
-    # 筛选出包含有效商品标题的行
-    df_processed = df[df[DY_COL_PRODUCT_NAME_DESC].notna()].copy()
+    # 缺失的商品标题已被填充，所有行都包含有效商品标题，无需再筛选和复制
+    df_processed = df
     
     if df_processed.empty:
         print(f"数据中没有找到包含有效商品标题('{DY_COL_PRODUCT_NAME_DESC}')的行。无法生成报告。")
@@ -92,134 +138,135 @@ def _aggregate_product_data(df_processed):
         df_processed (pd.DataFrame): 准备好的数据。
         
     Returns:
-        dict: 一个包含所有商品聚合信息的字典 (product_data_map)。
+        dict: 按列存放的商品聚合信息 (product_data)。每个键对应一个按商品名称排序的并行数组，
+              同一下标表示同一个商品：
+              'names', 'prod_ids', 'income_qty', 'income_amount', 'expenditure_qty',
+              'expenditure_amount', 'detail_income_positions', 'detail_expenditure_positions'。
     """
-    product_data_map = {}
-    # 使用'选购商品'列作为分组键
-    for product_name, group_df in df_processed.groupby(DY_COL_PRODUCT_NAME_DESC):
-        # 从分组数据中提取代表性的商品ID
-        product_id = group_df[DY_COL_PRODUCT_ID].dropna().iloc[0] if not group_df[DY_COL_PRODUCT_ID].dropna().empty else "未知编号"
-
-        # 收入数据为所有订单
-        income_df = group_df.copy()
-        # 支出数据为所有非“已完成”状态的订单
-        expenditure_df = group_df[group_df[DY_COL_ORDER_STATUS] != STATUS_COMPLETED].copy()
-        
-        # 将聚合信息存入字典，键为商品名称
-        product_data_map[product_name] = {
-            'prod_id': product_id,
-            'income_qty': income_df[DY_COL_QUANTITY].sum(),
-            'income_amount': income_df[CALC_COL_PAYABLE].sum(),
-            'expenditure_qty': expenditure_df[DY_COL_QUANTITY].sum(),
-            'expenditure_amount': -(expenditure_df[CALC_COL_PAYABLE].sum()), # 支出金额为负
-            'detail_income_df': income_df,
-            'detail_expenditure_df': expenditure_df,
-        }
-    return product_data_map
-
-def _create_summary_sheet(wb, product_data_map):
+    # 使用'选购商品'列作为分组键，所有商品的数量和金额一次性聚合。
+    # 分组键先转为分类类型（类别按字典序排列），分组时只比较整数编码而不再逐行哈希字符串
+    product_name_key = pd.Categorical(df_processed[DY_COL_PRODUCT_NAME_DESC])
+    grouped = df_processed.groupby(product_name_key, observed=True)
+    income_totals = grouped.agg(
+        income_qty=(DY_COL_QUANTITY, 'sum'),
+        income_amount=(CALC_COL_PAYABLE, 'sum'),
+    )
+    # 从分组数据中提取代表性的商品ID（每组第一个非空值）
+    product_ids = grouped[DY_COL_PRODUCT_ID].first()
+
+    # 支出数据为所有非“已完成”状态的订单
+    expenditure_mask = df_processed[DY_COL_ORDER_STATUS] != STATUS_COMPLETED
+    expenditure_flags = expenditure_mask.to_numpy()
+    expenditure_totals = df_processed[expenditure_mask].groupby(product_name_key[expenditure_flags], observed=True).agg(
+        expenditure_qty=(DY_COL_QUANTITY, 'sum'),
+        expenditure_amount=(CALC_COL_PAYABLE, 'sum'),
+    ).reindex(income_totals.index, fill_value=0)
+
+    # 明细数据不在这里切片，只记录每个商品在 df_processed 中的行位置，
+    # 生成详情页时再按位置一次性取出。收入数据为所有订单，支出数据为其中的未完成订单
+    group_positions = grouped.indices
+    names = income_totals.index.to_numpy(dtype=object)
+    income_positions = [group_positions[name] for name in names]
+
+    return {
+        'names': names,
+        'prod_ids': product_ids.reindex(income_totals.index).fillna("未知编号").to_numpy(dtype=object),
+        'income_qty': income_totals['income_qty'].to_numpy(),
+        'income_amount': income_totals['income_amount'].to_numpy(),
+        'expenditure_qty': expenditure_totals['expenditure_qty'].to_numpy(),
+        'expenditure_amount': -expenditure_totals['expenditure_amount'].to_numpy(), # 支出金额为负
+        'detail_income_positions': income_positions,
+        'detail_expenditure_positions': [positions[expenditure_flags[positions]] for positions in income_positions],
+    }
+
+def _create_summary_sheet(wb, product_data):
     """在工作簿中创建并填充销售总结页。"""
-    ws = wb.active
-    ws.title = "销售总结"
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    
-    current_row = 1
+    # write_only 工作簿没有默认的活动Sheet页，总结页作为第一个Sheet页创建
+    ws = wb.create_sheet("销售总结")
+
+    # --- 格式化 ---
+    # write_only 模式下列宽必须在写入第一行之前设置
+    for col_letter, width in [('A', 25), ('B', 70), ('C', 20), ('D', 25)]:
+        ws.column_dimensions[col_letter].width = width
+
+    def append_summary_row(values, font=None, alignment=None):
+        """追加一行，第3列（数量）和第4列（金额）中的数值按千分位格式显示。"""
+        cells = styled_cells(ws, values, font, alignment)
+        for col_idx, number_format in ((2, '#,##0'), (3, '#,##0.00')):
+            if col_idx < len(cells) and cells[col_idx] is not None and isinstance(cells[col_idx].value, (int, float)):
+                cells[col_idx].number_format = number_format
+        ws.append(cells)
     
     # --- 收入汇总 ---
-    ws.cell(row=current_row, column=1, value="各商品收入汇总 (全部订单)").font = bold_font
-    current_row += 1
+    append_summary_row(["各商品收入汇总 (全部订单)"], font=BOLD_FONT)
     # 更新表头以同时展示商品编号和名称
     income_headers = ["商品编号", "商品名称", "总销售数量", "总应付金额"]
-    ws.append(income_headers)
-    for cell in ws[current_row]: cell.font = bold_font; cell.alignment = center_align
-    current_row += 1
+    append_summary_row(income_headers, font=BOLD_FONT, alignment=CENTER_ALIGNMENT)
 
-    grand_total_income_qty, grand_total_income_amt = 0, 0.0
-    sorted_product_names = sorted(product_data_map.keys())
-    
-    for name in sorted_product_names:
-        item = product_data_map[name]
-        ws.append([item['prod_id'], name, item['income_qty'], item['income_amount']])
-        grand_total_income_qty += item['income_qty']
-        grand_total_income_amt += item['income_amount']
-        current_row += 1
+    # 聚合结果已按商品名称排序，各列数组同一下标即同一商品
+    names, prod_ids = product_data['names'], product_data['prod_ids']
+    income_qty, income_amount = product_data['income_qty'], product_data['income_amount']
+    expenditure_qty, expenditure_amount = product_data['expenditure_qty'], product_data['expenditure_amount']
+
+    for row in zip(prod_ids, names, income_qty, income_amount):
+        append_summary_row(list(row))
+    grand_total_income_qty, grand_total_income_amt = income_qty.sum(), income_amount.sum()
         
-    ws.append(["总计收入", "", grand_total_income_qty, grand_total_income_amt])
-    for cell in ws[current_row]: cell.font = bold_font
-    current_row += 2
+    append_summary_row(["总计收入", "", grand_total_income_qty, grand_total_income_amt], font=BOLD_FONT)
+    ws.append([])
     
     # --- 支出汇总 ---
-    ws.cell(row=current_row, column=1, value="各商品支出汇总 (未完成订单)").font = bold_font
-    current_row += 1
+    append_summary_row(["各商品支出汇总 (未完成订单)"], font=BOLD_FONT)
     exp_headers = ["商品编号", "商品名称", "未完成订单数量", "未完成订单金额 (支出)"]
-    ws.append(exp_headers)
-    for cell in ws[current_row]: cell.font = bold_font; cell.alignment = center_align
-    current_row += 1
-
-    grand_total_exp_qty, grand_total_exp_amt = 0, 0.0
-    for name in sorted_product_names:
-        item = product_data_map[name]
-        if item['expenditure_qty'] > 0 or item['expenditure_amount'] != 0:
-            ws.append([item['prod_id'], name, item['expenditure_qty'], item['expenditure_amount']])
-            grand_total_exp_qty += item['expenditure_qty']
-            grand_total_exp_amt += item['expenditure_amount']
-            current_row += 1
-
-    ws.append(["总计支出", "", grand_total_exp_qty, grand_total_exp_amt])
-    for cell in ws[current_row]: cell.font = bold_font
-    current_row += 2
+    append_summary_row(exp_headers, font=BOLD_FONT, alignment=CENTER_ALIGNMENT)
+
+    # 只列出有支出的商品；其余商品的支出均为0，不影响总计
+    has_expenditure = (expenditure_qty > 0) | (expenditure_amount != 0)
+    for row in zip(prod_ids[has_expenditure], names[has_expenditure],
+                   expenditure_qty[has_expenditure], expenditure_amount[has_expenditure]):
+        append_summary_row(list(row))
+    grand_total_exp_qty, grand_total_exp_amt = expenditure_qty.sum(), expenditure_amount.sum()
+
+    append_summary_row(["总计支出", "", grand_total_exp_qty, grand_total_exp_amt], font=BOLD_FONT)
+    ws.append([])
 
     # --- 净总计 ---
     net_qty = grand_total_income_qty - grand_total_exp_qty
     net_amount = grand_total_income_amt + grand_total_exp_amt
-    ws.cell(row=current_row, column=1, value="净总计").font = bold_font
-    ws.cell(row=current_row, column=3, value=net_qty).font = bold_font
-    ws.cell(row=current_row, column=4, value=net_amount).font = bold_font
-    
-    # --- 格式化 ---
-    for col_letter, width in [('A', 25), ('B', 70), ('C', 20), ('D', 25)]:
-        ws.column_dimensions[col_letter].width = width
-    for row in ws.iter_rows():
-        for cell in row:
-            if isinstance(cell.value, (int, float)):
-                if cell.column == 3: cell.number_format = '#,##0'
-                if cell.column == 4: cell.number_format = '#,##0.00'
+    append_summary_row(["净总计", None, net_qty, net_amount], font=BOLD_FONT)
 
 def _format_for_detail_dy(df, is_expenditure=False):
-    """根据详情页列定义，格式化DataFrame。"""
+    """根据详情页列定义，格式化DataFrame。空值保留为缺失值，由调用方转换为数组时统一替换为空字符串。"""
     if df.empty: return pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_DY)
     
-    detail = pd.DataFrame()
-    detail['订单编号'] = df.get(DY_COL_MAIN_ORDER_ID)
-    detail['订单状态'] = df.get(DY_COL_ORDER_STATUS)
-    detail['售后状态'] = df.get(DY_COL_AFTER_SALES_STATUS)
-    detail['取消原因'] = df.get(DY_COL_CANCEL_REASON)
-    detail['商品编号'] = df.get(DY_COL_PRODUCT_ID).astype(str)
-    detail['商品名称'] = df.get(DY_COL_PRODUCT_NAME_DESC)
-    detail['商品单价'] = df.get(DY_COL_UNIT_PRICE)
-    detail['商品数量'] = df.get(DY_COL_QUANTITY)
+    # 一次取出所有需要的原始列（缺失的列为空值）并重命名为详情页列名
+    detail = df.reindex(columns=list(DETAIL_SHEET_SOURCE_COLUMNS_DY)).rename(columns=DETAIL_SHEET_SOURCE_COLUMNS_DY)
+    detail['商品编号'] = detail['商品编号'].astype(str)
+    if is_expenditure:
+        detail[CALC_COL_PAYABLE] = -detail[CALC_COL_PAYABLE]
     
-    payable_amounts = df.get(CALC_COL_PAYABLE, 0.0)
-    detail[CALC_COL_PAYABLE] = -payable_amounts if is_expenditure else payable_amounts
-    
-    detail['订单提交时间'] = df.get(DY_COL_ORDER_SUBMIT_TIME)
-    detail['支付完成时间'] = df.get(DY_COL_PAY_COMPLETE_TIME)
-    detail['订单完成时间'] = df.get(DY_COL_ORDER_COMPLETE_TIME)
-    
-    return detail.reindex(columns=DETAIL_SHEET_COLUMNS_DY).fillna('')
-
-def _create_detail_sheets(wb, product_data_map):
-    """为每个商品创建并填充详情页。"""
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-
-    for name in sorted(product_data_map.keys()):
-        item = product_data_map[name]
+    return detail.reindex(columns=DETAIL_SHEET_COLUMNS_DY)
+
+def _create_detail_sheets(wb, product_data, df_processed):
+    """为每个商品创建并填充详情页。明细行按 product_data 中记录的行位置从整表格式化后的明细中取出。"""
+    # 已使用的Sheet页名称，用集合做O(1)的重名判断
+    used_sheet_names = set(wb.sheetnames)
+
+    # 详情页的格式化只依赖每一行本身，整表一次性完成并转换为对象数组，
+    # 各商品分段只按行位置切片后整体 tolist()；分段总计同样直接在NumPy数组上按位置求和
+    detail_values = _format_for_detail_dy(df_processed).to_numpy(dtype=object, na_value='')
+    payable_col_idx = DETAIL_SHEET_COLUMNS_DY.index(CALC_COL_PAYABLE)
+    quantities = df_processed[DY_COL_QUANTITY].to_numpy()
+    payables = df_processed[CALC_COL_PAYABLE].to_numpy()
+
+    for name, prod_id, income_positions, expenditure_positions in zip(
+        product_data['names'], product_data['prod_ids'],
+        product_data['detail_income_positions'], product_data['detail_expenditure_positions'],
+    ):
         
         # --- Sheet页命名逻辑 ---
         # 1. 直接使用商品名称(name)作为基础，并清理Excel不支持的特殊字符
-        base_name = re.sub(r'[\\/\*\[\]\:?]', '_', name)
+        base_name = name.translate(SHEET_NAME_TRANSLATION_TABLE)
         
         # 2. 如果清理后的名称长度超过31个字符，则从尾部截取
         if len(base_name) > 31:
@@ -228,7 +275,7 @@ def _create_detail_sheets(wb, product_data_map):
         # 3. 防重名处理：如果名称已存在，则添加序号
         sheet_name = base_name
         counter = 1
-        while sheet_name in wb.sheetnames:
+        while sheet_name in used_sheet_names:
             counter += 1
             suffix = f"({counter})"
             # 为了给序号腾出空间，需要从已截断的base_name上再次截断
@@ -239,35 +286,37 @@ def _create_detail_sheets(wb, product_data_map):
             ws = wb.create_sheet(sheet_name)
         except Exception as e:
             print(f"警告: 创建Sheet页 '{sheet_name}' 失败: {e}。将使用备用名称。")
-            ws = wb.create_sheet(f"{item['prod_id']}_detail")
+            ws = wb.create_sheet(f"{prod_id}_detail")
+        used_sheet_names.add(ws.title)
+
+        # 设置列宽（write_only 模式下必须在写入第一行之前设置）
+        for i, width in enumerate([25, 15, 20, 30, 25, 70, 15, 15, 15, 22, 22, 22], 1):
+             ws.column_dimensions[get_column_letter(i)].width = width
 
         # 内部函数，用于写入一个数据区域（如收入明细）
-        def write_section(df, title, total_title, is_expenditure=False):
-            if df.empty: return
+        def write_section(positions, title, total_title, is_expenditure=False):
+            if len(positions) == 0: return
             
-            formatted_df = _format_for_detail_dy(df, is_expenditure)
+            # 按位置取行得到的是副本，支出分段可直接在其上把应付款取负
+            section_rows = detail_values[positions]
+            if is_expenditure:
+                section_rows[:, payable_col_idx] = -section_rows[:, payable_col_idx]
             
-            ws.append([title]); ws[ws.max_row][0].font = bold_font
-            ws.append(DETAIL_SHEET_COLUMNS_DY)
-            for cell in ws[ws.max_row]: cell.font = bold_font; cell.alignment = center_align
-            for r in formatted_df.itertuples(index=False): ws.append(list(r))
+            ws.append(styled_cells(ws, [title], BOLD_FONT))
+            ws.append(styled_cells(ws, DETAIL_SHEET_COLUMNS_DY, BOLD_FONT, CENTER_ALIGNMENT))
+            for row in section_rows.tolist(): ws.append(row)
             
-            qty_sum = df[DY_COL_QUANTITY].sum()
-            amt_sum = df[CALC_COL_PAYABLE].sum()
+            qty_sum = quantities[positions].sum()
+            amt_sum = payables[positions].sum()
             if is_expenditure: amt_sum = -amt_sum
             
             total_row_data = [total_title, "", "", "", "", "", "", qty_sum, amt_sum]
-            ws.append(total_row_data)
-            for cell in ws[ws.max_row]: cell.font = bold_font
+            ws.append(styled_cells(ws, total_row_data, BOLD_FONT))
             ws.append([])
 
         # 写入收入和支出明细
-        write_section(item['detail_income_df'], "收入明细 (全部订单)", "收入总计", is_expenditure=False)
-        write_section(item['detail_expenditure_df'], "支出明细 (未完成订单)", "支出总计", is_expenditure=True)
-
-        # 设置列宽
-        for i, width in enumerate([25, 15, 20, 30, 25, 70, 15, 15, 15, 22, 22, 22], 1):
-             ws.column_dimensions[get_column_letter(i)].width = width
+        write_section(income_positions, "收入明细 (全部订单)", "收入总计", is_expenditure=False)
+        write_section(expenditure_positions, "支出明细 (未完成订单)", "支出总计", is_expenditure=True)
 
 # --- 主处理函数 ---
 
@@ -290,16 +339,14 @@ def process_douyin_data(df_raw):
     if df_processed is None: return None
 
     # 2. 按商品聚合数据
-    product_data_map = _aggregate_product_data(df_processed)
+    product_data = _aggregate_product_data(df_processed)
     
     # 3. 创建Excel工作簿并生成内容
-    wb = Workbook()
-    _create_summary_sheet(wb, product_data_map)
-    _create_detail_sheets(wb, product_data_map)
-    
-    # 确保总结页在第一个
-    if "销售总结" in wb.sheetnames and wb.sheetnames[0] != "销售总结":
-        wb.move_sheet("销售总结", -len(wb.sheetnames) + 1)
+    # 使用 write_only 模式，单元格在追加时即序列化，不在内存中保留整个工作簿。
+    # 总结页最先创建，因此始终是第一个Sheet页。
+    wb = Workbook(write_only=True)
+    _create_summary_sheet(wb, product_data)
+    _create_detail_sheets(wb, product_data, df_processed)
         
     return wb
 
@@ -318,16 +365,23 @@ if __name__ == "__main__":
     else:
         # 1. 在测试时，模拟main_processor的行为：先读取文件
         print(f"--- 独立测试: 读取文件 {TEST_FILENAME} ---")
+        # 以 Arrow 存储的字符串类型读取，strip/replace 直接在连续的 UTF-8 缓冲区上执行；
+        # 同时使用 pyarrow 的多线程 CSV 解析器；未安装 pyarrow 时退回普通字符串和默认的C解析器
+        try:
+            import pyarrow  # noqa: F401
+            test_string_dtype = 'string[pyarrow]'
+            test_csv_engine = 'pyarrow'
+        except ImportError:
+            test_string_dtype = str
+            test_csv_engine = 'c'
         try:
-            # 同样进行基础清洗，模拟main模块可能做的预处理
-            df_test_raw = pd.read_csv(input_file, dtype=str, keep_default_na=True, encoding='utf-8-sig')
-            df_test_raw.columns = [col.strip().replace('"', '') for col in df_test_raw.columns]
-            for col in df_test_raw.columns:
-                if df_test_raw[col].dtype == 'object':
-                    df_test_raw[col] = df_test_raw[col].astype(str).str.strip().str.replace('\t', '')
-                    df_test_raw[col] = df_test_raw[col].replace(
-                        ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null'], np.nan, regex=False
-                    )
+            # 同样进行基础清洗，模拟main模块可能做的预处理；所有列均按字符串读取，整表统一清洗
+            df_test_raw = pd.read_csv(input_file, dtype=test_string_dtype, keep_default_na=True, encoding='utf-8-sig', engine=test_csv_engine)
+            df_test_raw.columns = df_test_raw.columns.str.strip().str.replace('"', '', regex=False)
+            df_test_raw = df_test_raw.apply(lambda s: s.str.strip().str.replace('\t', '', regex=False))
+            df_test_raw = df_test_raw.replace(
+                ['-', '--', '', 'None', 'nan', '#NULL!', 'null'], np.nan, regex=False
+            )
         except Exception as e:
             print(f"测试中读取文件失败: {e}")
             df_test_raw = None
@@ -1,10 +1,23 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 import numpy as np
+from sheet_styles import BOLD_FONT, styled_cells, SHEET_NAME_TRANSLATION_TABLE
+
+# 可选依赖：xlsxwriter。安装后可选用其 constant_memory 模式写出报表（见 process_jingdong_data 的
+# backend 参数），未安装时始终使用 openpyxl 的 write_only 模式。
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 可选依赖：polars。安装后可选用其多线程哈希分组完成聚合（见 process_jingdong_data 的
+# engine 参数），未安装时始终使用 pandas/NumPy 实现。
+try:
+    import polars as pl
+except ImportError:
+    pl = None
 
 # --- 配置区 ---
 
@@ -39,15 +52,42 @@ DETAIL_SHEET_COLUMNS_JD = [
     '收支方向', '结算状态', '预计结算时间', '账单生成时间', '到账时间', '商户订单号'
 ]
 
+# 处理过程中会用到的全部原始列，主程序读取文件时只保留这些列
+SOURCE_COLUMNS_JD = frozenset(DETAIL_SHEET_COLUMNS_JD) | {
+    JD_COL_ORDER_ID, JD_COL_ORDER_STATUS, JD_COL_PRODUCT_ID, JD_COL_PRODUCT_NAME, JD_COL_QUANTITY,
+    JD_COL_AMOUNT_DUE, JD_COL_FEE_NAME, JD_COL_DIRECTION, JD_COL_AFTER_SALES_ID,
+}
+
+# 参与计算的数值列，主程序读取CSV时这些列直接解析为数值
+NUMERIC_COLUMNS_JD = [JD_COL_AMOUNT_DUE, JD_COL_QUANTITY]
+
+# 取值种类很少、只用于筛选比较的列，读入后转为分类类型
+LOW_CARDINALITY_COLS_JD = [JD_COL_ORDER_STATUS, JD_COL_FEE_NAME, JD_COL_DIRECTION]
+
+# 总结页列宽（两种写出方式共用）
+SUMMARY_COLUMN_WIDTHS_JD = {'A': 25, 'B': 70, 'C': 18, 'D': 18}
+
+# xlsxwriter 的工作簿选项。行写完即落盘；商品名称等文本原样写入，不自动转换为链接
+XLSXWRITER_OPTIONS = {
+    'constant_memory': True,
+    'strings_to_urls': False,
+}
+
 # --- 内部功能函数 ---
 
 def _convert_numeric_columns(df):
     """
     将DataFrame中的指定列转换为数值类型，便于计算。
+    只做浅拷贝：下面都是整列替换，不会改动调用方的原始数据，也不必复制整张表。
     """
+    df = df.copy(deep=False)
     # 转换应结金额和商品数量为数值，无法转换的填充为0
-    df[JD_COL_AMOUNT_DUE] = pd.to_numeric(df[JD_COL_AMOUNT_DUE], errors='coerce').fillna(0)
-    df[JD_COL_QUANTITY] = pd.to_numeric(df[JD_COL_QUANTITY], errors='coerce').fillna(0)
+    for col in NUMERIC_COLUMNS_JD:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    # 订单状态、费用名称、收支方向只有少数几种取值，转为分类类型后
+    # 后续的等值比较只需比较整数编码
+    for col in LOW_CARDINALITY_COLS_JD:
+        df[col] = df[col].astype('category')
     return df
 
 def _filter_and_prepare_data(df_numeric):
@@ -56,215 +96,422 @@ def _filter_and_prepare_data(df_numeric):
     - 筛选“已完成”状态的订单。
     - 清洗作为分组键的“商品名称”列。
     """
-    # 仅处理状态为“已完成”的订单
-    df_completed = df_numeric[df_numeric[JD_COL_ORDER_STATUS] == STATUS_COMPLETED].copy()
+    # 仅处理状态为“已完成”的订单。按行位置 take 出的已是新对象，无需再 .copy()
+    completed_mask = (df_numeric[JD_COL_ORDER_STATUS] == STATUS_COMPLETED).to_numpy()
+    df_processed = df_numeric.take(np.flatnonzero(completed_mask))
     
     # 确保售后相关列存在，以便后续筛选退款单
     for col in [JD_COL_AFTER_SALES_ID, '售后退款时间']:
-        if col not in df_completed.columns:
-            df_completed[col] = np.nan
+        if col not in df_processed.columns:
+            df_processed[col] = np.nan
             
-    # 清洗商品名称列：去除首尾空格，并将空值替换为指定字符串
-    df_completed[JD_COL_PRODUCT_NAME] = df_completed[JD_COL_PRODUCT_NAME].str.strip()
-    df_completed[JD_COL_PRODUCT_NAME] = df_completed[JD_COL_PRODUCT_NAME].fillna("未知商品标题")
+    # 清洗商品名称列：去除首尾空格，并将空值替换为指定字符串。
+    # 填充后商品名称不再有空值，因此无需再按 notna 筛选复制一次
+    df_processed[JD_COL_PRODUCT_NAME] = df_processed[JD_COL_PRODUCT_NAME].str.strip().fillna("未知商品标题")
 
-    # 筛选出包含有效商品名称的行
-    df_processed = df_completed[df_completed[JD_COL_PRODUCT_NAME].notna()].copy()
-    
     if df_processed.empty:
         print(f"数据中没有找到“已完成”且包含有效商品名称('{JD_COL_PRODUCT_NAME}')的行。无法生成报告。")
         return None
         
     return df_processed
 
+def _sales_and_returns_flags(df_processed):
+    """
+    对全部行一次性打上“货款收入”“货款退款”标记，返回两个布尔数组 (sales_flags, returns_flags)。
+    """
+    # 货款收入的行
+    is_goods_fee = df_processed[JD_COL_FEE_NAME] == FEE_NAME_GOODS
+    sales_mask = is_goods_fee & (df_processed[JD_COL_DIRECTION] == DIRECTION_INCOME)
+    # 货款支出的行（即退款），并要求有售后服务单号
+    returns_mask = (
+        is_goods_fee &
+        (df_processed[JD_COL_DIRECTION] == DIRECTION_EXPENSE) &
+        (df_processed[JD_COL_AFTER_SALES_ID].notna()) &
+        (df_processed[JD_COL_AFTER_SALES_ID] != '')
+    )
+    return sales_mask.to_numpy(), returns_mask.to_numpy()
+
 def _aggregate_product_data(df_processed):
     """
     按'商品名称'聚合数据，仅计算货款的收入与支出。
+    先对全部行一次性打上“货款收入”“货款退款”标记，再按商品名称稳定排序，
+    用 np.add.reduceat 在连续的分组区间上一次性求和，不再逐个商品切分子表。
     """
-    product_summary = {}
-    # 使用'商品名称'作为分组键，实现按规格（标题）聚合
-    for product_name, group in df_processed.groupby(JD_COL_PRODUCT_NAME):
-        # 从分组中提取该规格对应的商品编号（通常取第一个）
-        product_id = group[JD_COL_PRODUCT_ID].dropna().iloc[0] if not group[JD_COL_PRODUCT_ID].dropna().empty else "未知编号"
+    sales_flags, returns_flags = _sales_and_returns_flags(df_processed)
 
-        # 筛选货款收入的行
-        sales_group = group[(group[JD_COL_FEE_NAME] == FEE_NAME_GOODS) & (group[JD_COL_DIRECTION] == DIRECTION_INCOME)]
-        
-        # 筛选货款支出的行（即退款），并要求有售后服务单号
-        returns_group = group[
-            (group[JD_COL_FEE_NAME] == FEE_NAME_GOODS) & 
-            (group[JD_COL_DIRECTION] == DIRECTION_EXPENSE) & 
-            (group[JD_COL_AFTER_SALES_ID].notna()) & 
-            (group[JD_COL_AFTER_SALES_ID] != '')
-        ]
-        
+    # 使用'商品名称'作为分组键，实现按规格（标题）聚合。
+    # 稳定排序后同一商品的行连续排列，且组内仍保持原始行顺序
+    names = df_processed[JD_COL_PRODUCT_NAME].to_numpy(dtype=object)
+    order = np.argsort(names, kind='stable')
+    product_names, group_starts = np.unique(names[order], return_index=True)
+    group_ends = np.append(group_starts[1:], len(order))
+
+    def grouped_sum(col, flags):
+        values = df_processed[col].to_numpy()[order]
+        return np.add.reduceat(values * flags[order], group_starts)
+
+    sales_qty_totals = grouped_sum(JD_COL_QUANTITY, sales_flags)
+    sales_amt_totals = grouped_sum(JD_COL_AMOUNT_DUE, sales_flags)
+    return_qty_totals = grouped_sum(JD_COL_QUANTITY, returns_flags)
+    return_amt_totals = grouped_sum(JD_COL_AMOUNT_DUE, returns_flags)
+
+    # 每组第一个非空的商品编号：非空行记录其排序后位置，空行记为越界值，再取组内最小值
+    product_id_values = df_processed[JD_COL_PRODUCT_ID].to_numpy(dtype=object)[order]
+    valid_id_positions = np.where(pd.notna(product_id_values), np.arange(len(order)), len(order))
+    first_id_positions = np.minimum.reduceat(valid_id_positions, group_starts)
+
+    product_summary = {}
+    for i, product_name in enumerate(product_names):
+        # 明细数据只记录原始行位置，生成详情页时再按位置取出
+        positions = order[group_starts[i]:group_ends[i]]
+        first_id_position = first_id_positions[i]
+        product_id = product_id_values[first_id_position] if first_id_position < group_ends[i] else "未知编号"
         # 将聚合结果存入字典，键为商品名称
         product_summary[str(product_name)] = {
             'prod_id': product_id,
-            'sales_quantity': sales_group[JD_COL_QUANTITY].sum(),
-            'sales_amount': sales_group[JD_COL_AMOUNT_DUE].sum(),
-            'return_quantity': returns_group[JD_COL_QUANTITY].sum(),
-            'return_amount': returns_group[JD_COL_AMOUNT_DUE].sum(), # 金额为负数
-            'sales_detail_df': sales_group,
-            'returns_detail_df': returns_group,
+            'sales_quantity': sales_qty_totals[i],
+            'sales_amount': sales_amt_totals[i],
+            'return_quantity': return_qty_totals[i],
+            'return_amount': return_amt_totals[i], # 金额为负数
+            'sales_detail_positions': positions[sales_flags[positions]],
+            'returns_detail_positions': positions[returns_flags[positions]],
         }
     return product_summary
 
-def _create_summary_sheet(wb, product_summary):
+def _aggregate_product_data_polars(df_processed):
     """
-    在工作簿中创建并填充销售总结页，采用销售、退款、总计三段式布局。
+    _aggregate_product_data 的 polars 实现，返回结构完全相同的 product_summary。
+    标记列和行位置一并交给 polars，由一次惰性 group_by 完成全部求和、取首个商品编号和明细行位置的收集。
     """
-    ws = wb.active
-    ws.title = "销售总结"
-    bold_font = Font(bold=True)
-    
+    sales_flags, returns_flags = _sales_and_returns_flags(df_processed)
+    lf = pl.from_pandas(
+        df_processed[[JD_COL_PRODUCT_NAME, JD_COL_PRODUCT_ID, JD_COL_QUANTITY, JD_COL_AMOUNT_DUE]]
+    ).with_columns(
+        pl.Series('is_sale', sales_flags),
+        pl.Series('is_return', returns_flags),
+    ).with_row_index('position').lazy()
+
+    qty, amt = pl.col(JD_COL_QUANTITY), pl.col(JD_COL_AMOUNT_DUE)
+    is_sale, is_return = pl.col('is_sale'), pl.col('is_return')
+    aggregated = lf.group_by(JD_COL_PRODUCT_NAME).agg(
+        qty.filter(is_sale).sum().alias('sales_quantity'),
+        amt.filter(is_sale).sum().alias('sales_amount'),
+        qty.filter(is_return).sum().alias('return_quantity'),
+        amt.filter(is_return).sum().alias('return_amount'),
+        pl.col(JD_COL_PRODUCT_ID).drop_nulls().first().alias('prod_id'),
+        pl.col('position').filter(is_sale).alias('sales_detail_positions'),
+        pl.col('position').filter(is_return).alias('returns_detail_positions'),
+    ).sort(JD_COL_PRODUCT_NAME).collect()
+
+    # 合计列转为 NumPy 数组后逐个取值，与 pandas 实现一样得到 NumPy 标量
+    totals = {col: aggregated[col].to_numpy() for col in ['sales_quantity', 'sales_amount', 'return_quantity', 'return_amount']}
+    product_summary = {}
+    for i, (product_name, product_id, sales_positions, returns_positions) in enumerate(zip(
+        aggregated[JD_COL_PRODUCT_NAME].to_list(), aggregated['prod_id'].to_list(),
+        aggregated['sales_detail_positions'].to_list(), aggregated['returns_detail_positions'].to_list()
+    )):
+        product_summary[str(product_name)] = {
+            'prod_id': product_id if product_id is not None else "未知编号",
+            'sales_quantity': totals['sales_quantity'][i],
+            'sales_amount': totals['sales_amount'][i],
+            'return_quantity': totals['return_quantity'][i],
+            'return_amount': totals['return_amount'][i], # 金额为负数
+            'sales_detail_positions': np.asarray(sales_positions, dtype=np.int64),
+            'returns_detail_positions': np.asarray(returns_positions, dtype=np.int64),
+        }
+    return product_summary
+
+def _summary_sheet_rows(product_summary):
+    """
+    按从上到下的顺序生成总结页的所有行，采用销售、退款、总计三段式布局。
+    每行为 (values, is_bold)，空行的 values 为空列表。
+    总计行直接写入遍历商品时累加的合计值，而不是 SUM 公式，打开文件时Excel无需重新计算。
+    openpyxl 与 xlsxwriter 两种写出方式共用此布局。
+    """
+    rows = []
+    def add_row(values, is_bold=False):
+        rows.append((values, is_bold))
+
     # --- 1. 销售汇总区域 ---
     headers = ["商品编号", "商品名称", "销售数量", "销售额"]
-    ws.append(headers)
-    for cell in ws[1]: cell.font = bold_font
+    add_row(headers, True)
     
     sorted_names = sorted(product_summary.keys())
+    sales_qty_total, sales_amt_total = 0, 0
     for name in sorted_names:
         item = product_summary[name]
         # 只添加有销售额的行
         if item['sales_amount'] != 0:
-            ws.append([item['prod_id'], name, item['sales_quantity'], item['sales_amount']])
+            add_row([item['prod_id'], name, item['sales_quantity'], item['sales_amount']])
+            sales_qty_total += item['sales_quantity']
+            sales_amt_total += item['sales_amount']
 
-    sales_end_row = ws.max_row
-    current_row = sales_end_row + 1
+    # 合计值转为 Python 数值，使其与原先的公式单元格一样带上数字格式
+    sales_qty_total = np.asarray(sales_qty_total).item()
+    sales_amt_total = np.asarray(sales_amt_total).item()
     # 添加销售总计行
-    ws.cell(row=current_row, column=1, value="总计 (不含退款)").font = bold_font
-    ws.cell(row=current_row, column=3, value=f"=SUM(C2:C{sales_end_row})").font = bold_font
-    ws.cell(row=current_row, column=4, value=f"=SUM(D2:D{sales_end_row})").font = bold_font
-    sales_total_row = current_row
+    add_row(["总计 (不含退款)", None, sales_qty_total, sales_amt_total], True)
 
     # --- 2. 退款明细区域 ---
-    current_row += 2
-    ws.cell(row=current_row, column=1, value="退款商品明细").font = bold_font
-    current_row += 1
+    add_row([])
+    add_row(["退款商品明细"], True)
     
-    refund_start_row = current_row
-    has_refunds = False
+    # 如果没有退款，则总计为0
+    refund_qty_total, refund_amt_total = 0, 0
     for name in sorted_names:
         item = product_summary[name]
         if item['return_quantity'] > 0 or item['return_amount'] != 0:
-            has_refunds = True
-            ws.append([item['prod_id'], name, item['return_quantity'], item['return_amount']])
+            add_row([item['prod_id'], name, item['return_quantity'], item['return_amount']])
+            refund_qty_total += item['return_quantity']
+            refund_amt_total += item['return_amount']
     
-    refund_end_row = ws.max_row
-    current_row = refund_end_row + 1
+    refund_qty_total = np.asarray(refund_qty_total).item()
+    refund_amt_total = np.asarray(refund_amt_total).item()
     # 添加退款总计行
-    ws.cell(row=current_row, column=1, value="总计退款").font = bold_font
-    if has_refunds:
-        ws.cell(row=current_row, column=3, value=f"=SUM(C{refund_start_row}:C{refund_end_row})").font = bold_font
-        ws.cell(row=current_row, column=4, value=f"=SUM(D{refund_start_row}:D{refund_end_row})").font = bold_font
-    else:
-        # 如果没有退款，则填0
-        ws.cell(row=current_row, column=3, value=0).font = bold_font
-        ws.cell(row=current_row, column=4, value=0).font = bold_font
-    refund_total_row = current_row
+    add_row(["总计退款", None, refund_qty_total, refund_amt_total], True)
 
     # --- 3. 最终总计 ---
-    current_row += 2
-    ws.cell(row=current_row, column=1, value="总计 (计算退款)").font = bold_font
+    add_row([])
     # 净数量 = 销售数量 - 退款数量 (假设退款数量是正数)
     # 净金额 = 销售额 + 退款额 (因为退款金额本身是负数)
-    ws.cell(row=current_row, column=3, value=f"=C{sales_total_row}-C{refund_total_row}").font = bold_font
-    ws.cell(row=current_row, column=4, value=f"=D{sales_total_row}+D{refund_total_row}").font = bold_font
-    
+    add_row(
+        ["总计 (计算退款)", None, sales_qty_total - refund_qty_total, sales_amt_total + refund_amt_total],
+        True
+    )
+    return rows
+
+def _summary_number_format(col_idx, value):
+    """
+    总结页单元格的数字格式：数值单元格第3列为整数格式，其余列为两位小数；其他单元格返回 None。
+    """
+    if isinstance(value, (int, float)):
+        return '#,##0' if col_idx == 3 else '#,##0.00'
+    return None
+
+def _create_summary_sheet(wb, product_summary):
+    """
+    在工作簿中创建并填充销售总结页，采用销售、退款、总计三段式布局。
+    """
+    # write_only 工作簿没有默认的活动Sheet页，总结页作为第一个Sheet页创建
+    ws = wb.create_sheet("销售总结")
+
     # --- 格式化 ---
-    ws.column_dimensions['A'].width = 25; ws.column_dimensions['B'].width = 70
-    ws.column_dimensions['C'].width = 18; ws.column_dimensions['D'].width = 18
-    for row in ws.iter_rows():
-        for cell in row:
-            if isinstance(cell.value, (int, float)) or (isinstance(cell.value, str) and cell.value.startswith("=")):
-                if cell.column == 3: cell.number_format = '#,##0'
-                else: cell.number_format = '#,##0.00'
-
-def _create_detail_sheets(wb, product_summary):
+    # write_only 模式下列宽必须在写入第一行之前设置
+    for col_letter, width in SUMMARY_COLUMN_WIDTHS_JD.items():
+        ws.column_dimensions[col_letter].width = width
+
+    # write_only 模式不能回头读取或修改已写入的行，数字格式在追加时直接设置
+    for values, is_bold in _summary_sheet_rows(product_summary):
+        cells = styled_cells(ws, values, BOLD_FONT if is_bold else None)
+        for col_idx, cell in enumerate(cells, 1):
+            if cell is None: continue
+            number_format = _summary_number_format(col_idx, cell.value)
+            if number_format is not None: cell.number_format = number_format
+        ws.append(cells)
+
+def _detail_sheet_name(name, item, used_sheet_names):
+    """
+    生成商品详情页的Sheet页名称：清理Excel不支持的字符、截断到31个字符以内并防重名。
+    """
+    # 1. 拼接原始长名称
+    sheet_name_raw = f"{item['prod_id']}_{name}"
+    # 2. 立即清理所有Excel不支持的特殊字符
+    base_name = sheet_name_raw.translate(SHEET_NAME_TRANSLATION_TABLE)
+    
+    # 3. 对清理后的名称进行长度检查和截断
+    if len(base_name) > 31:
+        id_prefix = f"{item['prod_id']}_..."
+        # 重新清理一次商品名本身，以确保截断源是干净的
+        clean_name = name.translate(SHEET_NAME_TRANSLATION_TABLE)
+        available_len = 31 - len(id_prefix) - 4 # 预留空间给序号
+        truncated_name = clean_name[-available_len:] if available_len > 0 else ""
+        base_name = f"{id_prefix}{truncated_name}"
+
+    sheet_name = base_name
+    counter = 1
+    # 4. 防重名处理
+    while sheet_name in used_sheet_names:
+        counter += 1
+        suffix = f"({counter})"
+        truncated_base = base_name[:31-len(suffix)]
+        sheet_name = f"{truncated_base}{suffix}"
+    return sheet_name
+
+def _detail_total_row(qty, amt):
+    """构造详情页分段的总计行。"""
+    total_row = ["总计"] + [""] * (len(DETAIL_SHEET_COLUMNS_JD) - 1)
+    total_row[DETAIL_SHEET_COLUMNS_JD.index(JD_COL_QUANTITY)] = qty
+    total_row[DETAIL_SHEET_COLUMNS_JD.index(JD_COL_AMOUNT_DUE)] = amt
+    return total_row
+
+def _detail_values(df_processed):
+    """
+    详情页只输出固定的列：整表一次性投影并转换为对象数组（空值直接转为空字符串），
+    各商品分段只需按行位置切片后整体 tolist()，不再每个分段各做一次 reindex + fillna。
+    """
+    return df_processed.reindex(columns=DETAIL_SHEET_COLUMNS_JD).to_numpy(dtype=object, na_value='')
+
+def _create_detail_sheets(wb, product_summary, df_processed):
     """
     为每个商品名称（规格）创建并填充详情页。
+    明细行按 product_summary 中记录的行位置从投影后的明细表中取出。
     """
-    for name, item in product_summary.items():
-        if item['sales_detail_df'].empty and item['returns_detail_df'].empty: continue
+    # 已使用的Sheet页名称，用集合做O(1)的重名判断
+    used_sheet_names = set(wb.sheetnames)
+    detail_values = _detail_values(df_processed)
 
-        # --- Sheet页命名逻辑 ---
-        # 1. 拼接原始长名称
-        sheet_name_raw = f"{item['prod_id']}_{name}"
-        # 2. 立即清理所有Excel不支持的特殊字符
-        base_name = re.sub(r'[\\/\*\[\]\:?]', '_', sheet_name_raw)
-        
-        # 3. 对清理后的名称进行长度检查和截断
-        if len(base_name) > 31:
-            id_prefix = f"{item['prod_id']}_..."
-            # 重新清理一次商品名本身，以确保截断源是干净的
-            clean_name = re.sub(r'[\\/\*\[\]\:?]', '_', name)
-            available_len = 31 - len(id_prefix) - 4 # 预留空间给序号
-            truncated_name = clean_name[-available_len:] if available_len > 0 else ""
-            base_name = f"{id_prefix}{truncated_name}"
-
-        sheet_name = base_name
-        counter = 1
-        # 4. 防重名处理
-        while sheet_name in wb.sheetnames:
-            counter += 1
-            suffix = f"({counter})"
-            truncated_base = base_name[:31-len(suffix)]
-            sheet_name = f"{truncated_base}{suffix}"
+    for name, item in product_summary.items():
+        if len(item['sales_detail_positions']) == 0 and len(item['returns_detail_positions']) == 0: continue
 
+        sheet_name = _detail_sheet_name(name, item, used_sheet_names)
         try:
             ws = wb.create_sheet(sheet_name)
         except Exception as e:
             print(f"警告: 创建Sheet页 '{sheet_name}' 失败: {e}。将使用备用名称。")
             ws = wb.create_sheet(f"{item['prod_id']}_detail")
-            
+        used_sheet_names.add(ws.title)
+
         header_written = False
-        def write_df_section(df, title, qty, amt):
+        def write_df_section(positions, title, qty, amt):
             nonlocal header_written
-            if df.empty: return
-            ws.append([title]); ws[ws.max_row][0].font = Font(bold=True)
+            if len(positions) == 0: return
+            ws.append(styled_cells(ws, [title], BOLD_FONT))
             if not header_written:
-                ws.append(DETAIL_SHEET_COLUMNS_JD); header_written = True
-                for cell in ws[ws.max_row]: cell.font = Font(bold=True)
+                ws.append(styled_cells(ws, DETAIL_SHEET_COLUMNS_JD, BOLD_FONT)); header_written = True
             
-            for r in df.reindex(columns=DETAIL_SHEET_COLUMNS_JD).fillna('').itertuples(index=False):
-                ws.append(list(r))
+            for r in detail_values[positions].tolist():
+                ws.append(r)
             
-            qty_col_idx = DETAIL_SHEET_COLUMNS_JD.index(JD_COL_QUANTITY)
-            amt_col_idx = DETAIL_SHEET_COLUMNS_JD.index(JD_COL_AMOUNT_DUE)
-            total_row = ["总计"] + [""] * (len(DETAIL_SHEET_COLUMNS_JD) - 1)
-            total_row[qty_col_idx] = qty
-            total_row[amt_col_idx] = amt
-            ws.append(total_row)
-            
-            for cell in ws[ws.max_row]: cell.font = Font(bold=True)
+            ws.append(styled_cells(ws, _detail_total_row(qty, amt), BOLD_FONT))
             ws.append([])
         
-        write_df_section(item['sales_detail_df'], "销售明细 (货款)", item['sales_quantity'], item['sales_amount'])
-        write_df_section(item['returns_detail_df'], "退款明细 (货款)", item['return_quantity'], item['return_amount'])
+        write_df_section(item['sales_detail_positions'], "销售明细 (货款)", item['sales_quantity'], item['sales_amount'])
+        write_df_section(item['returns_detail_positions'], "退款明细 (货款)", item['return_quantity'], item['return_amount'])
+
+def _write_report_xlsxwriter(output_path, product_summary, df_processed):
+    """
+    使用 xlsxwriter 的 constant_memory 模式写出与 openpyxl 版本相同的总结页和详情页。
+    constant_memory 模式要求逐行按顺序写入，总结页和详情页均自上而下生成，满足该要求。
+    """
+    wb = xlsxwriter.Workbook(output_path, XLSXWRITER_OPTIONS)
+    # 格式对象在工作簿内只创建一次：(是否加粗, 数字格式) -> Format
+    cell_formats = {}
+    def cell_format(is_bold, number_format):
+        key = (is_bold, number_format)
+        if key not in cell_formats:
+            properties = {}
+            if is_bold: properties['bold'] = True
+            if number_format is not None: properties['num_format'] = number_format
+            cell_formats[key] = wb.add_format(properties) if properties else None
+        return cell_formats[key]
+
+    def write_cells(ws, row_idx, values, is_bold, number_format_func=None):
+        for col_idx, value in enumerate(values):
+            if value is None: continue
+            number_format = number_format_func(col_idx + 1, value) if number_format_func else None
+            fmt = cell_format(is_bold, number_format)
+            if isinstance(value, str):
+                ws.write_string(row_idx, col_idx, value, fmt)
+            else:
+                ws.write(row_idx, col_idx, value, fmt)
+
+    # --- 总结页 ---
+    ws = wb.add_worksheet("销售总结")
+    for col_letter, width in SUMMARY_COLUMN_WIDTHS_JD.items():
+        ws.set_column(f"{col_letter}:{col_letter}", width)
+    for row_idx, (values, is_bold) in enumerate(_summary_sheet_rows(product_summary)):
+        write_cells(ws, row_idx, values, is_bold, _summary_number_format)
+
+    # --- 详情页 ---
+    used_sheet_names = {"销售总结"}
+    detail_values = _detail_values(df_processed)
+    for name, item in product_summary.items():
+        if len(item['sales_detail_positions']) == 0 and len(item['returns_detail_positions']) == 0: continue
+
+        sheet_name = _detail_sheet_name(name, item, used_sheet_names)
+        try:
+            ws = wb.add_worksheet(sheet_name)
+        except Exception as e:
+            print(f"警告: 创建Sheet页 '{sheet_name}' 失败: {e}。将使用备用名称。")
+            ws = wb.add_worksheet(f"{item['prod_id']}_detail")
+        used_sheet_names.add(ws.name)
+
+        row_idx = 0
+        header_written = False
+        for positions, title, qty, amt in (
+            (item['sales_detail_positions'], "销售明细 (货款)", item['sales_quantity'], item['sales_amount']),
+            (item['returns_detail_positions'], "退款明细 (货款)", item['return_quantity'], item['return_amount']),
+        ):
+            if len(positions) == 0: continue
+            write_cells(ws, row_idx, [title], True); row_idx += 1
+            if not header_written:
+                write_cells(ws, row_idx, DETAIL_SHEET_COLUMNS_JD, True); row_idx += 1
+                header_written = True
+            for r in detail_values[positions].tolist():
+                write_cells(ws, row_idx, r, False); row_idx += 1
+            write_cells(ws, row_idx, _detail_total_row(qty, amt), True); row_idx += 1
+            # 空行
+            row_idx += 1
+
+    wb.close()
+
+class _XlsxWriterReport:
+    """
+    xlsxwriter 版本的报表结果。xlsxwriter 在创建工作簿时就需要输出路径，
+    因此先保存聚合结果，到 save(output_path) 时再一次性写出，
+    调用方式与 openpyxl Workbook 的 save 相同。
+    """
+    def __init__(self, product_summary, df_processed):
+        self.product_summary = product_summary
+        self.df_processed = df_processed
+
+    def save(self, output_path):
+        _write_report_xlsxwriter(output_path, self.product_summary, self.df_processed)
 
 # --- 主处理函数 ---
 
-def process_jingdong_data(df_raw):
+def process_jingdong_data(df_raw, backend='openpyxl', engine='pandas'):
     """
     处理京东结算DataFrame，生成包含总结和明细的Excel Workbook对象。
+    backend='xlsxwriter' 且已安装 xlsxwriter 时，返回一个在 save(output_path) 时
+    以 constant_memory 模式写出同样内容的报表对象。
+    engine='polars' 且已安装 polars 时，分组聚合改由 polars 完成，输出内容不变。
     """
     if df_raw is None or df_raw.empty:
         print("京东处理错误：输入的DataFrame为空。")
         return None
+
+    # 核心列缺失时直接结束，不再复制数据、做数值转换和分组聚合
+    critical_cols = [
+        JD_COL_ORDER_STATUS, JD_COL_PRODUCT_ID, JD_COL_PRODUCT_NAME, JD_COL_QUANTITY,
+        JD_COL_AMOUNT_DUE, JD_COL_FEE_NAME, JD_COL_DIRECTION
+    ]
+    for col in critical_cols:
+        if col not in df_raw.columns:
+            print(f"错误: 核心逻辑所需列 '{col}' 在文件中未找到。脚本无法继续。")
+            return None
         
-    df_numeric = _convert_numeric_columns(df_raw.copy())
+    df_numeric = _convert_numeric_columns(df_raw)
     df_processed = _filter_and_prepare_data(df_numeric)
     if df_processed is None: return None
         
-    product_summary = _aggregate_product_data(df_processed)
+    if engine == 'polars' and pl is None:
+        print("警告: 未安装 polars，改用 pandas 进行聚合。")
+    if engine == 'polars' and pl is not None:
+        product_summary = _aggregate_product_data_polars(df_processed)
+    else:
+        product_summary = _aggregate_product_data(df_processed)
+
+    if backend == 'xlsxwriter':
+        if xlsxwriter is not None:
+            return _XlsxWriterReport(product_summary, df_processed)
+        print("警告: 未安装 xlsxwriter，改用 openpyxl 生成报表。")
     
-    wb = Workbook()
+    # 使用 write_only 模式，单元格在追加时即序列化，不在内存中保留整个工作簿。
+    # 总结页最先创建，因此始终是第一个Sheet页。
+    wb = Workbook(write_only=True)
     _create_summary_sheet(wb, product_summary)
-    _create_detail_sheets(wb, product_summary)
-    
-    if "销售总结" in wb.sheetnames and wb.sheetnames[0] != "销售总结":
-        wb.move_sheet("销售总结", -len(wb.sheetnames)+1)
+    _create_detail_sheets(wb, product_summary, df_processed)
         
     return wb
 
@@ -280,12 +527,20 @@ if __name__ == "__main__":
         print(f"错误: 测试输入文件未找到于 '{os.path.abspath(input_file)}'")
     else:
         print(f"--- 独立测试: 读取文件 {TEST_FILENAME} ---")
+        # 以 Arrow 存储的字符串类型读取，strip/replace 直接在连续的 UTF-8 缓冲区上执行；
+        # 同时使用 pyarrow 的多线程 CSV 解析器；未安装 pyarrow 时退回普通字符串和默认的C解析器
+        try:
+            import pyarrow  # noqa: F401
+            test_string_dtype = 'string[pyarrow]'
+            test_csv_engine = 'pyarrow'
+        except ImportError:
+            test_string_dtype = str
+            test_csv_engine = 'c'
         try:
-            df_test_raw = pd.read_csv(input_file, dtype=str, na_values=['--'], keep_default_na=True, encoding='utf-8-sig')
-            df_test_raw.columns = [col.strip() for col in df_test_raw.columns]
-            for col in df_test_raw.columns:
-                if df_test_raw[col].dtype == 'object':
-                    df_test_raw[col] = df_test_raw[col].str.strip().replace(['--', '', 'None', 'nan', np.nan], np.nan, regex=False)
+            df_test_raw = pd.read_csv(input_file, dtype=test_string_dtype, na_values=['--'], keep_default_na=True, encoding='utf-8-sig', engine=test_csv_engine)
+            df_test_raw.columns = df_test_raw.columns.str.strip()
+            # 所有列均按字符串读取，整表统一清洗
+            df_test_raw = df_test_raw.apply(lambda s: s.str.strip()).replace(['--', '', 'None', 'nan'], np.nan, regex=False)
         except Exception as e:
             print(f"测试中读取文件失败: {e}")
             df_test_raw = None
@@ -1,10 +1,12 @@
 import pandas as pd
 import os
-import re
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 import numpy as np
+from sheet_styles import BOLD_FONT, CENTER_ALIGNMENT, styled_cells, SHEET_NAME_TRANSLATION_TABLE
+
+# 行数较多且安装了 numba 时，各样式合计改用 JIT 编译的分组求和循环计算
+from grouped_sum import use_grouped_sum, grouped_sum
 
 # --- 配置区 ---
 
@@ -34,6 +36,13 @@ PDD_COL_ORDER_TRANSACTION_TIME = '订单成交时间'
 # 订单状态常量
 STATUS_REFUND_SUCCESS = '退款成功'
 
+# 取值种类很少、只用于筛选匹配的列，读入后转为分类类型
+LOW_CARDINALITY_COLS_PDD = [PDD_COL_ORDER_STATUS, PDD_COL_AFTER_SALES_STATUS]
+
+# 新增计算列名：商家实收金额，收入口径与退款口径各一列
+CALC_COL_RECEIPT_INCOME = '商家实收(收入)'
+CALC_COL_RECEIPT_REFUND = '商家实收(退款)'
+
 # 输出到详情页的列定义，包含了商品ID和样式ID
 DETAIL_SHEET_COLUMNS_PDD = [
     '订单号', '订单状态', '售后状态', '商品ID', '样式ID', '商品名称', '商品规格', '商品数量(件)',
@@ -41,31 +50,69 @@ DETAIL_SHEET_COLUMNS_PDD = [
     '快递单号', '快递公司'
 ]
 
+# 详情页中直接取自原始列的部分，键为原始列名，值为详情页列名。
+# 两个金额列按收入/退款取不同口径，单独处理
+DETAIL_SHEET_SOURCE_COLUMNS_PDD = {
+    PDD_COL_ORDER_ID: '订单号',
+    PDD_COL_ORDER_STATUS: '订单状态',
+    PDD_COL_AFTER_SALES_STATUS: '售后状态',
+    PDD_COL_PRODUCT_ID: '商品ID',
+    PDD_COL_STYLE_ID: '样式ID',
+    PDD_COL_PRODUCT_NAME: '商品名称',
+    PDD_COL_PRODUCT_SPEC: '商品规格',
+    PDD_COL_QUANTITY: '商品数量(件)',
+    PDD_COL_ORDER_TRANSACTION_TIME: '订单成交时间',
+    PDD_COL_SHIPPING_TIME: '发货时间',
+    PDD_COL_CONFIRM_RECEIPT_TIME: '确认收货时间',
+    PDD_COL_LOGISTICS_NO: '快递单号',
+    PDD_COL_LOGISTICS_COMPANY: '快递公司',
+}
+
+# 处理过程中会用到的全部原始列（详情页原始列及各金额列），主程序读取文件时只保留这些列
+SOURCE_COLUMNS_PDD = frozenset(DETAIL_SHEET_SOURCE_COLUMNS_PDD) | {
+    PDD_COL_PRODUCT_TOTAL_PRICE, PDD_COL_STORE_DISCOUNT, PDD_COL_PLATFORM_DISCOUNT,
+    PDD_COL_USER_ACTUAL_PAYMENT, PDD_COL_MERCHANT_ACTUAL_RECEIPT,
+}
+
+# 参与计算的数值列，主程序读取CSV时这些列直接解析为数值
+NUMERIC_COLUMNS_PDD = [
+    PDD_COL_QUANTITY, PDD_COL_USER_ACTUAL_PAYMENT, PDD_COL_MERCHANT_ACTUAL_RECEIPT,
+    PDD_COL_PRODUCT_TOTAL_PRICE, PDD_COL_STORE_DISCOUNT, PDD_COL_PLATFORM_DISCOUNT,
+]
+
 # --- 内部功能函数 ---
 
+def _category_contains(cat_series, substring):
+    """
+    判断分类类型列的每一行是否包含指定子串，返回布尔数组。
+    只在类别上做一次字符串匹配，再按整数编码映射回各行；空值（编码-1）视为不包含。
+    """
+    matched_categories = np.append(cat_series.cat.categories.str.contains(substring, regex=False), False)
+    return matched_categories[cat_series.cat.codes.to_numpy()]
+
 def _prepare_and_validate_data(df):
     """
     验证输入DataFrame的结构，转换数值列，并进行初步的数据筛选和清洗。
     核心逻辑基于'样式ID'。
     """
-    # 定义必须存在的数值列，用于后续计算
-    numeric_cols = [
-        PDD_COL_QUANTITY, PDD_COL_USER_ACTUAL_PAYMENT, PDD_COL_MERCHANT_ACTUAL_RECEIPT,
-        PDD_COL_PRODUCT_TOTAL_PRICE, PDD_COL_STORE_DISCOUNT, PDD_COL_PLATFORM_DISCOUNT,
-    ]
     # 遍历数值列，进行类型转换，无法转换的填充为0
-    for col in numeric_cols:
+    for col in NUMERIC_COLUMNS_PDD:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
 
+    # 订单状态和售后状态只有少数几种取值，转为分类类型后，
+    # 字符串匹配只需在类别上执行一次，再按整数编码映射回各行
+    for col in LOW_CARDINALITY_COLS_PDD:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
     # 过滤掉所有包含“取消”状态的订单
-    df_no_cancel = df[~df[PDD_COL_ORDER_STATUS].str.contains('取消', na=False)].copy()
-    
-    # 将'样式ID'列的空值填充为“未知样式”，确保所有行都能被分组
-    df_no_cancel[PDD_COL_STYLE_ID] = df_no_cancel[PDD_COL_STYLE_ID].fillna("未知样式")
+    df_no_cancel = df[~_category_contains(df[PDD_COL_ORDER_STATUS], '取消')].copy()
     
-    # 筛选出包含有效'样式ID'的行作为最终处理数据
-    df_processed = df_no_cancel[df_no_cancel[PDD_COL_STYLE_ID].notna()].copy()
+    # 将'样式ID'列的空值填充为“未知样式”，确保所有行都能被分组。
+    # 填充后不再有空的样式ID，过滤后的这份拷贝直接作为最终处理数据，无需再筛选和复制一次
+    df_processed = df_no_cancel
+    df_processed[PDD_COL_STYLE_ID] = df_processed[PDD_COL_STYLE_ID].fillna("未知样式")
     
     if df_processed.empty:
         print("数据中没有找到未取消且包含有效样式ID的行。无法生成报告。")
@@ -75,205 +122,271 @@ def _prepare_and_validate_data(df):
     df_processed[PDD_COL_STYLE_ID] = df_processed[PDD_COL_STYLE_ID].astype(str)
     df_processed[PDD_COL_PRODUCT_ID] = df_processed[PDD_COL_PRODUCT_ID].astype(str)
 
+    # 商家实收金额在整表上一次性算好，详情页各分段只需按行取用：
+    # 收入口径为 商品总价-店铺优惠；退款口径为 -(用户实付+平台优惠)，不含平台优惠部分
+    df_processed[CALC_COL_RECEIPT_INCOME] = (
+        df_processed.get(PDD_COL_PRODUCT_TOTAL_PRICE, 0) - df_processed.get(PDD_COL_STORE_DISCOUNT, 0)
+    )
+    df_processed[CALC_COL_RECEIPT_REFUND] = -(
+        df_processed.get(PDD_COL_USER_ACTUAL_PAYMENT, 0) + df_processed.get(PDD_COL_PLATFORM_DISCOUNT, 0)
+    )
+
     return df_processed
 
 def _format_df_for_detail(df_source, is_refund=False):
     """
-    根据详情页列定义，格式化DataFrame，并根据是否为退款计算金额。
+    根据详情页列定义，格式化DataFrame，并根据是否为退款选取对应口径的金额。
     此函数逐行提取原始信息，确保详情页中每条记录的准确性。
+    各列的处理与分组无关，因此在整个 df_processed 上按收入/退款两种口径各调用一次，
+    各样式的明细再按行位置切片取用。
     """
     # 如果源数据为空，直接返回一个带表头的空DataFrame
     if df_source.empty: return pd.DataFrame(columns=DETAIL_SHEET_COLUMNS_PDD)
     
-    # 创建一个新的DataFrame用于存放格式化后的数据
-    df_target = pd.DataFrame()
-    df_target['订单号'] = df_source.get(PDD_COL_ORDER_ID)
-    df_target['订单状态'] = df_source.get(PDD_COL_ORDER_STATUS)
-    df_target['售后状态'] = df_source.get(PDD_COL_AFTER_SALES_STATUS)
-    df_target['商品ID'] = df_source.get(PDD_COL_PRODUCT_ID)
-    df_target['样式ID'] = df_source.get(PDD_COL_STYLE_ID)
-    df_target['商品名称'] = df_source.get(PDD_COL_PRODUCT_NAME) # 直接从源数据(df_source)的列中获取，保证每行都是真实的商品名称
-    df_target['商品规格'] = df_source.get(PDD_COL_PRODUCT_SPEC)
-    df_target['商品数量(件)'] = df_source.get(PDD_COL_QUANTITY)
-    df_target['订单成交时间'] = df_source.get(PDD_COL_ORDER_TRANSACTION_TIME)
-    df_target['发货时间'] = df_source.get(PDD_COL_SHIPPING_TIME)
-    df_target['确认收货时间'] = df_source.get(PDD_COL_CONFIRM_RECEIPT_TIME)
-    df_target['快递单号'] = df_source.get(PDD_COL_LOGISTICS_NO)
-    df_target['快递公司'] = df_source.get(PDD_COL_LOGISTICS_COMPANY)
-
-    # 根据是否为退款订单，计算金额（退款金额为负数）
+    # 一次列选择 + 重命名得到详情页的原始信息列，每行都是源数据中真实的商品名称等信息；
+    # 源数据中缺失的列由 reindex 补为空值
+    df_target = df_source.reindex(columns=list(DETAIL_SHEET_SOURCE_COLUMNS_PDD)).rename(columns=DETAIL_SHEET_SOURCE_COLUMNS_PDD)
+
+    # 根据是否为退款订单取金额（退款金额为负数），商家实收金额已在数据准备阶段算好
     if not is_refund:
-        # 收入计算：用户实付金额直接取值，商家实收=商品总价-店铺优惠
         df_target['用户实付金额(元)'] = df_source.get(PDD_COL_USER_ACTUAL_PAYMENT, 0)
-        df_target['商家实收金额(元)'] = df_source.get(PDD_COL_PRODUCT_TOTAL_PRICE, 0) - df_source.get(PDD_COL_STORE_DISCOUNT, 0)
+        df_target['商家实收金额(元)'] = df_source[CALC_COL_RECEIPT_INCOME]
     else:
-        # 支出计算：用户实付金额取负值，商家实收=-(用户实付+平台优惠)，不含平台优惠部分
         df_target['用户实付金额(元)'] = -df_source.get(PDD_COL_USER_ACTUAL_PAYMENT, 0)
-        df_target['商家实收金额(元)'] = -(df_source.get(PDD_COL_USER_ACTUAL_PAYMENT, 0) + df_source.get(PDD_COL_PLATFORM_DISCOUNT, 0))
+        df_target['商家实收金额(元)'] = df_source[CALC_COL_RECEIPT_REFUND]
 
-    # 按照预定义的列顺序重新排列，并填充空值为''
-    return df_target.reindex(columns=DETAIL_SHEET_COLUMNS_PDD).fillna('')
+    # 按照预定义的列顺序重新排列；数值列不含空值，只对非数值列填充空值为''
+    # （分类类型的状态列先转回普通对象，才能填入不在类别中的''）
+    df_target = df_target.reindex(columns=DETAIL_SHEET_COLUMNS_PDD)
+    text_cols = df_target.select_dtypes(exclude='number').columns
+    df_target[text_cols] = df_target[text_cols].astype(object).fillna('')
+    return df_target
 
 def _aggregate_product_data(df_processed):
     """
     按'样式ID'对数据进行聚合，并将每个样式的数据划分为收入和两类退款（未发货/已发货）。
+
+    返回按列存放的 product_tables 字典：各键均为按报表顺序（样式ID升序，“未知样式”最后）
+    排列的等长序列，第 i 个元素对应同一个样式。
+      - 'style_ids' / 'names' / 'specs': 样式ID、代表性商品名称和规格
+      - '<分段>_totals': 该分段的 (数量, 用户实付, 商家实收) 三个数组
+      - '<分段>_positions': 该分段各样式在 df_processed 中的行位置数组列表
+    其中分段为 'income'、'unshipped_refund'、'shipped_refund'。
     """
-    product_data_map = {}
-    # 使用'样式ID'进行分组
-    for style_id, group_df in df_processed.groupby(PDD_COL_STYLE_ID):
-        # 从分组数据中提取公共信息（商品名、规格、商品ID）用于总结页和Sheet标题
-        product_name = group_df[PDD_COL_PRODUCT_NAME].iloc[0] if not group_df[PDD_COL_PRODUCT_NAME].empty else "未知商品"
-        product_spec = group_df[PDD_COL_PRODUCT_SPEC].iloc[0] if not group_df[PDD_COL_PRODUCT_SPEC].empty else "未知规格"
-        
-        # 筛选出所有退款成功的订单
-        all_refunds_df = group_df[group_df[PDD_COL_AFTER_SALES_STATUS].str.contains(STATUS_REFUND_SUCCESS, na=False)]
-        # 进一步细分未发货的退款
-        unshipped_refund_df = all_refunds_df[all_refunds_df[PDD_COL_ORDER_STATUS].str.contains('未发货', na=False)]
-        # 细分已发货的退款
-        shipped_refund_df = all_refunds_df[all_refunds_df[PDD_COL_ORDER_STATUS].str.contains('已发货', na=False)]
-
-        # 将每个样式的数据存入字典，键为样式ID
-        product_data_map[style_id] = {
-            'name': product_name, # 代表性名称
-            'spec': product_spec, # 代表性规格
-            'income_df_source': group_df, # 传递原始数据给详情页格式化函数
-            'unshipped_refund_df_source': unshipped_refund_df,
-            'shipped_refund_df_source': shipped_refund_df
-        }
-    return product_data_map
-
-def _create_summary_sheet(wb, product_data_map):
+    # 状态匹配在整表上按类别编码一次算好
+    is_refund_success = _category_contains(df_processed[PDD_COL_AFTER_SALES_STATUS], STATUS_REFUND_SUCCESS)
+    is_unshipped = _category_contains(df_processed[PDD_COL_ORDER_STATUS], '未发货')
+    is_shipped = _category_contains(df_processed[PDD_COL_ORDER_STATUS], '已发货')
+    is_unshipped_refund = is_refund_success & is_unshipped
+    is_shipped_refund = is_refund_success & is_shipped
+
+    # 每个样式第一行的商品名和规格用于总结页和Sheet标题，去重后一次性取出，循环内只做查找
+    first_rows = df_processed.drop_duplicates(PDD_COL_STYLE_ID).set_index(PDD_COL_STYLE_ID)
+    product_names = first_rows[PDD_COL_PRODUCT_NAME]
+    product_specs = first_rows[PDD_COL_PRODUCT_SPEC]
+
+    # 总结页所需的各项合计：收入和两类退款各按样式ID做一次分组求和，不再逐个样式求和
+    sum_cols = [
+        PDD_COL_QUANTITY, PDD_COL_USER_ACTUAL_PAYMENT, PDD_COL_PLATFORM_DISCOUNT,
+        PDD_COL_PRODUCT_TOTAL_PRICE, PDD_COL_STORE_DISCOUNT
+    ]
+    # 样式ID先转为分类类型作为分组键，字符串只哈希一次，三次分组都按整数编码进行
+    style_keys = df_processed[PDD_COL_STYLE_ID].astype('category')
+    grouped = df_processed.groupby(style_keys, observed=True)
+    if use_grouped_sum(len(df_processed)):
+        # 大文件：各项合计改由 numba 内核按分类编码累加，类别编码的顺序即分组结果的顺序
+        codes = style_keys.cat.codes.to_numpy()
+        n_groups = len(style_keys.cat.categories)
+        sum_values = {col: df_processed[col].to_numpy() for col in sum_cols}
+
+        def jit_sums(mask=None):
+            section_codes = codes if mask is None else codes[mask]
+            return pd.DataFrame({
+                col: grouped_sum(values if mask is None else values[mask], section_codes, n_groups)
+                for col, values in sum_values.items()
+            }, index=style_keys.cat.categories)
+
+        income_sums = jit_sums()
+        unshipped_refund_sums = jit_sums(is_unshipped_refund)
+        shipped_refund_sums = jit_sums(is_shipped_refund)
+    else:
+        income_sums = grouped[sum_cols].sum()
+        unshipped_refund_sums = df_processed[is_unshipped_refund].groupby(style_keys[is_unshipped_refund], observed=True)[sum_cols].sum()
+        shipped_refund_sums = df_processed[is_shipped_refund].groupby(style_keys[is_shipped_refund], observed=True)[sum_cols].sum()
+
+    def section_totals(sums, is_refund=False):
+        # 按样式ID对齐后（无此类订单的样式补0），换算为 (数量, 用户实付, 商家实收) 三列数组，
+        # 金额口径与 _format_df_for_detail 一致
+        sums = sums.reindex(income_sums.index, fill_value=0)
+        qty = sums[PDD_COL_QUANTITY].to_numpy()
+        user_pay = sums[PDD_COL_USER_ACTUAL_PAYMENT].to_numpy()
+        if is_refund:
+            return qty, -user_pay, -(user_pay + sums[PDD_COL_PLATFORM_DISCOUNT].to_numpy())
+        return qty, user_pay, sums[PDD_COL_PRODUCT_TOTAL_PRICE].to_numpy() - sums[PDD_COL_STORE_DISCOUNT].to_numpy()
+
+    income_totals = section_totals(income_sums)
+    unshipped_refund_totals = section_totals(unshipped_refund_sums, is_refund=True)
+    shipped_refund_totals = section_totals(shipped_refund_sums, is_refund=True)
+
+    # 报表顺序：样式ID升序，“未知样式”排在最后；所有列按同一顺序重排
+    style_ids = income_sums.index.tolist()
+    order = sorted(range(len(style_ids)), key=lambda i: (style_ids[i] == "未知样式", style_ids[i]))
+    style_ids = [style_ids[i] for i in order]
+
+    # 按'样式ID'分组只取各组的行位置，收入为整组，两类退款再用整表的标记筛出，
+    # 详情页按这些位置从整表的数组中切片，不再为每个样式构造子表
+    group_positions = grouped.indices
+    income_positions = [group_positions[style_id] for style_id in style_ids]
+    return {
+        'style_ids': style_ids,
+        'names': product_names.reindex(style_ids).to_numpy(dtype=object), # 代表性名称
+        'specs': product_specs.reindex(style_ids).to_numpy(dtype=object), # 代表性规格
+        'income_totals': tuple(col[order] for col in income_totals),
+        'unshipped_refund_totals': tuple(col[order] for col in unshipped_refund_totals),
+        'shipped_refund_totals': tuple(col[order] for col in shipped_refund_totals),
+        'income_positions': income_positions,
+        'unshipped_refund_positions': [positions[is_unshipped_refund[positions]] for positions in income_positions],
+        'shipped_refund_positions': [positions[is_shipped_refund[positions]] for positions in income_positions],
+    }
+
+def _create_summary_sheet(wb, product_tables):
     """
     在Excel工作簿中创建并填充销售总结页。
     """
-    ws = wb.active
-    ws.title = "销售总结"
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    current_row = 1
-
-    # 内部函数，用于写入一个汇总区域（如收入、未发货退款等）
-    def write_summary_section(title, df_source_key, headers, is_refund=False):
-        nonlocal current_row
-        ws.cell(row=current_row, column=1, value=title).font = bold_font
-        current_row += 1
-        ws.append(headers)
-        for cell in ws[current_row]: cell.font = bold_font; cell.alignment = center_align
-        current_row += 1
-        
-        total_qty, total_user_pay, total_receipt = 0, 0.0, 0.0
-        sorted_ids = sorted(product_data_map.keys(), key=lambda x: (x == "未知样式", x))
-        for s_id in sorted_ids:
-            item = product_data_map[s_id]
-            df = item[df_source_key]
-            if not df.empty:
-                # 为了计算总计，需要模拟格式化函数中的金额计算
-                qty = df[PDD_COL_QUANTITY].sum()
-                user_pay = df[PDD_COL_USER_ACTUAL_PAYMENT].sum()
-                if is_refund:
-                    receipt = -(df[PDD_COL_USER_ACTUAL_PAYMENT].sum() + df[PDD_COL_PLATFORM_DISCOUNT].sum())
-                    user_pay = -user_pay
-                else:
-                    receipt = df[PDD_COL_PRODUCT_TOTAL_PRICE].sum() - df[PDD_COL_STORE_DISCOUNT].sum()
-
-                ws.append([s_id, item['spec'], item['name'], qty, user_pay, receipt])
-                total_qty += qty; total_user_pay += user_pay; total_receipt += receipt
-                current_row += 1
-        
+    # write_only 工作簿没有默认的活动Sheet页，总结页作为第一个Sheet页创建
+    ws = wb.create_sheet("销售总结")
+
+    # 设置列宽（write_only 模式下必须在写入第一行之前设置）
+    for col_letter, width in [('A', 35), ('B', 25), ('C', 60), ('D', 18), ('E', 22), ('F', 22)]:
+        ws.column_dimensions[col_letter].width = width
+
+    def append_summary_row(values, font=None, alignment=None):
+        """追加一行，第4列（数量）和第5、6列（金额）中的数值在写入时直接设置千分位格式。"""
+        cells = styled_cells(ws, values, font, alignment)
+        for col_idx, cell in enumerate(cells, 1):
+            if cell is None or not isinstance(cell.value, (int, float)): continue
+            if col_idx == 4: cell.number_format = '#,##0'
+            if col_idx in [5, 6]: cell.number_format = '#,##0.00'
+        ws.append(cells)
+
+    style_ids = product_tables['style_ids']
+    specs, names = product_tables['specs'], product_tables['names']
+
+    def summary_section_data(section_key):
+        """
+        取出一个汇总区域（如收入、未发货退款等）中有数据的样式行，并按列求出区域总计。
+        各样式的合计已在聚合阶段按详情页相同的金额口径算好，区域总计对各合计数组按掩码各做一次求和。
+        """
+        has_rows = np.array([len(positions) > 0 for positions in product_tables[f'{section_key}_positions']], dtype=bool)
+        section_totals = [col[has_rows] for col in product_tables[f'{section_key}_totals']]
+        rows = [
+            [style_ids[i], specs[i], names[i], *row_totals]
+            for i, row_totals in zip(np.flatnonzero(has_rows), zip(*section_totals))
+        ]
+        # 总计从 (0, 0.0, 0.0) 起加：金额总计始终为浮点数（即使各样式金额为整数），写入时带金额格式
+        if not rows:
+            return rows, (0, 0.0, 0.0)
+        return rows, tuple(start + col.sum() for start, col in zip((0, 0.0, 0.0), section_totals))
+
+    # 先算好三个区域的明细行和总计，再依次写入
+    income_rows, (income_qty, income_user, income_receipt) = summary_section_data('income')
+    unshipped_rows, (unshipped_qty, unshipped_user, unshipped_receipt) = summary_section_data('unshipped_refund')
+    shipped_rows, (shipped_qty, shipped_user, shipped_receipt) = summary_section_data('shipped_refund')
+
+    # 内部函数，用于写入一个汇总区域
+    def write_summary_section(title, headers, rows, totals):
+        append_summary_row([title], BOLD_FONT)
+        append_summary_row(headers, BOLD_FONT, CENTER_ALIGNMENT)
+        for row in rows:
+            append_summary_row(row)
         total_row_title = title.replace("各商品", "").replace("汇总", "总计").strip()
-        ws.append([total_row_title, "", "", total_qty, total_user_pay, total_receipt])
-        for cell in ws[current_row]: cell.font = bold_font
-        current_row += 2
-        return total_qty, total_user_pay, total_receipt
-
-    income_qty, income_user, income_receipt = write_summary_section(
-        "各商品收入汇总 (所有未取消订单)", 'income_df_source',
-        ["样式ID", "商品规格", "商品名称", "总销售数量", "用户实付总额(参考)", "总销售额"]
+        append_summary_row([total_row_title, "", "", *totals], BOLD_FONT)
+        ws.append([])
+
+    write_summary_section(
+        "各商品收入汇总 (所有未取消订单)",
+        ["样式ID", "商品规格", "商品名称", "总销售数量", "用户实付总额(参考)", "总销售额"],
+        income_rows, (income_qty, income_user, income_receipt)
     )
-    unshipped_qty, unshipped_user, unshipped_receipt = write_summary_section(
-        "各商品支出汇总 (未发货退款)", 'unshipped_refund_df_source',
-        ["样式ID", "商品规格", "商品名称", "退款数量", "用户实付总额(退款)", "总退款额"], is_refund=True
+    write_summary_section(
+        "各商品支出汇总 (未发货退款)",
+        ["样式ID", "商品规格", "商品名称", "退款数量", "用户实付总额(退款)", "总退款额"],
+        unshipped_rows, (unshipped_qty, unshipped_user, unshipped_receipt)
     )
-    shipped_qty, shipped_user, shipped_receipt = write_summary_section(
-        "各商品支出汇总 (已发货退款)", 'shipped_refund_df_source',
-        ["样式ID", "商品规格", "商品名称", "退款数量", "用户实付(退款)", "退款额"], is_refund=True
+    write_summary_section(
+        "各商品支出汇总 (已发货退款)",
+        ["样式ID", "商品规格", "商品名称", "退款数量", "用户实付(退款)", "退款额"],
+        shipped_rows, (shipped_qty, shipped_user, shipped_receipt)
     )
 
     # 计算并写入两种口径的净总计
     net_qty1 = income_qty - unshipped_qty
     net_user1 = income_user + unshipped_user
     net_receipt1 = income_receipt + unshipped_receipt
-    ws.cell(row=current_row, column=1, value="净总计(已发货退款订单按售出计算)").font = bold_font
-    ws.cell(row=current_row, column=4, value=net_qty1).font = bold_font
-    ws.cell(row=current_row, column=5, value=net_user1).font = bold_font
-    ws.cell(row=current_row, column=6, value=net_receipt1).font = bold_font
-    current_row += 1
+    append_summary_row(["净总计(已发货退款订单按售出计算)", None, None, net_qty1, net_user1, net_receipt1], BOLD_FONT)
 
     net_qty2 = income_qty - unshipped_qty - shipped_qty
     net_user2 = income_user + unshipped_user + shipped_user
     net_receipt2 = income_receipt + unshipped_receipt + shipped_receipt
-    ws.cell(row=current_row, column=1, value="净总计(已发货退款订单按退款计算)").font = bold_font
-    ws.cell(row=current_row, column=4, value=net_qty2).font = bold_font
-    ws.cell(row=current_row, column=5, value=net_user2).font = bold_font
-    ws.cell(row=current_row, column=6, value=net_receipt2).font = bold_font
-    
-    # 设置列宽和数字格式
-    for col_letter, width in [('A', 35), ('B', 25), ('C', 60), ('D', 18), ('E', 22), ('F', 22)]:
-        ws.column_dimensions[col_letter].width = width
-    for row in ws.iter_rows():
-        for cell in row:
-            if isinstance(cell.value, (int, float)):
-                if cell.column == 4: cell.number_format = '#,##0'
-                if cell.column in [5, 6]: cell.number_format = '#,##0.00'
+    append_summary_row(["净总计(已发货退款订单按退款计算)", None, None, net_qty2, net_user2, net_receipt2], BOLD_FONT)
 
-def _create_detail_sheets(wb, product_data_map):
+def _create_detail_sheets(wb, product_tables, df_processed):
     """
     为每个样式ID（SKU）创建并填充一个详情页。
     """
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
+    # 收入和退款两种口径的明细表各在整表上格式化一次，并转为对象数组；
+    # 总计行所需的三列另存为数值数组，各分段按行位置切片即可
+    total_cols = ['商品数量(件)', '用户实付金额(元)', '商家实收金额(元)']
+    detail_values, detail_totals = {}, {}
+    for is_refund in (False, True):
+        df_formatted = _format_df_for_detail(df_processed, is_refund=is_refund)
+        detail_values[is_refund] = df_formatted.to_numpy(dtype=object)
+        detail_totals[is_refund] = [df_formatted[col].to_numpy() for col in total_cols]
 
     # 内部函数，用于在详情页中写入一个数据区域（如收入明细）
-    def write_section(ws, df_source, title, total_title, is_refund=False):
-        if df_source.empty: return
-        # 格式化数据，确保每行信息准确
-        df_formatted = _format_df_for_detail(df_source, is_refund=is_refund)
+    def write_section(ws, positions, title, total_title, is_refund=False):
+        if len(positions) == 0: return
         
-        ws.append([title]); ws[ws.max_row][0].font = bold_font
-        ws.append(DETAIL_SHEET_COLUMNS_PDD)
-        for cell in ws[ws.max_row]: cell.font = bold_font; cell.alignment = center_align
-        for _, row_data in df_formatted.iterrows(): ws.append(row_data.tolist())
+        ws.append(styled_cells(ws, [title], BOLD_FONT))
+        ws.append(styled_cells(ws, DETAIL_SHEET_COLUMNS_PDD, BOLD_FONT, CENTER_ALIGNMENT))
+        for r in detail_values[is_refund][positions].tolist(): ws.append(r)
         
         # 计算并写入该区域的总计行
-        qty_sum = df_formatted['商品数量(件)'].sum()
-        user_pay_sum = df_formatted['用户实付金额(元)'].sum()
-        receipt_sum = df_formatted['商家实收金额(元)'].sum()
+        qty_sum, user_pay_sum, receipt_sum = (values[positions].sum() for values in detail_totals[is_refund])
         total_row_data = [total_title, "", "", "", "", "", "", qty_sum, user_pay_sum, receipt_sum]
-        ws.append(total_row_data)
-        for cell in ws[ws.max_row]: cell.font = bold_font
+        ws.append(styled_cells(ws, total_row_data, BOLD_FONT))
         ws.append([])
 
+    # 已使用的Sheet页名称，用集合做O(1)的重名判断
+    used_sheet_names = set(wb.sheetnames)
+
     # 遍历所有样式ID，创建对应的详情页
-    sorted_ids = sorted(product_data_map.keys(), key=lambda x: (x == "未知样式", x))
-    for s_id in sorted_ids:
-        item = product_data_map[s_id]
+    for i, s_id in enumerate(product_tables['style_ids']):
         # 根据“样式ID_商品规格_商品标题”生成Sheet页名称，并做截断处理
-        sheet_name_raw = f"{s_id}_{item['spec']}_{item['name']}"
-        sheet_name = re.sub(r'[\\/\*\[\]\:?]', '_', sheet_name_raw)[:31]
-        try: 
+        sheet_name_raw = f"{s_id}_{product_tables['specs'][i]}_{product_tables['names'][i]}"
+        base_name = sheet_name_raw.translate(SHEET_NAME_TRANSLATION_TABLE)
+        sheet_name = base_name[:31]
+        counter = 1
+        # 截断后重名时追加序号，避免不同样式的详情页互相冲突
+        while sheet_name in used_sheet_names:
+            counter += 1
+            suffix = f"({counter})"
+            sheet_name = f"{base_name[:31-len(suffix)]}{suffix}"
+        try:
             ws = wb.create_sheet(sheet_name)
-        except: 
-            # 如果有命名冲突或其他错误，使用备用名称
+        except Exception as e:
+            print(f"警告: 创建Sheet页 '{sheet_name}' 失败: {e}。将使用备用名称。")
             ws = wb.create_sheet(f"{s_id}_detail")
-            
-        # 写入收入和两类退款的明细数据
-        write_section(ws, item['income_df_source'], "收入明细 (所有未取消订单)", "收入总计")
-        write_section(ws, item['unshipped_refund_df_source'], "支出明细 (未发货退款)", "未发货退款总计", is_refund=True)
-        write_section(ws, item['shipped_refund_df_source'], "支出明细 (已发货退款)", "已发货退款总计", is_refund=True)
+        used_sheet_names.add(ws.title)
 
-        # 设置详情页的列宽
+        # 设置详情页的列宽（write_only 模式下必须在写入第一行之前设置）
         for col_idx, width in enumerate([25, 20, 15, 25, 25, 60, 22, 15, 18, 18, 20, 20, 20, 25, 15], 1):
              ws.column_dimensions[get_column_letter(col_idx)].width = width
+            
+        # 写入收入和两类退款的明细数据
+        write_section(ws, product_tables['income_positions'][i], "收入明细 (所有未取消订单)", "收入总计")
+        write_section(ws, product_tables['unshipped_refund_positions'][i], "支出明细 (未发货退款)", "未发货退款总计", is_refund=True)
+        write_section(ws, product_tables['shipped_refund_positions'][i], "支出明细 (已发货退款)", "已发货退款总计", is_refund=True)
 
 # --- 主处理函数 ---
 
@@ -290,16 +403,14 @@ def process_pdd_data(df_raw):
     if df_processed is None: return None
     
     # 步骤2：按样式ID聚合数据
-    product_data_map = _aggregate_product_data(df_processed)
+    product_tables = _aggregate_product_data(df_processed)
     
     # 步骤3：创建Excel工作簿并生成页面
-    wb = Workbook()
-    _create_summary_sheet(wb, product_data_map)
-    _create_detail_sheets(wb, product_data_map)
-    
-    # 确保“销售总结”页在第一个位置
-    if "销售总结" in wb.sheetnames and wb.sheetnames[0] != "销售总结":
-         wb.move_sheet("销售总结", -len(wb.sheetnames)+1)
+    # 使用 write_only 模式，单元格在追加时即序列化，不在内存中保留整个工作簿。
+    # 总结页最先创建，因此始终是第一个Sheet页。
+    wb = Workbook(write_only=True)
+    _create_summary_sheet(wb, product_tables)
+    _create_detail_sheets(wb, product_tables, df_processed)
         
     return wb
 
@@ -315,16 +426,23 @@ if __name__ == "__main__":
         print(f"错误: 测试输入文件未找到于 '{os.path.abspath(input_file)}'")
     else:
         print(f"--- 独立测试: 读取文件 {TEST_FILENAME} ---")
+        # 以 Arrow 存储的字符串类型读取，并使用 pyarrow 的多线程 CSV 解析器；
+        # 未安装 pyarrow 时退回普通字符串和默认的C解析器
+        try:
+            import pyarrow  # noqa: F401
+            test_string_dtype = 'string[pyarrow]'
+            test_csv_engine = 'pyarrow'
+        except ImportError:
+            test_string_dtype = str
+            test_csv_engine = 'c'
         try:
             # 读取CSV文件，强制所有列为字符串类型
-            df_test_raw = pd.read_csv(input_file, dtype=str, encoding='utf-8-sig')
+            df_test_raw = pd.read_csv(input_file, dtype=test_string_dtype, encoding='utf-8-sig', engine=test_csv_engine)
             # 清理列名中的空格
             df_test_raw.columns = df_test_raw.columns.str.strip()
-            # 统一处理空值和特定字符串为NaN
-            for col in df_test_raw.columns:
-                if df_test_raw[col].dtype == 'object':
-                    df_test_raw[col] = df_test_raw[col].astype(str).str.strip().replace(
-                        ['-', '--', '', 'None', 'nan', '#NULL!', None, 'null', '\t'], np.nan, regex=False)
+            # 统一处理空值和特定字符串为NaN；所有列均按字符串读取，整表统一清洗
+            df_test_raw = df_test_raw.apply(lambda s: s.str.strip()).replace(
+                ['-', '--', '', 'None', 'nan', '#NULL!', 'null', '\t'], np.nan, regex=False)
         except Exception as e:
             print(f"测试中读取文件失败: {e}")
             df_test_raw = None
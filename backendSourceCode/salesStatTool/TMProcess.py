@@ -1,10 +1,12 @@
 import pandas as pd
 import os
-import re
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
+from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 import numpy as np
+from sheet_styles import BOLD_FONT, CENTER_ALIGNMENT, styled_cells, SHEET_NAME_TRANSLATION_TABLE
+
+# 行数较多且安装了 numba 时，各商品合计改用 JIT 编译的分组求和循环计算
+from grouped_sum import use_grouped_sum, grouped_sum
 
 # --- 配置区 ---
 pd.set_option('future.no_silent_downcasting', True)
@@ -33,6 +35,38 @@ DETAIL_SHEET_COLUMNS_TEMPLATE = [
     '发货时间', '物流单号', '物流公司'
 ]
 
+# 详情页中直接取自原始列的部分，键为原始列名，值为详情页列名。
+# '商品编号'需要额外清洗、'应结金额'按收入/支出取不同的列，均单独处理
+DETAIL_SHEET_SOURCE_COLUMNS_TM = {
+    TMALL_COL_MAIN_ORDER_ID: '订单编号',
+    TMALL_COL_SUB_ORDER_ID: '子订单编号',
+    TMALL_COL_ORDER_STATUS: '订单状态',
+    TMALL_COL_REFUND_STATUS: '退款状态',
+    TMALL_COL_MERCHANT_SKU: '商家编码',
+    TMALL_COL_PRODUCT_NAME: '商品名称',
+    TMALL_COL_PRODUCT_ATTRIBUTES: '商品属性',
+    TMALL_COL_UNIT_PRICE: '商品价格',
+    TMALL_COL_QUANTITY: '商品数量',
+    TMALL_COL_ORDER_CREATE_TIME: '订单创建时间',
+    TMALL_COL_ORDER_PAY_TIME: '订单付款时间',
+    TMALL_COL_SHIPPING_TIME: '发货时间',
+    TMALL_COL_LOGISTICS_NO: '物流单号',
+    TMALL_COL_LOGISTICS_COMPANY: '物流公司',
+}
+
+# 处理过程中会用到的全部原始列（含历史数据格式及'买家应付货款'替代列），
+# 主程序和独立测试读取文件时只保留这些列
+SOURCE_COLUMNS_TM = frozenset(DETAIL_SHEET_SOURCE_COLUMNS_TM) | {
+    TMALL_COL_PRODUCT_ID, TMALL_COL_ACTUAL_PAYMENT, TMALL_COL_REFUND_AMOUNT,
+    '买家应付货款', '标题', '价格', '买家实际支付金额'
+}
+
+# 参与计算的数值列及无法转换时的填充值；主程序读取CSV时这些列直接解析为数值
+NUMERIC_COLUMNS_TM = {
+    TMALL_COL_QUANTITY: 0, TMALL_COL_ACTUAL_PAYMENT: 0.0,
+    TMALL_COL_REFUND_AMOUNT: 0.0, TMALL_COL_UNIT_PRICE: 0.0
+}
+
 # --- 内部功能函数 ---
 
 def _prepare_and_validate_data(df):
@@ -53,11 +87,7 @@ def _prepare_and_validate_data(df):
             print(f"错误: 核心逻辑所需列 '{col}' 在文件中未找到。脚本无法继续。")
             return None
 
-    numeric_cols = {
-        TMALL_COL_QUANTITY: 0, TMALL_COL_ACTUAL_PAYMENT: 0.0,
-        TMALL_COL_REFUND_AMOUNT: 0.0, TMALL_COL_UNIT_PRICE: 0.0
-    }
-    for col, fill_value in numeric_cols.items():
+    for col, fill_value in NUMERIC_COLUMNS_TM.items():
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(fill_value)
         elif col == TMALL_COL_UNIT_PRICE:
@@ -80,42 +110,85 @@ def _aggregate_product_data(df_processed):
     """按商家编码聚合数据，计算各商品的收入、支出和明细。"""
     product_data_map = {}
     
-    successful_trades_df = df_processed[df_processed[TMALL_COL_ORDER_STATUS] == STATUS_TRADE_SUCCESS]
-    successful_trades_total = successful_trades_df[TMALL_COL_ACTUAL_PAYMENT].sum()
+    # 订单状态只有少数几种取值，转为分类类型后只需比较一次整数编码，
+    # 交易成功与非交易成功两个标记由同一次比较得出（空状态计为非交易成功）
+    is_success = (df_processed[TMALL_COL_ORDER_STATUS].astype('category') == STATUS_TRADE_SUCCESS).to_numpy()
+    is_not_success = ~is_success
+    successful_trades_total = df_processed.loc[is_success, TMALL_COL_ACTUAL_PAYMENT].sum()
 
-    for merchant_sku, group_df in df_processed.groupby(TMALL_COL_MERCHANT_SKU):
-        # 为总结页和Sheet页标题选择一个代表性的商品名称（通常是第一个）
-        product_name = group_df[TMALL_COL_PRODUCT_NAME].dropna().iloc[0] if not group_df[TMALL_COL_PRODUCT_NAME].dropna().empty else "未知商品"
-        income_df = group_df.copy()
-        expenditure_df = group_df[group_df[TMALL_COL_ORDER_STATUS] != STATUS_TRADE_SUCCESS].copy()
+    # 收入（所有订单）与支出（非交易成功订单）的数量和金额各用一次分组聚合算出，不再逐组求和；
+    # 支出结果按收入的分组重新对齐，没有支出的商品补0（保持原有整数/浮点类型）
+    # 商家编码转为分类类型作为分组键，字符串只哈希一次，两次分组都按整数编码进行
+    sku_keys = df_processed[TMALL_COL_MERCHANT_SKU].astype('category')
+    grouped = df_processed.groupby(sku_keys, observed=True)
+    if use_grouped_sum(len(df_processed)):
+        # 大文件：名称仍由 pandas 取每组第一个非空值，四项合计改由 numba 内核按分组编码累加。
+        # 分类的类别均来自数据本身，类别编码的顺序即分组结果的顺序
+        product_names = grouped[TMALL_COL_PRODUCT_NAME].first()
+        codes = sku_keys.cat.codes.to_numpy()
+        n_groups = len(sku_keys.cat.categories)
+        quantities = df_processed[TMALL_COL_QUANTITY].to_numpy()
+        refund_amounts = df_processed[TMALL_COL_REFUND_AMOUNT].to_numpy()
+        income_qty = grouped_sum(quantities, codes, n_groups)
+        income_amount = grouped_sum(df_processed[TMALL_COL_ACTUAL_PAYMENT].to_numpy(), codes, n_groups)
+        expenditure_qty = grouped_sum(quantities[is_not_success], codes[is_not_success], n_groups)
+        expenditure_amount = grouped_sum(refund_amounts[is_not_success], codes[is_not_success], n_groups)
+    else:
+        income_agg = grouped.agg(
+            name=(TMALL_COL_PRODUCT_NAME, 'first'), # 每组第一个非空值作为代表性名称
+            income_qty=(TMALL_COL_QUANTITY, 'sum'),
+            income_amount=(TMALL_COL_ACTUAL_PAYMENT, 'sum'),
+        )
+        expenditure_agg = df_processed[is_not_success].groupby(sku_keys[is_not_success], observed=True).agg(
+            expenditure_qty=(TMALL_COL_QUANTITY, 'sum'),
+            expenditure_amount=(TMALL_COL_REFUND_AMOUNT, 'sum'),
+        ).reindex(income_agg.index, fill_value=0)
+        product_names = income_agg['name']
+        income_qty = income_agg['income_qty'].to_numpy()
+        income_amount = income_agg['income_amount'].to_numpy()
+        expenditure_qty = expenditure_agg['expenditure_qty'].to_numpy()
+        expenditure_amount = expenditure_agg['expenditure_amount'].to_numpy()
+    # 明细页只需要各组的行位置，写表时再按位置切片，避免每个商品都保存两份子表
+    group_positions = grouped.indices
+
+    for i, (merchant_sku, product_name) in enumerate(product_names.items()):
+        if pd.isna(product_name):
+            product_name = "未知商品"
+        income_positions = group_positions[merchant_sku]
 
         product_data_map[str(merchant_sku)] = {
             'name': product_name, # 代表性名称
-            'income_qty': income_df[TMALL_COL_QUANTITY].sum(),
-            'income_amount': income_df[TMALL_COL_ACTUAL_PAYMENT].sum(),
-            'expenditure_qty': expenditure_df[TMALL_COL_QUANTITY].sum(),
-            'expenditure_amount': -expenditure_df[TMALL_COL_REFUND_AMOUNT].sum(),
-            'detail_income_df': income_df, # 包含所有真实订单信息的完整DataFrame
-            'detail_expenditure_df': expenditure_df
+            'income_qty': income_qty[i],
+            'income_amount': income_amount[i],
+            'expenditure_qty': expenditure_qty[i],
+            'expenditure_amount': -expenditure_amount[i],
+            'detail_income_positions': income_positions, # 所有真实订单在 df_processed 中的行位置
+            'detail_expenditure_positions': income_positions[is_not_success[income_positions]]
         }
     return product_data_map, successful_trades_total
 
 def _create_summary_sheet(wb, product_data_map, successful_trades_total):
     """在工作簿中创建并填充销售总结页，确保数字格式正确。"""
-    ws = wb.active
-    ws.title = "销售总结"
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    current_row = 1
+    # write_only 工作簿没有默认的活动Sheet页，总结页作为第一个Sheet页创建
+    ws = wb.create_sheet("销售总结")
+
+    # --- 列宽 ---
+    # write_only 模式下列宽必须在写入第一行之前设置
+    for col_letter, width in [('A', 35), ('B', 60), ('C', 20), ('D', 20)]:
+        ws.column_dimensions[col_letter].width = width
+
+    def append_number_row(values, font=None):
+        # 第3列为数量（整数格式），第4列为金额（两位小数），写入时直接设置数字格式
+        cells = styled_cells(ws, values, font)
+        if cells[2] is not None: cells[2].number_format = '#,##0'
+        if cells[3] is not None: cells[3].number_format = '#,##0.00'
+        ws.append(cells)
     
     header_col_name = "商家编码"
 
     # --- 收入汇总 ---
-    ws.cell(row=current_row, column=1, value="各商品收入汇总 (所有订单)").font = bold_font
-    current_row += 1
-    ws.append([header_col_name, "商品名称", "总销售数量", "总销售额(收入)"])
-    for cell in ws[current_row]: cell.font = bold_font; cell.alignment = center_align
-    current_row += 1
+    ws.append(styled_cells(ws, ["各商品收入汇总 (所有订单)"], BOLD_FONT))
+    ws.append(styled_cells(ws, [header_col_name, "商品名称", "总销售数量", "总销售额(收入)"], BOLD_FONT, CENTER_ALIGNMENT))
     
     grand_total_income_qty, grand_total_income_amt = 0, 0.0
     # 将 "未编码商品" 单独排序到最后
@@ -125,94 +198,74 @@ def _create_summary_sheet(wb, product_data_map, successful_trades_total):
     )
     for prod_id in sorted_ids:
         item = product_data_map[prod_id]
-        ws.append([prod_id, item['name'], item['income_qty'], item['income_amount']])
-        ws.cell(row=current_row, column=3).number_format = '#,##0'
-        ws.cell(row=current_row, column=4).number_format = '#,##0.00'
+        append_number_row([prod_id, item['name'], item['income_qty'], item['income_amount']])
         grand_total_income_qty += item['income_qty']
         grand_total_income_amt += item['income_amount']
-        current_row += 1
     
-    ws.append(["总计收入", "", grand_total_income_qty, grand_total_income_amt])
-    for cell in ws[current_row]: cell.font = bold_font
-    ws.cell(row=current_row, column=3).number_format = '#,##0'
-    ws.cell(row=current_row, column=4).number_format = '#,##0.00'
-    current_row += 2
+    append_number_row(["总计收入", "", grand_total_income_qty, grand_total_income_amt], BOLD_FONT)
+    ws.append([])
 
     # --- 支出汇总 ---
-    ws.cell(row=current_row, column=1, value="各商品支出汇总 (非交易成功订单)").font = bold_font
-    current_row += 1
-    ws.append([header_col_name, "商品名称", "未成功订单商品数量", "总退款额(支出)"])
-    for cell in ws[current_row]: cell.font = bold_font; cell.alignment = center_align
-    current_row += 1
+    ws.append(styled_cells(ws, ["各商品支出汇总 (非交易成功订单)"], BOLD_FONT))
+    ws.append(styled_cells(ws, [header_col_name, "商品名称", "未成功订单商品数量", "总退款额(支出)"], BOLD_FONT, CENTER_ALIGNMENT))
 
     grand_total_exp_qty, grand_total_exp_amt = 0, 0.0
     for prod_id in sorted_ids:
         item = product_data_map[prod_id]
         if item['expenditure_qty'] > 0 or item['expenditure_amount'] != 0:
-            ws.append([prod_id, item['name'], item['expenditure_qty'], item['expenditure_amount']])
-            ws.cell(row=current_row, column=3).number_format = '#,##0'
-            ws.cell(row=current_row, column=4).number_format = '#,##0.00'
+            append_number_row([prod_id, item['name'], item['expenditure_qty'], item['expenditure_amount']])
             grand_total_exp_qty += item['expenditure_qty']
             grand_total_exp_amt += item['expenditure_amount']
-            current_row += 1
 
-    ws.append(["总计支出", "", grand_total_exp_qty, grand_total_exp_amt])
-    for cell in ws[current_row]: cell.font = bold_font
-    ws.cell(row=current_row, column=3).number_format = '#,##0'
-    ws.cell(row=current_row, column=4).number_format = '#,##0.00'
-    current_row += 2
+    append_number_row(["总计支出", "", grand_total_exp_qty, grand_total_exp_amt], BOLD_FONT)
+    ws.append([])
 
     # --- 净总计与最终总额 ---
-    ws.cell(row=current_row, column=1, value="净总计").font = bold_font
-    cell_net_qty = ws.cell(row=current_row, column=3, value=grand_total_income_qty - grand_total_exp_qty)
-    cell_net_qty.font = bold_font; cell_net_qty.number_format = '#,##0'
-    cell_net_amt = ws.cell(row=current_row, column=4, value=grand_total_income_amt + grand_total_exp_amt)
-    cell_net_amt.font = bold_font; cell_net_amt.number_format = '#,##0.00'
-    current_row += 1
-    
-    ws.cell(row=current_row, column=1, value="买家实付款总额(交易成功订单)").font = bold_font
-    cell_success_amt = ws.cell(row=current_row, column=4, value=successful_trades_total)
-    cell_success_amt.font = bold_font; cell_success_amt.number_format = '#,##0.00'
-    
-    # --- 列宽 ---
-    for col_letter, width in [('A', 35), ('B', 60), ('C', 20), ('D', 20)]:
-        ws.column_dimensions[col_letter].width = width
+    append_number_row(
+        ["净总计", None, grand_total_income_qty - grand_total_exp_qty, grand_total_income_amt + grand_total_exp_amt], BOLD_FONT
+    )
+    append_number_row(["买家实付款总额(交易成功订单)", None, None, successful_trades_total], BOLD_FONT)
 
-def _create_detail_sheets(wb, product_data_map, detail_headers):
+def _detail_total_row(detail_headers, total_title, qty, amt):
+    """构造详情页分段的总计行：首列为标题，数量列和金额列为合计，其余为空字符串。"""
+    total_row = [''] * len(detail_headers)
+    total_row[0] = total_title
+    total_row[detail_headers.index('商品数量')] = qty
+    total_row[detail_headers.index('应结金额')] = amt
+    return total_row
+
+# 逐元素求 len(str(v))，结果为对象数组
+_STR_LEN_UFUNC = np.frompyfunc(lambda v: len(str(v)), 1, 1)
+
+def _text_lengths(values):
+    """返回与 values 形状相同的整数数组，每个元素为对应值转为文本后的长度。"""
+    return _STR_LEN_UFUNC(values).astype(np.int64)
+
+def _create_detail_sheets(wb, product_data_map, df_processed, detail_headers):
     """为每个商品创建并填充详情页，确保数字格式正确。"""
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-
-    def format_for_detail(df, amount_col, is_negative=False):
-        if df.empty: return pd.DataFrame(columns=detail_headers)
-        detail = pd.DataFrame()
-        # 逐行提取原始数据，确保每行信息的准确性
-        detail['订单编号'] = df.get(TMALL_COL_MAIN_ORDER_ID)
-        detail['子订单编号'] = df.get(TMALL_COL_SUB_ORDER_ID)
-        detail['订单状态'] = df.get(TMALL_COL_ORDER_STATUS)
-        detail['退款状态'] = df.get(TMALL_COL_REFUND_STATUS)
-        if '商品编号' in detail_headers:
-             detail['商品编号'] = df.get(TMALL_COL_PRODUCT_ID).astype(str).replace('nan', '')
-        detail['商家编码'] = df.get(TMALL_COL_MERCHANT_SKU)
-        # 关键点：直接从原始DataFrame的列获取，保证了每行都是真实的商品标题
-        detail['商品名称'] = df.get(TMALL_COL_PRODUCT_NAME)
-        detail['商品属性'] = df.get(TMALL_COL_PRODUCT_ATTRIBUTES)
-        detail['商品价格'] = df.get(TMALL_COL_UNIT_PRICE)
-        detail['商品数量'] = df.get(TMALL_COL_QUANTITY)
-        amounts = df.get(amount_col, 0.0)
-        detail['应结金额'] = -amounts if is_negative else amounts
-        detail['订单创建时间'] = df.get(TMALL_COL_ORDER_CREATE_TIME)
-        detail['订单付款时间'] = df.get(TMALL_COL_ORDER_PAY_TIME)
-        detail['发货时间'] = df.get(TMALL_COL_SHIPPING_TIME)
-        detail['物流单号'] = df.get(TMALL_COL_LOGISTICS_NO)
-        detail['物流公司'] = df.get(TMALL_COL_LOGISTICS_COMPANY)
-        return detail.reindex(columns=detail_headers).fillna('')
+
+    # 在 df_processed 上一次性完成列投影、重命名和空值填充，各商品分段只按行位置切片，
+    # 不再每个分段各构造一次明细表再 reindex + fillna
+    detail_view = df_processed.reindex(columns=list(DETAIL_SHEET_SOURCE_COLUMNS_TM)).rename(columns=DETAIL_SHEET_SOURCE_COLUMNS_TM)
+    if '商品编号' in detail_headers:
+        detail_view['商品编号'] = df_processed[TMALL_COL_PRODUCT_ID].astype(str).replace('nan', '')
+    # 收入分段的应结金额为买家实付金额，支出分段写入时再替换为负的退款金额
+    detail_view['应结金额'] = df_processed[TMALL_COL_ACTUAL_PAYMENT]
+    detail_values = detail_view.reindex(columns=detail_headers).fillna('').to_numpy(dtype=object)
+    negative_refund_amounts = -df_processed[TMALL_COL_REFUND_AMOUNT].to_numpy()
+    # 列宽所需的各单元格文本长度也在整表上一次性算好（支出分段的应结金额单独算），
+    # 各商品只按行位置取各列最大值。逐个单元格求 str() 的长度，不先转成定长的 numpy 字符串数组，
+    # 否则整表每个单元格都按最长的那个单元格分配空间
+    detail_value_lengths = _text_lengths(detail_values)
+    refund_amount_lengths = _text_lengths(negative_refund_amounts)
 
     sorted_ids = sorted(
         product_data_map.keys(),
         key=lambda x: (x == "未编码商品", x)
     )
     
+    # 已使用的Sheet页名称，用集合做O(1)的重名判断
+    used_sheet_names = set(wb.sheetnames)
     qty_col_idx = detail_headers.index('商品数量')
     amt_col_idx = detail_headers.index('应结金额')
 
@@ -220,58 +273,85 @@ def _create_detail_sheets(wb, product_data_map, detail_headers):
         item = product_data_map[prod_id]
         
         sheet_name_raw = f"{prod_id}_{item['name']}"
-        base_name = re.sub(r'[\\/\*\[\]\:?]', '_', sheet_name_raw)
+        base_name = sheet_name_raw.translate(SHEET_NAME_TRANSLATION_TABLE)
         
         sheet_name = base_name[:31]
         counter = 1
-        while sheet_name in wb.sheetnames:
+        while sheet_name in used_sheet_names:
             counter += 1
             suffix = f"({counter})"
             truncated_base = base_name[:31-len(suffix)]
             sheet_name = f"{truncated_base}{suffix}"
         
+        # write_only 模式不能回头读取已写入的单元格，因此先准备好各分段的明细行和总计行，
+        # 据此算出列宽并在写入第一行之前设置，再依次追加。
+        # 每个分段为 (明细行, 总计行, 分段后是否空一行)，收入分段之后空一行
+        sections = []
+        # 各列文本的最大长度，从表头开始，逐个分段用整表预先算好的长度取最大值
+        max_lens = np.array([len(str(h)) for h in detail_headers])
+        income_positions = item['detail_income_positions']
+        if len(income_positions) > 0:
+            income_rows = detail_values[income_positions].tolist()
+            sections.append((income_rows, _detail_total_row(detail_headers, "收入总计", item['income_qty'], item['income_amount']), True))
+            max_lens = np.maximum(max_lens, detail_value_lengths[income_positions].max(axis=0))
+
+        expenditure_positions = item['detail_expenditure_positions']
+        if len(expenditure_positions) > 0:
+            expenditure_rows = detail_values[expenditure_positions]
+            expenditure_rows[:, amt_col_idx] = negative_refund_amounts[expenditure_positions]
+            sections.append((expenditure_rows.tolist(), _detail_total_row(detail_headers, "支出总计", item['expenditure_qty'], item['expenditure_amount']), False))
+            expenditure_lengths = detail_value_lengths[expenditure_positions]
+            expenditure_lengths[:, amt_col_idx] = refund_amount_lengths[expenditure_positions]
+            max_lens = np.maximum(max_lens, expenditure_lengths.max(axis=0))
+
+        for _, total_row, _ in sections:
+            max_lens = np.maximum(max_lens, [len(str(v)) for v in total_row])
+
         ws = wb.create_sheet(sheet_name)
-        ws.append(detail_headers)
-        for cell in ws[1]: cell.font = bold_font; cell.alignment = center_align
-        
-        income_detail_df = format_for_detail(item['detail_income_df'], TMALL_COL_ACTUAL_PAYMENT)
-        for r in income_detail_df.itertuples(index=False): ws.append(list(r))
-        
-        if not income_detail_df.empty:
-            total_row = [''] * len(detail_headers)
-            total_row[0] = "收入总计"
-            total_row[qty_col_idx] = item['income_qty']
-            total_row[amt_col_idx] = item['income_amount']
-            ws.append(total_row)
-
-            row_idx = ws.max_row
-            for cell in ws[row_idx]: cell.font = bold_font
-            ws.cell(row=row_idx, column=qty_col_idx + 1).number_format = '#,##0'
-            ws.cell(row=row_idx, column=amt_col_idx + 1).number_format = '#,##0.00'
-            ws.append([])
-
-        exp_detail_df = format_for_detail(item['detail_expenditure_df'], TMALL_COL_REFUND_AMOUNT, True)
-        if not exp_detail_df.empty:
-            for r in exp_detail_df.itertuples(index=False): ws.append(list(r))
-            
-            total_row = [''] * len(detail_headers)
-            total_row[0] = "支出总计"
-            total_row[qty_col_idx] = item['expenditure_qty']
-            total_row[amt_col_idx] = item['expenditure_amount']
-            ws.append(total_row)
-
-            row_idx = ws.max_row
-            for cell in ws[row_idx]: cell.font = bold_font
-            ws.cell(row=row_idx, column=qty_col_idx + 1).number_format = '#,##0'
-            ws.cell(row=row_idx, column=amt_col_idx + 1).number_format = '#,##0.00'
-
-        for i, col_title in enumerate(detail_headers, 1):
-            max_len = max((len(str(c.value)) for c in ws[get_column_letter(i)] if c.value is not None), default=0)
+        used_sheet_names.add(sheet_name)
+
+        for i, col_title in enumerate(detail_headers):
+            max_len = int(max_lens[i])
             adjusted_width = min(max(max_len + 5, len(col_title) + 5, 12), 60)
             if col_title == "商品名称": adjusted_width = 70
             elif col_title == "商品属性": adjusted_width = 40
             elif col_title == "商家编码": adjusted_width = 30
-            ws.column_dimensions[get_column_letter(i)].width = adjusted_width
+            ws.column_dimensions[get_column_letter(i + 1)].width = adjusted_width
+
+        ws.append(styled_cells(ws, detail_headers, BOLD_FONT, CENTER_ALIGNMENT))
+        for rows, total_row, blank_after in sections:
+            for row in rows: ws.append(row)
+            total_cells = styled_cells(ws, total_row, BOLD_FONT)
+            total_cells[qty_col_idx].number_format = '#,##0'
+            total_cells[amt_col_idx].number_format = '#,##0.00'
+            ws.append(total_cells)
+            if blank_after: ws.append([])
+
+def _excel_cell_text(value):
+    """将 openpyxl 读出的单元格值转为与 pd.read_excel(dtype=str, keep_default_na=False) 相同的文本。"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _read_excel_source_columns(file_path):
+    """
+    以只读模式流式读取xlsx活动Sheet，只保留 SOURCE_COLUMNS_TM 中的列，其余列不解析为 DataFrame。
+    返回的各列均为文本，与 pd.read_excel(dtype=str, keep_default_na=False) 的结果一致。
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        keep = [(i, str(h).strip()) for i, h in enumerate(header) if h is not None and str(h).strip() in SOURCE_COLUMNS_TM]
+        data = {name: [] for _, name in keep}
+        for row in rows:
+            for i, name in keep:
+                data[name].append(_excel_cell_text(row[i] if i < len(row) else None))
+    finally:
+        wb.close()
+    return pd.DataFrame(data)
 
 # --- 主处理函数 ---
 
@@ -281,7 +361,9 @@ def process_tmall_data(df_raw):
         print("天猫处理错误：输入的DataFrame为空。")
         return None
     
-    df_normalized = df_raw.copy()
+    # 浅拷贝即可：后续的改名和整列赋值只替换拷贝上的列，不会改动调用方的数据，
+    # 真正的数据复制留给 _prepare_and_validate_data 中过滤后的那一次
+    df_normalized = df_raw.copy(deep=False)
     
     # 历史数据CSV文件使用'商家编码'，但部分列名不同
     if '商家编码' in df_normalized.columns and TMALL_COL_PRODUCT_ID not in df_normalized.columns:
@@ -302,13 +384,12 @@ def process_tmall_data(df_raw):
         
     product_data_map, successful_trades_total = _aggregate_product_data(df_processed)
     
-    wb = Workbook()
+    # 使用 write_only 模式，单元格在追加时即序列化，不在内存中保留整个工作簿。
+    # 总结页最先创建，因此始终是第一个Sheet页。
+    wb = Workbook(write_only=True)
     _create_summary_sheet(wb, product_data_map, successful_trades_total)
     # 传递动态生成的表头
-    _create_detail_sheets(wb, product_data_map, detail_headers)
-    
-    if "销售总结" in wb.sheetnames and wb.sheetnames[0] != "销售总结":
-        wb.move_sheet("销售总结", -len(wb.sheetnames) + 1)
+    _create_detail_sheets(wb, product_data_map, df_processed, detail_headers)
         
     return wb
 
@@ -329,14 +410,14 @@ if __name__ == "__main__":
             if TEST_FILENAME.lower().endswith('.csv'):
                 df_test_raw = pd.read_csv(input_file, dtype=str, keep_default_na=False, encoding='utf-8-sig')
             else:
-                df_test_raw = pd.read_excel(input_file, dtype=str, engine='openpyxl', keep_default_na=False)
-
-            df_test_raw.columns = [col.strip().replace('"', '') for col in df_test_raw.columns]
-            for col in df_test_raw.columns:
-                if df_test_raw[col].dtype == 'object':
-                    df_test_raw[col] = df_test_raw[col].astype(str).str.strip().replace(
-                        ['-', '--', '', 'None', 'nan', '#NULL!', 'null', '\t'], np.nan, regex=False
-                    )
+                df_test_raw = _read_excel_source_columns(input_file)
+
+            df_test_raw.columns = df_test_raw.columns.str.strip().str.replace('"', '', regex=False)
+            # 对象类型的列只筛选一次，不再逐列取出再判断类型
+            for col in df_test_raw.columns[df_test_raw.dtypes == 'object']:
+                df_test_raw[col] = df_test_raw[col].str.strip().replace(
+                    ['-', '--', '', 'None', 'nan', '#NULL!', 'null', '\t'], np.nan, regex=False
+                )
         except Exception as e:
             print(f"测试中读取文件失败: {e}")
             df_test_raw = None
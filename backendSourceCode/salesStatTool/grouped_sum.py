@@ -0,0 +1,37 @@
+import numpy as np
+
+# 可选依赖：numba。安装后，行数达到 NUMBA_MIN_ROWS 的大文件改用 JIT 编译的分组求和循环
+# 计算各分组合计，未安装或数据量较小时（避免JIT编译开销）由各处理工具使用 pandas 分组聚合。
+# 天猫和拼多多的处理工具共用这里的内核与判断条件。
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# 启用 numba 分组求和的最小行数
+NUMBA_MIN_ROWS = 100_000
+
+if njit is not None:
+    @njit(cache=True)
+    def _grouped_sum_kernel(values, codes, out, compensation):
+        """按分组编码逐行累加，采用与 pandas 分组求和相同的补偿求和，结果逐位一致；空值跳过。"""
+        for i in range(values.shape[0]):
+            val = values[i]
+            if val != val:
+                continue
+            code = codes[i]
+            y = val - compensation[code]
+            t = out[code] + y
+            c = t - out[code] - y
+            compensation[code] = c if c == c else 0
+            out[code] = t
+
+def use_grouped_sum(n_rows):
+    """判断 n_rows 行的数据是否改用 numba 内核分组求和（已安装 numba 且行数达到 NUMBA_MIN_ROWS）。"""
+    return njit is not None and n_rows >= NUMBA_MIN_ROWS
+
+def grouped_sum(values, codes, n_groups):
+    """用 numba 内核按分组编码求和，返回长度为 n_groups 的数组，类型与 values 相同。"""
+    out = np.zeros(n_groups, dtype=values.dtype)
+    _grouped_sum_kernel(values, codes, out, np.zeros(n_groups, dtype=values.dtype))
+    return out
@@ -1,107 +1,165 @@
-import pandas as pd
+import csv
 import os
+from openpyxl import load_workbook
 
 # --- 平台指纹定义 ---
 # 定义每个平台独有的、稳定存在的列名集合作为“指纹”
 
 PLATFORM_FINGERPRINTS = {
-    "TM_RECENT": {  # 天猫/淘宝 (三个月内 .xlsx)
+    "TM_RECENT": frozenset({  # 天猫/淘宝 (三个月内 .xlsx)
         '子订单编号',
         '主订单编号',
         '商品标题',
         '买家实付金额',
         '退款金额',
         '商品ID'
-    },
-    "TM_HISTORY": { # 天猫/淘宝 (历史数据 .csv)
+    }),
+    "TM_HISTORY": frozenset({ # 天猫/淘宝 (历史数据 .csv)
         '主订单编号',
         '子订单编号',
         '标题',
         '商家编码',
         '退款金额',
         '订单状态'
-    },
-    "JD": {  # 京东
+    }),
+    "JD": frozenset({  # 京东
         '订单编号',
         '订单下单时间',
         '费用名称',
         '应结金额',
         '收支方向',
         '结算状态'
-    },
-    "PDD": { # 拼多多
+    }),
+    "PDD": frozenset({ # 拼多多
         '商品',
         '订单号',
         '商品总价(元)',
         '商家实收金额(元)',
         '商品id',
         '售后状态'
-    },
-    "DY": {  # 抖店
+    }),
+    "DY": frozenset({  # 抖店
         '主订单编号',
         '选购商品',
         '商品金额',
         '订单提交时间',
         '订单完成时间',
         '售后状态'
-    }
+    })
 }
 
+# 每个平台指纹中的一个区分列（只出现在该平台的指纹里），识别时先做一次O(1)的成员判断，
+# 区分列不在表头中的平台直接跳过，不再做完整的子集比对
+PLATFORM_DISCRIMINATORS = {
+    "TM_RECENT": '商品标题',
+    "TM_HISTORY": '标题',
+    "JD": '费用名称',
+    "PDD": '商品id',
+    "DY": '选购商品'
+}
+
+# --- 内部功能函数 ---
+
+def _read_csv_header(file_path):
+    """
+    只读取CSV文件的第一行非空文本并解析为列名列表，同时返回据此判断出的文件编码。
+    返回 (列名列表, 编码)：有BOM或表头含可按UTF-8解码的非ASCII字符时编码为 'utf-8-sig'，
+    需回退到GBK解码时为 'gbk'；表头全是ASCII字符、无法判断时编码为 None。
+    文件中没有内容时返回 (None, None)。
+    """
+    with open(file_path, 'rb') as f:
+        for raw_line in f:
+            if raw_line.strip():
+                break
+        else:
+            return None, None
+
+    # 去掉UTF-8的BOM，优先按UTF-8解码，失败则回退到GBK
+    encoding = None
+    if raw_line.startswith(b'\xef\xbb\xbf'):
+        raw_line = raw_line[3:]
+        encoding = 'utf-8-sig'
+    try:
+        line = raw_line.decode('utf-8')
+        if encoding is None and not line.isascii():
+            encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        print(f"  -> UTF-8解码失败，尝试使用GBK编码读取表头...")
+        line = raw_line.decode('gbk')
+        encoding = 'gbk'
+    return next(csv.reader([line]), []), encoding
+
+def _read_excel_header(file_path):
+    """以只读模式打开工作簿，只读取活动Sheet的第一行作为列名列表。"""
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    return list(header)
+
 # --- 核心识别函数 ---
 
-def identify_platform(file_path):
+def identify_platform_with_encoding(file_path):
     """
-    通过读取文件表头并与预定义的指纹比对，来识别文件所属的电商平台。
+    识别文件所属的电商平台，同时返回读取表头时判断出的CSV文件编码，
+    供后续完整读取文件时直接使用，不必再检测一次编码。
 
     Args:
         file_path (str): 需要识别的文件的完整路径 (.csv, .xls, .xlsx)。
 
     Returns:
-        str: 代表平台的字符串 (e.g., "TM_RECENT", "JD", "TM_HISTORY")。
-             如果无法识别或文件有问题，则返回 None。
+        tuple: (平台标识符, 编码)。平台无法识别或文件有问题时平台标识符为 None；
+               Excel文件或无法从表头判断编码时编码为 None。
     """
     if not os.path.exists(file_path):
         print(f"识别错误: 文件不存在 -> {file_path}")
-        return None
+        return None, None
 
+    encoding = None
     try:
-        # 根据文件扩展名选择合适的读取方式，只读取表头 (nrows=0)
+        # 根据文件扩展名选择合适的读取方式，只读取表头这一行，不启动 pandas 的完整解析
         file_ext = os.path.splitext(file_path)[1].lower()
         
-        df_header = None
         if file_ext == '.csv':
-            try:
-                # 优先尝试用 utf-8-sig 读取，它能处理带BOM的CSV
-                df_header = pd.read_csv(file_path, nrows=0, encoding='utf-8-sig', keep_default_na=False)
-            except UnicodeDecodeError:
-                # 如果UTF-8解码失败，则回退到GBK编码再次尝试
-                print(f"  -> UTF-8解码失败，尝试使用GBK编码读取表头...")
-                df_header = pd.read_csv(file_path, nrows=0, encoding='gbk', keep_default_na=False)
-
+            header, encoding = _read_csv_header(file_path)
+            if header is None:
+                print(f"识别警告: 文件为空 -> {os.path.basename(file_path)}")
+                return None, None
         elif file_ext in ['.xlsx', '.xls']:
-            df_header = pd.read_excel(file_path, nrows=0, engine='openpyxl')
+            header = _read_excel_header(file_path)
         else:
             print(f"识别警告: 不支持的文件类型 -> {os.path.basename(file_path)}")
-            return None
+            return None, None
             
-        # 清理列名中的空格和潜在的引号
-        header_columns = {col.strip().replace('"', '') for col in df_header.columns}
+        # 清理列名中的空格和潜在的引号，跳过空的表头单元格
+        header_columns = {str(col).strip().replace('"', '') for col in header if col is not None}
 
         # 逐一比对指纹
         for platform, fingerprint in PLATFORM_FINGERPRINTS.items():
-            # issubset() 检查指纹中的所有列名是否都存在于文件的表头中
-            if fingerprint.issubset(header_columns):
-                return platform
+            # 先看区分列是否存在，再用 issubset() 检查指纹中的所有列名是否都存在于文件的表头中
+            if PLATFORM_DISCRIMINATORS[platform] in header_columns and fingerprint.issubset(header_columns):
+                return platform, encoding
         
         # 如果所有指纹都未匹配
-        return None
+        return None, encoding
 
-    except pd.errors.EmptyDataError:
-        print(f"识别警告: 文件为空 -> {os.path.basename(file_path)}")
-        return None
     except Exception as e:
         print(f"识别错误: 读取文件 '{os.path.basename(file_path)}' 表头时发生错误: {e}")
-        return None
+        return None, None
+
+def identify_platform(file_path):
+    """
+    通过读取文件表头并与预定义的指纹比对，来识别文件所属的电商平台。
+
+    Args:
+        file_path (str): 需要识别的文件的完整路径 (.csv, .xls, .xlsx)。
+
+    Returns:
+        str: 代表平台的字符串 (e.g., "TM_RECENT", "JD", "TM_HISTORY")。
+             如果无法识别或文件有问题，则返回 None。
+    """
+    return identify_platform_with_encoding(file_path)[0]
 
 # ---- 主程序入口 (用于独立测试) ----
 if __name__ == "__main__":
@@ -6,6 +6,29 @@ import numpy as np
 from datetime import datetime
 import io
 import traceback
+import contextlib
+import heapq
+import itertools
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import csv
+import codecs
+
+# 可选依赖：pyarrow。安装后CSV文件改用其多线程解析器读取，未安装时使用pandas默认的C解析器。
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+# 可选依赖：python-calamine。安装后Excel文件改用 pandas 的 calamine 引擎（Rust实现）读取，
+# 也能直接读取旧版 .xls 文件；未安装时使用 openpyxl 引擎。
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
 
 #解决前后端通信时的编码问题。
 sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
@@ -38,34 +61,173 @@ PROCESSOR_MAP = {
     "DY": DYProcess.process_douyin_data,        # 抖店
 }
 
+# 读取数据后统一视为空值的占位字符串
+NULL_VALUE_MAP = dict.fromkeys(['-', '--', '', 'None', 'nan', '#NULL!', 'null', '\t'], np.nan)
+
+# 判断CSV编码时读取的文件开头字节数
+ENCODING_SNIFF_BYTES = 4096
+
+# 可以直接内存映射解析、无需转码的CSV编码
+UTF8_ENCODINGS = frozenset({'utf-8', 'utf-8-sig'})
+
+# 按Excel方式读取的文件扩展名
+EXCEL_EXTENSIONS = frozenset({'.xlsx', '.xls'})
+
+# 输出文件名前缀，未列出的平台使用 "{平台标识符}_output_"
+OUTPUT_FILENAME_PREFIXES = {
+    "TM_RECENT": "TM_recent_output_",
+    "TM_HISTORY": "TM_history_output_",
+}
+
+# 使用 xlsxwriter 写出报表时传给各平台处理工具的参数。
+# 这些处理工具返回的报表对象在 save() 时以 constant_memory 模式逐行写出，内存占用不随行数增长；
+# 未列出的平台仍使用 openpyxl 的 write_only 模式
+XLSXWRITER_PROCESSOR_OPTIONS = {
+    "JD": {'backend': 'xlsxwriter'},
+}
+
+# 各平台处理工具用到的原始列。读取文件时只解析这些列，其余列不进入DataFrame；
+# 未列出的平台读取全部列
+SOURCE_COLUMNS_MAP = {
+    "TM_RECENT": TMProcess.SOURCE_COLUMNS_TM,
+    "TM_HISTORY": TMProcess.SOURCE_COLUMNS_TM,
+    "JD": JDProcess.SOURCE_COLUMNS_JD,
+    "PDD": PDDProcess.SOURCE_COLUMNS_PDD,
+    "DY": DYProcess.SOURCE_COLUMNS_DY,
+}
+
+# 各平台参与计算的数值列（清洗后的列名），读取CSV时交给解析器直接转为数值
+NUMERIC_COLUMNS_MAP = {
+    "TM_RECENT": TMProcess.NUMERIC_COLUMNS_TM,
+    "TM_HISTORY": TMProcess.NUMERIC_COLUMNS_TM,
+    "JD": JDProcess.NUMERIC_COLUMNS_JD,
+    "PDD": PDDProcess.NUMERIC_COLUMNS_PDD,
+    "DY": DYProcess.NUMERIC_COLUMNS_DY,
+}
+
 # --- 协议与通信函数 ---
-def send_status_update(file_path, status, message=""):
+def send_status_update(file_path, status, message="", flush=True):
     """
     向标准输出发送格式化的状态更新信息，供前端GUI解析。
+    flush 为 False 时只写入缓冲区，由调用方在一批输出结束后统一刷新。
     """
-    # 打印格式化的字符串，并立即刷新缓冲区，确保前端能实时收到。
-    print(f"##STATUS##|{file_path}|{status}|{message}", flush=True)
+    # 打印格式化的字符串，默认立即刷新缓冲区，确保前端能实时收到。
+    print(f"##STATUS##|{file_path}|{status}|{message}", flush=flush)
+
+def _read_input_paths():
+    """
+    逐行读取标准输入中的文件路径（跳过空行）。
+    处理一个文件期间的日志和状态行只写入缓冲区，每次读取下一行之前统一刷新一次，
+    同一文件的多行输出合并为一次写入；读取可能阻塞等待前端，刷新在阻塞之前完成，前端不会漏收状态。
+    """
+    while True:
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            return
+        file_path = line.strip()
+        if file_path:
+            yield file_path
 
 # --- 文件处理辅助函数 ---
-def get_safe_output_path(output_dir, input_filename, platform, on_conflict_policy):
+def sniff_encoding(file_path, sample_size=ENCODING_SNIFF_BYTES):
     """
-    根据文件冲突策略，计算一个安全的输出文件路径。
+    读取文件开头的一段字节判断CSV文件的编码：有BOM时按BOM确定；
+    否则能按UTF-8解码的视为UTF-8（用 utf-8-sig 读取），不能的视为GBK。
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(sample_size)
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # 增量解码，末尾被截断的多字节字符不算解码失败
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+def _clean_column_name(name):
+    """按读取后统一清洗列名的规则（去除前后空格和引号）处理单个列名。"""
+    return str(name).strip().replace('"', '')
+
+def _make_column_filter(usecols):
+    """
+    根据需要保留的列名集合生成 pandas 的 usecols 过滤函数；usecols 为None时返回None（读取全部列）。
+    原始列名先按清洗规则处理再比对，表头中带空格或引号的列名同样能匹配。
+    """
+    if usecols is None:
+        return None
+    return lambda name: _clean_column_name(name) in usecols
+
+def _read_csv_as_text(file_path, encoding, usecols=None, numeric_columns=()):
+    """
+    将CSV文件的所有列按文本读取为DataFrame，结果与 pd.read_csv(dtype=str, keep_default_na=False) 一致。
+    安装了 pyarrow 时使用其多线程解析器，除 numeric_columns 外的列都显式指定为字符串类型，
+    不做数值类型推断，避免 '441.70'、长订单号之类的文本被改写；
+    numeric_columns 中的列由 pyarrow 推断类型，能整列解析为数值时直接得到数值列，
+    处理工具随后的 pd.to_numeric 不必再逐个解析字符串；含其他文本的列仍推断为字符串，由处理工具照常转换。
+    表头为空或有重名列（pandas 会重命名为 'Unnamed: 0'、'列.1'），
+    或 pyarrow 无法解析（如各行列数不一致）时，回退到pandas的C解析器。
+    UTF-8文件通过内存映射读取，解析器直接读取文件映射的内存，省去一次整文件拷贝；
+    其他编码需要先转码，仍按普通方式读取。
+    usecols 为需要保留的列名集合，只解析这些列；为None时读取全部列。
+    编码错误时抛出 UnicodeDecodeError，由调用方切换编码重试。
+    """
+    is_utf8 = encoding in UTF8_ENCODINGS
+    column_filter = _make_column_filter(usecols)
+    if pa_csv is not None:
+        with open(file_path, encoding=encoding, newline='') as f:
+            header = next(csv.reader(f), [])
+        selected_columns = header if column_filter is None else [col for col in header if column_filter(col)]
+        # 没有需要的列时交给pandas，返回同样的空表（pyarrow 的空列清单表示读取全部列）
+        if selected_columns and all(header) and len(set(header)) == len(header):
+            # pyarrow 原生支持UTF-8（并会跳过BOM），指定为 'utf8' 时不经过Python转码
+            read_options = pa_csv.ReadOptions(encoding='utf8' if is_utf8 else encoding)
+            parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+            text_columns = [col for col in selected_columns if _clean_column_name(col) not in numeric_columns]
+            # 空值标记只作用于推断类型的数值列，文本列不受影响（strings_can_be_null 默认为False）
+            convert_options = pa_csv.ConvertOptions(
+                include_columns=selected_columns, column_types=dict.fromkeys(text_columns, pa.string()),
+                null_values=list(NULL_VALUE_MAP),
+            )
+            try:
+                if is_utf8:
+                    with pa.memory_map(file_path) as source:
+                        table = pa_csv.read_csv(source, read_options=read_options,
+                                                parse_options=parse_options, convert_options=convert_options)
+                else:
+                    table = pa_csv.read_csv(file_path, read_options=read_options,
+                                            parse_options=parse_options, convert_options=convert_options)
+                return table.to_pandas()
+            except pa.ArrowInvalid:
+                # 包括UTF-8文件中出现非法字节、数值列后部出现无法解析的文本等情况，
+                # 交给pandas按文本重读（编码错误时由其抛出 UnicodeDecodeError）
+                pass
+    return pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding=encoding, memory_map=is_utf8,
+                       usecols=column_filter)
+
+def compute_output_filename(input_filename, platform):
+    """
+    根据输入文件名和平台标识符生成输出文件名（不含目录，未处理冲突）。
     """
     # 从输入文件名中分离出基础名和扩展名
     base_name_no_ext = os.path.splitext(input_filename)[0]
     
     # 根据平台标识符构建不同的输出文件名，以区分结果
-    if platform == "TM_RECENT":
-        output_filename = f"TM_recent_output_{base_name_no_ext}.xlsx"
-    elif platform == "TM_HISTORY":
-        output_filename = f"TM_history_output_{base_name_no_ext}.xlsx"
-    else:
-        output_filename = f"{platform}_output_{base_name_no_ext}.xlsx"
-        
+    prefix = OUTPUT_FILENAME_PREFIXES.get(platform, f"{platform}_output_")
+    return f"{prefix}{base_name_no_ext}.xlsx"
+
+def resolve_output_conflict(output_dir, output_filename, on_conflict_policy, reserved_paths=()):
+    """
+    根据文件冲突策略，计算一个安全的输出文件路径；返回None表示按策略跳过。
+    reserved_paths 中的路径（已分配给同批其他文件、尚未写出）视同已存在的文件。
+    """
     # 组合成完整路径
     output_path = os.path.join(output_dir, output_filename)
     
-    if not os.path.exists(output_path):
+    if not os.path.exists(output_path) and output_path not in reserved_paths:
         return output_path
 
     # 根据冲突策略进行处理
@@ -76,45 +238,63 @@ def get_safe_output_path(output_dir, input_filename, platform, on_conflict_polic
         return output_path # 直接返回原路径，后续操作会覆盖
 
     if on_conflict_policy == 'rename':
-        # 循环尝试在文件名后添加序号 (1), (2), ... 直到找到一个不冲突的名称
+        # 循环尝试在文件名后添加序号 (1), (2), ... 直到找到一个不冲突的名称。
+        # 已有大量同名文件时，逐个 os.path.exists 要做很多次系统调用，
+        # 这里只列一次目录，在文件名集合中判断；normcase 使判断与所在系统的大小写规则一致
+        existing_names = {os.path.normcase(entry) for entry in os.listdir(output_dir)}
         name, ext = os.path.splitext(output_filename)
         counter = 1
         while True:
             new_filename = f"{name} ({counter}){ext}"
             new_path = os.path.join(output_dir, new_filename)
-            if not os.path.exists(new_path):
+            if os.path.normcase(new_filename) not in existing_names and new_path not in reserved_paths:
                 return new_path
             counter += 1
     
     return None
 
-def read_dataframe_from_file(file_path):
+def read_dataframe_from_file(file_path, usecols=None, encoding=None, numeric_columns=()):
     """
     根据文件扩展名，从文件读取数据到Pandas DataFrame，并进行基础清洗。
+    usecols 为需要保留的列名（清洗后的列名）集合，为None时读取全部列。
+    encoding 为识别平台时已判断出的CSV编码，为None时读取前先检测编码。
+    numeric_columns 为CSV中可直接解析为数值的列名（清洗后的列名），Excel文件仍全部按文本读取。
     """
     file_ext = os.path.splitext(file_path)[1].lower()
     df = None
     try:
         # 根据扩展名选择不同的读取方式
         if file_ext == '.csv':
+            # 先根据文件开头判断编码，GBK文件不必先按UTF-8完整解析一遍再失败重读
+            if encoding is None:
+                encoding = sniff_encoding(file_path)
+            if encoding == 'gbk':
+                print(f"  -> {os.path.basename(file_path)}: 检测为GBK编码...", flush=True)
             try:
-                # 优先尝试utf-8-sig
-                df = pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+                df = _read_csv_as_text(file_path, encoding, usecols, numeric_columns)
             except UnicodeDecodeError:
-                # 如果失败，回退到GBK编码
+                if encoding != 'utf-8-sig':
+                    raise
+                # 开头部分是合法的UTF-8、后面却出现了无法解码的字节，回退到GBK编码
                 print(f"  -> {os.path.basename(file_path)}: UTF-8解码失败，尝试GBK编码...", flush=True)
-                df = pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding='gbk')
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path, dtype=str, engine='openpyxl', keep_default_na=False)
+                df = _read_csv_as_text(file_path, 'gbk', usecols, numeric_columns)
+        elif file_ext in EXCEL_EXTENSIONS:
+            column_filter = _make_column_filter(usecols)
+            if python_calamine is not None:
+                try:
+                    df = pd.read_excel(file_path, dtype=str, engine='calamine', keep_default_na=False, usecols=column_filter)
+                except Exception as e:
+                    # calamine 无法解析的个别文件，再交给 openpyxl 读取
+                    print(f"  -> {os.path.basename(file_path)}: calamine 读取失败({e})，改用 openpyxl 读取...", flush=True)
+            if df is None:
+                df = pd.read_excel(file_path, dtype=str, engine='openpyxl', keep_default_na=False, usecols=column_filter)
         
         if df is not None:
             # 对读取到的数据进行统一的基础清洗
-            df.columns = [col.strip().replace('"', '') for col in df.columns]
-            for col in df.columns:
-                if df[col].dtype == 'object':
-                    df[col] = df[col].astype(str).str.strip().replace(
-                        ['-', '--', '', 'None', 'nan', '#NULL!', 'null', '\t'], np.nan, regex=False
-                    )
+            df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
+            obj_cols = df.columns[df.dtypes == 'object']
+            if len(obj_cols) > 0:
+                df[obj_cols] = df[obj_cols].apply(lambda s: s.str.strip()).replace(NULL_VALUE_MAP)
             return df
 
     except Exception as e:
@@ -123,25 +303,94 @@ def read_dataframe_from_file(file_path):
 
     return df
 
+# --- 单文件处理（在工作进程中执行） ---
+def _process_file(file_path, platform, output_path, processor_options, encoding):
+    """
+    读取、处理并保存单个文件，返回 (状态码, 状态说明)。
+    processor_options 为传给处理工具的额外关键字参数，encoding 为识别平台时判断出的CSV编码（可为None）。
+    状态码与 send_status_update 中使用的保持一致。
+    """
+    # 读取数据
+    df_raw = read_dataframe_from_file(file_path, SOURCE_COLUMNS_MAP.get(platform), encoding,
+                                      NUMERIC_COLUMNS_MAP.get(platform, ()))
+    if df_raw is None:
+        return "FAILURE", "读取文件时发生错误"
+
+    # 调用处理工具
+    print("  -> 正在调用处理工具...", flush=True)
+    processor_func = PROCESSOR_MAP[platform]
+    result_workbook = None
+    try:
+        result_workbook = processor_func(df_raw, **processor_options)
+    except Exception as e:
+        print(f"  -> 错误: 在处理【{platform}】数据时发生异常: {e}", flush=True)
+        # 完整堆栈只写到标准错误（前端作为错误信息显示），标准输出和状态说明中只保留异常类型和内容
+        sys.stderr.write(traceback.format_exc())
+        return "FAILURE", f"处理时发生异常: {type(e).__name__}: {e}"
+
+    # 保存结果
+    if not result_workbook:
+        print("  -> 数据处理失败，未生成结果文件。", flush=True)
+        return "FAILURE", "处理工具未返回有效结果"
+
+    print(f"  -> 正在保存到: '{os.path.basename(output_path)}'", flush=True)
+    try:
+        result_workbook.save(output_path)
+        print("  -> 保存成功！", flush=True)
+        return "SUCCESS", f"已保存到: {output_path}"
+    except Exception as e:
+        print(f"  -> 错误：保存文件失败: {e}", flush=True)
+        return "FAILURE", f"保存文件时发生错误: {e}"
+
+def run_task(task):
+    """
+    处理单个任务，日志直接打印到标准输出。task 为 (文件路径, 平台标识符, 输出路径, 处理工具参数, CSV编码)。
+    返回 (文件路径, 状态码, 状态说明)。
+    """
+    file_path, platform, output_path, processor_options, encoding = task
+    print(f"\n处理任务: '{os.path.basename(file_path)}'", flush=True)
+    try:
+        status, message = _process_file(file_path, platform, output_path, processor_options, encoding)
+    except Exception as e:
+        print(f"  -> 错误: 处理文件时发生未预料的异常: {e}", flush=True)
+        sys.stderr.write(traceback.format_exc())
+        status, message = "FAILURE", f"处理时发生异常: {type(e).__name__}: {e}"
+    return file_path, status, message
+
+def process_one_file(task):
+    """
+    进程池的任务函数。工作进程不直接向标准输出打印，处理过程中的日志收集后随结果一并返回，
+    由主进程统一输出，保证同一文件的日志连续、状态协议行不会与其他进程的输出交错。
+    返回 (文件路径, 状态码, 状态说明, 日志文本)。
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = run_task(task)
+    return result + (log.getvalue(),)
+
 # --- 主逻辑函数 ---
 def main():
     """
     主执行函数，负责整个处理流程。
+    主进程边从标准输入读取任务边完成平台识别和输出路径分配，随即把文件的读取、处理和保存提交给进程池，
+    不必等前端发完整个任务列表；已完成的结果随时取回并由主进程统一报告状态。
     """
     # 1. 解析命令行参数
     parser = argparse.ArgumentParser(description="电商平台销售数据处理后端引擎。")
     parser.add_argument("--output-dir", help="输出目录。如果未提供，则输出到源文件所在目录。")
     parser.add_argument("--on-conflict", choices=['skip', 'overwrite', 'rename'], default='rename', help="文件冲突处理策略。")
+    parser.add_argument("--workers", type=int, default=None, help="并行处理文件的进程数，默认为CPU核心数；为1时在主进程中逐个处理。")
+    parser.add_argument("--writer", choices=['openpyxl', 'xlsxwriter'], default='openpyxl', help="报表写出方式。xlsxwriter 以流式写出，内存占用更低，目前用于京东报表。")
     args = parser.parse_args()
 
     # 2. 打印启动信息
     start_time = datetime.now()
-    print("-" * 60, flush=True)
-    print(f"后端引擎启动: {start_time.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
+    print("-" * 60)
+    print(f"后端引擎启动: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     output_mode = f"指定目录: {os.path.abspath(args.output_dir)}" if args.output_dir else "源文件目录模式"
-    print(f"输出模式: {output_mode}", flush=True)
-    print(f"文件冲突策略: {args.on_conflict.upper()}", flush=True)
-    print("等待从前端接收任务列表...", flush=True)
+    print(f"输出模式: {output_mode}")
+    print(f"文件冲突策略: {args.on_conflict.upper()}")
+    print("等待从前端接收任务列表...")
     print("-" * 60, flush=True)
 
     # 初始化一个字典，用于统计各种处理结果的数量。
@@ -153,94 +402,175 @@ def main():
         "FAILURE": 0,
     }
 
-    # 3. 核心处理循环：从标准输入逐行读取文件路径
-    for file_path in map(str.strip, sys.stdin):
-        if not file_path:
-            continue # 跳过空行
-
-        print(f"\n开始处理任务: '{os.path.basename(file_path)}'", flush=True)
-        send_status_update(file_path, "PROCESSING", "开始处理...")
-
-        # 3.1 识别平台
-        platform = identifier.identify_platform(file_path)
-        if not platform:
-            print("  -> 平台识别失败，跳过此文件。", flush=True)
-            send_status_update(file_path, "UNIDENTIFIED", "未能识别平台类型")
-            status_counts["UNIDENTIFIED"] += 1
-            continue
-        print(f"  -> 识别为【{platform}】平台。", flush=True)
-
-        # 3.2 计算输出路径
-        output_dir = args.output_dir if args.output_dir else os.path.dirname(file_path)
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = get_safe_output_path(output_dir, os.path.basename(file_path), platform, args.on_conflict)
-        
-        if output_path is None:
-            skipped_name = os.path.basename(get_safe_output_path(output_dir, os.path.basename(file_path), platform, 'rename')).replace(' (1)', '')
-            print("  -> 输出文件已存在，根据策略跳过。", flush=True)
-            send_status_update(file_path, "SKIPPED", f"文件 '{skipped_name}' 已存在")
-            status_counts["SKIPPED"] += 1
-            continue
-
-        # 3.3 读取数据
-        df_raw = read_dataframe_from_file(file_path)
-        if df_raw is None:
-            send_status_update(file_path, "FAILURE", "读取文件时发生错误")
-            status_counts["FAILURE"] += 1
-            continue
-
-        # 3.4 调用处理工具
-        print("  -> 正在调用处理工具...", flush=True)
-        
-        # 使用从 identifier 返回的平台标识符 (如 "TM_RECENT") 作为键来查找处理工具。
-        processor_func = PROCESSOR_MAP.get(platform)
-        
-        if not processor_func:
-            print(f"  -> 错误：未找到平台 '{platform}' 对应的处理工具，跳过。", flush=True)
-            send_status_update(file_path, "UNIDENTIFIED", f"未找到平台'{platform}'的处理工具")
-            status_counts["UNIDENTIFIED"] += 1
-            continue
-            
-        result_workbook = None
+    # 3. 从标准输入逐行读取文件路径，在主进程中完成识别和输出路径分配。
+    # 已分配给本批任务的输出路径记录在集合中，视同已存在的文件参与冲突判断，
+    # 使并行保存时的重命名/跳过结果与逐个处理时一致。
+    reserved_output_paths = set()
+    prepared_output_dirs = set() # 已确认存在的输出目录，每个目录只创建/检查一次
+
+    # 进程池在第一个需要处理的文件到来时才创建；指定单进程时在主进程中逐个处理。
+    # 提交给进程池的任务数不超过进程数，其余已识别的任务按文件大小放入待提交队列（大顶堆），
+    # 有进程空闲时先提交最大的文件，避免大文件排在最后、其他进程提前空闲
+    workers = args.workers if args.workers else (os.cpu_count() or 1)
+    executor = None
+    pending = {} # 已提交的 future -> (任务, 提交到的进程池)
+    ready_tasks = [] # 元素为 (-文件大小, 到达序号, 任务)，序号保证大小相同时按到达顺序提交
+    arrival_order = itertools.count()
+    # 覆盖模式下多个输入可能写同一个输出文件。正在排队或处理中的输出路径 -> 等待写同一路径的后续任务，
+    # 前一个任务完成后才提交下一个，保证与逐个处理时一样由最后一个文件的结果生效，不会同时写同一个文件
+    busy_output_paths = {}
+
+    def queue_task(task):
+        """把任务按文件大小放入待提交队列。"""
         try:
-            result_workbook = processor_func(df_raw)
-        except Exception as e:
-            print(f"  -> 错误: 在处理【{platform}】数据时发生异常: {e}", flush=True)
-            exc_str = traceback.format_exc()
-            print(exc_str, flush=True)
-            send_status_update(file_path, "FAILURE", f"处理时发生异常: {e}")
-            status_counts["FAILURE"] += 1
-            continue
-
-        # 3.5 保存结果
-        if result_workbook:
-            print(f"  -> 正在保存到: '{os.path.basename(output_path)}'", flush=True)
+            file_size = os.path.getsize(task[0])
+        except OSError:
+            file_size = 0
+        heapq.heappush(ready_tasks, (-file_size, next(arrival_order), task))
+
+    def release_output_path(output_path):
+        """输出路径上的任务已完成，放行下一个等待写同一路径的任务。"""
+        waiting_tasks = busy_output_paths[output_path]
+        if waiting_tasks:
+            queue_task(waiting_tasks.popleft())
+        else:
+            del busy_output_paths[output_path]
+
+    def report_result(result):
+        """输出工作进程返回的日志并发送最终状态。"""
+        file_path, status, message, log_text = result
+        # 日志和状态行一起写入缓冲区，由 send_status_update 一次刷新
+        print(log_text, end='')
+        send_status_update(file_path, status, message)
+        status_counts[status] += 1
+
+    def discard_broken_executor(broken_executor):
+        """
+        工作进程异常退出（如内存不足被系统终止）后进程池不能再使用，关闭它，
+        后续任务提交时重新创建进程池。
+        """
+        nonlocal executor
+        if executor is broken_executor:
+            print("\n  -> 警告: 工作进程异常退出，将重新创建进程池处理剩余任务。")
+            executor.shutdown(wait=True)
+            executor = None
+
+    def collect_finished(block):
+        """取回已完成的任务并报告结果；block 为 True 时至少等待一个任务完成。"""
+        if block:
+            sys.stdout.flush() # 阻塞等待前先把缓冲的输出发给前端
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            task, task_executor = pending.pop(future)
+            pool_broken = False
             try:
-                result_workbook.save(output_path)
-                print("  -> 保存成功！", flush=True)
-                send_status_update(file_path, "SUCCESS", f"已保存到: {output_path}")
-                status_counts["SUCCESS"] += 1
+                result = future.result()
             except Exception as e:
-                print(f"  -> 错误：保存文件失败: {e}", flush=True)
-                send_status_update(file_path, "FAILURE", f"保存文件时发生错误: {e}")
-                status_counts["FAILURE"] += 1
-        else:
-            print("  -> 数据处理失败，未生成结果文件。", flush=True)
-            send_status_update(file_path, "FAILURE", "处理工具未返回有效结果")
-            status_counts["FAILURE"] += 1
+                # 工作进程崩溃或结果无法传回时，该文件仍要报告最终状态，前端才不会一直显示为处理中
+                file_path = task[0]
+                log_text = (f"\n处理任务: '{os.path.basename(file_path)}'\n"
+                            f"  -> 错误: 工作进程未能完成处理: {type(e).__name__}: {e}\n")
+                result = (file_path, "FAILURE", f"工作进程异常: {type(e).__name__}: {e}", log_text)
+                pool_broken = isinstance(e, BrokenProcessPool)
+            report_result(result)
+            release_output_path(task[2])
+            if pool_broken:
+                discard_broken_executor(task_executor)
+
+    def submit_ready_tasks():
+        """取回已完成的任务，再把待提交队列中最大的文件依次提交给空闲的进程。"""
+        nonlocal executor
+        collect_finished(block=False)
+        while ready_tasks and len(pending) < workers:
+            if executor is None:
+                print(f"\n使用最多 {workers} 个进程并行处理。")
+                executor = ProcessPoolExecutor(max_workers=workers)
+            queued = heapq.heappop(ready_tasks)
+            task = queued[2]
+            try:
+                future = executor.submit(process_one_file, task)
+            except BrokenProcessPool:
+                # 进程池在上次取回结果之后才损坏，任务放回队列，换新的进程池后再提交
+                heapq.heappush(ready_tasks, queued)
+                discard_broken_executor(executor)
+                continue
+            pending[future] = (task, executor)
+
+    try:
+        for file_path in _read_input_paths():
+            print(f"\n开始处理任务: '{os.path.basename(file_path)}'")
+            send_status_update(file_path, "PROCESSING", "开始处理...", flush=False)
+
+            # 3.1 识别平台
+            # 识别时读取表头得到的编码随任务一起传给读取步骤
+            platform, encoding = identifier.identify_platform_with_encoding(file_path)
+            if not platform:
+                print("  -> 平台识别失败，跳过此文件。")
+                send_status_update(file_path, "UNIDENTIFIED", "未能识别平台类型", flush=False)
+                status_counts["UNIDENTIFIED"] += 1
+                continue
+            print(f"  -> 识别为【{platform}】平台。")
+
+            # 使用从 identifier 返回的平台标识符 (如 "TM_RECENT") 作为键来查找处理工具。
+            if platform not in PROCESSOR_MAP:
+                print(f"  -> 错误：未找到平台 '{platform}' 对应的处理工具，跳过。")
+                send_status_update(file_path, "UNIDENTIFIED", f"未找到平台'{platform}'的处理工具", flush=False)
+                status_counts["UNIDENTIFIED"] += 1
+                continue
+
+            # 3.2 计算输出路径
+            output_dir = args.output_dir if args.output_dir else os.path.dirname(file_path)
+            if output_dir not in prepared_output_dirs:
+                os.makedirs(output_dir, exist_ok=True)
+                prepared_output_dirs.add(output_dir)
+            output_filename = compute_output_filename(os.path.basename(file_path), platform)
+            output_path = resolve_output_conflict(output_dir, output_filename, args.on_conflict, reserved_output_paths)
+            
+            if output_path is None:
+                print("  -> 输出文件已存在，根据策略跳过。")
+                send_status_update(file_path, "SKIPPED", f"文件 '{output_filename}' 已存在", flush=False)
+                status_counts["SKIPPED"] += 1
+                continue
+
+            reserved_output_paths.add(output_path)
+            processor_options = XLSXWRITER_PROCESSOR_OPTIONS.get(platform, {}) if args.writer == 'xlsxwriter' else {}
+            task = (file_path, platform, output_path, processor_options, encoding)
+
+            # 3.3 读取、处理并保存。跨进程只传递路径，不传递DataFrame。
+            # 单进程时在主进程中直接处理，进度日志实时输出，不必等整个文件处理完
+            if workers == 1:
+                report_result(run_task(task) + ('',))
+                continue
+            if output_path in busy_output_paths:
+                busy_output_paths[output_path].append(task)
+            else:
+                busy_output_paths[output_path] = deque()
+                queue_task(task)
+            submit_ready_tasks()
+
+        # 输入结束，提交剩余任务并等待全部完成
+        while ready_tasks or pending:
+            submit_ready_tasks()
+            if pending:
+                collect_finished(block=True)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     # 4. 结束总结
     end_time = datetime.now()
     duration = end_time - start_time
-    print("\n" + "-" * 60, flush=True)
-    print("所有任务处理完毕！", flush=True)
-    print(f"处理总耗时: {duration}", flush=True)
-    print("处理结果统计:", flush=True)
-    print(f"  - 成功: {status_counts['SUCCESS']} 个文件", flush=True)
-    print(f"  - 跳过 (文件已存在): {status_counts['SKIPPED']} 个文件", flush=True)
-    print(f"  - 平台未识别: {status_counts['UNIDENTIFIED']} 个文件", flush=True)
-    print(f"  - 失败 (发生错误): {status_counts['FAILURE']} 个文件", flush=True)
+    print("\n" + "-" * 60)
+    print("所有任务处理完毕！")
+    print(f"处理总耗时: {duration}")
+    print("处理结果统计:")
+    print(f"  - 成功: {status_counts['SUCCESS']} 个文件")
+    print(f"  - 跳过 (文件已存在): {status_counts['SKIPPED']} 个文件")
+    print(f"  - 平台未识别: {status_counts['UNIDENTIFIED']} 个文件")
+    print(f"  - 失败 (发生错误): {status_counts['FAILURE']} 个文件")
     print("-" * 60, flush=True)
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，进程池的子进程需要 freeze_support 才能正确启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
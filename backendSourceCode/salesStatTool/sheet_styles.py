@@ -0,0 +1,25 @@
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment
+
+# 各平台报表的总结页和详情页共用的样式对象，模块加载时创建一次，所有单元格复用同一实例
+BOLD_FONT = Font(bold=True)
+CENTER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+# 将Sheet页名称中Excel不允许的字符 \ / * [ ] : ? 替换为'_'，配合 str.translate 使用
+SHEET_NAME_TRANSLATION_TABLE = str.maketrans(dict.fromkeys('\\/*[]:?', '_'))
+
+def styled_cells(ws, values, font=None, alignment=None):
+    """
+    将一行数据包装为 write_only 工作表可追加的 WriteOnlyCell 列表，并统一设置样式。
+    值为 None 的位置不创建单元格。
+    """
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append(None)
+            continue
+        cell = WriteOnlyCell(ws, value=value)
+        if font is not None: cell.font = font
+        if alignment is not None: cell.alignment = alignment
+        cells.append(cell)
+    return cells